@@ -1,80 +1,355 @@
 # ai_service.py
 # -*- coding: utf-8 -*-
 
-import requests
+import asyncio
+import hashlib
+import httpx
 import json
+import logging
 import re
+import time
 from datetime import datetime
+from typing import AsyncIterator
 import pytz
 
-from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL
+from config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL,
+    AI_REQUEST_TIMEOUT, AI_CONNECT_TIMEOUT, AI_MAX_CONCURRENCY, AI_MAX_RETRIES, AI_RETRY_BACKOFF,
+    AI_CACHE_MAX_SIZE, AI_CACHE_TTL, AI_CACHE_PATH, AI_USER_RATE, AI_USER_BURST, PARSE_TASK_TOKEN_BUDGET,
+    OPENROUTER_FALLBACK_MODELS, AI_MODEL_SLOS, AI_DEFAULT_SLO, AI_BREAKER_FAILURES, AI_BREAKER_COOLDOWN,
+    AI_HEDGE_MODEL, AI_HEDGE_DELAY,
+)
+from response_cache import ResponseCache
+from metrics import LLM_LATENCY, LLM_TTFB, LLM_TOKENS, LLM_JSON_FAILURES, AI_CALLS_SAVED, gauge
+from throttling import KeyedRateLimiter, SingleFlight
+from model_router import ModelRouter
+from prompts import (
+    PARSE_SYSTEM_PROMPT, BATCH_PARSE_SYSTEM_PROMPT, build_parse_prompt, build_batch_parse_prompt,
+    parse_output_budget, batch_output_budget, fits_parse_budget,
+    DIGEST_SYSTEM_PROMPT, build_digest_batch_prompt, digest_output_budget,
+)
 
-def generate_ai_response(prompt: str, user_id: int, model: str = OPENROUTER_MODEL) -> str:
-    # ... (оставьте эту функцию без изменений) ...
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "Task_Manager_Telegram_Bot",
-        "X-Title": "Task Manager Bot"
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "Ты дружелюбный и полезный AI-ассистент по управлению задачами в Telegram. Твоя цель - помогать пользователю быть продуктивным, напоминать о задачах, мотивировать и общаться в живом, поддерживающем стиле."
+
+# Коды ответа, при которых имеет смысл повторить запрос
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Один общий клиент на весь процесс: keep-alive соединения переиспользуются между запросами
+_client: httpx.AsyncClient | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(AI_REQUEST_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=AI_MAX_CONCURRENCY, max_keepalive_connections=AI_MAX_CONCURRENCY),
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "Task_Manager_Telegram_Bot",
+                "X-Title": "Task Manager Bot"
+            },
+        )
+    return _client
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    return _semaphore
+
+async def close_client() -> None:
+    # Вызывается при остановке приложения, чтобы корректно закрыть пул соединений
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+async def _post_with_retries(data: dict) -> dict:
+    client = get_client()
+    last_error = None
+    for attempt in range(AI_MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                response = await client.post(OPENROUTER_BASE_URL, json=data)
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < AI_MAX_RETRIES:
+                last_error = httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+            else:
+                response.raise_for_status()
+                return response.json()
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            last_error = e
+            if attempt >= AI_MAX_RETRIES:
+                raise
+        # Экспоненциальная задержка перед следующей попыткой (вне семафора, чтобы не занимать слот)
+        await asyncio.sleep(AI_RETRY_BACKOFF * (2 ** attempt))
+    raise last_error
+
+async def _request_completion(prompt: str, model: str, max_tokens: int = 200,
+                              system_prompt: str = SYSTEM_PROMPT, temperature: float = 0.7) -> str:
+    data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens
     }
+
+    start = time.perf_counter()
+    try:
+        response_data = await _post_with_retries(data)
+    except httpx.HTTPError:
+        LLM_LATENCY.observe(time.perf_counter() - start, model, 'error')
+        raise
+    LLM_LATENCY.observe(time.perf_counter() - start, model, 'ok')
+
+    usage = response_data.get('usage') if isinstance(response_data, dict) else None
+    if usage:
+        LLM_TOKENS.inc(usage.get('prompt_tokens', 0), model, 'prompt')
+        LLM_TOKENS.inc(usage.get('completion_tokens', 0), model, 'completion')
+    try:
+        return response_data['choices'][0]['message']['content'].strip()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        raise ValueError(f"Неожиданный формат ответа от OpenRouter: {response_data}")
+
+# Цепочка моделей: запрошенная модель первая, за ней запасные из конфигурации
+model_router = ModelRouter(
+    OPENROUTER_FALLBACK_MODELS, AI_MODEL_SLOS, AI_DEFAULT_SLO, AI_BREAKER_FAILURES, AI_BREAKER_COOLDOWN,
+    hedge_model=AI_HEDGE_MODEL, hedge_delay=AI_HEDGE_DELAY,
+)
+
+class AIRateLimited(Exception):
+    pass
+
+# Лимит запросов к модели на пользователя и схлопывание одинаковых запросов, которые уже выполняются
+_user_limiter = KeyedRateLimiter(AI_USER_RATE, AI_USER_BURST)
+_single_flight = SingleFlight()
+
+async def _generate_for_user(prompt: str, user_id: int, model: str, max_tokens: int,
+                             system_prompt: str = SYSTEM_PROMPT, temperature: float = 0.7) -> str:
+    # Лимит проверяется до схлопывания: ключ не содержит user_id, и одинаковый запрос другого пользователя
+    # не должен ни расходовать его лимит, ни получать его AIRateLimited
+    if not _user_limiter.try_acquire(user_id):
+        AI_CALLS_SAVED.inc(1, 'rate_limited')
+        raise AIRateLimited(f"Пользователь {user_id} превысил лимит запросов к AI")
+
+    async def call() -> str:
+        return await model_router.run(
+            model, lambda routed_model: _request_completion(prompt, routed_model, max_tokens, system_prompt, temperature)
+        )
+
+    response, shared = await _single_flight.do((model, max_tokens, system_prompt, prompt), call)
+    if shared:
+        AI_CALLS_SAVED.inc(1, 'single_flight')
+    return response
+
+async def generate_ai_response(prompt: str, user_id: int, model: str = OPENROUTER_MODEL, max_tokens: int = 200) -> str:
+    try:
+        return await _generate_for_user(prompt, user_id, model, max_tokens)
+    except AIRateLimited as e:
+        logger.info("%s", e)
+        return "Ты пишешь очень быстро 🙂 Дай мне пару секунд и попробуй еще раз."
+    except httpx.HTTPError as e:
+        logger.warning("Ошибка при запросе к OpenRouter: %s", e)
+        return "Извини, я сейчас не могу связаться со своим мозгом. Попробуй позже."
+    except ValueError as e:
+        logger.warning("%s", e)
+        return "Ой, что-то пошло не так с ответом. Могу ли я чем-то еще помочь?"
+
+# --- Потоковые ответы (SSE) ---
+
+def _parse_sse_line(line: str) -> str | None:
+    # "data: {...}" -> текст очередного фрагмента; служебные строки и комментарии (": ...") пропускаем
+    if not line.startswith('data:'):
+        return None
+    payload = line[5:].strip()
+    if not payload or payload == '[DONE]':
+        return None
+    try:
+        chunk = json.loads(payload)
+    except json.JSONDecodeError:
+        logger.warning("Не удалось разобрать фрагмент потока OpenRouter: %s", payload)
+        return None
+    if not isinstance(chunk, dict):
+        return None
+    if chunk.get('usage'):
+        model = chunk.get('model') or OPENROUTER_MODEL
+        LLM_TOKENS.inc(chunk['usage'].get('prompt_tokens', 0), model, 'prompt')
+        LLM_TOKENS.inc(chunk['usage'].get('completion_tokens', 0), model, 'completion')
+    if chunk.get('error'):
+        raise ValueError(f"Ошибка в потоке OpenRouter: {chunk['error']}")
+    try:
+        return chunk['choices'][0]['delta'].get('content') or None
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+async def _stream_completion(prompt: str, model: str, max_tokens: int = 200) -> AsyncIterator[str]:
+    # Запасную модель при стриминге выбираем до запроса: переключаться после первого фрагмента уже поздно
+    model = model_router.pick(model)
     data = {
         "model": model,
         "messages": [
-            {"role": "system", "content": "Ты дружелюбный и полезный AI-ассистент по управлению задачами в Telegram. Твоя цель - помогать пользователю быть продуктивным, напоминать о задачах, мотивировать и общаться в живом, поддерживающем стиле."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
         "temperature": 0.7,
-        "max_tokens": 200
+        "max_tokens": max_tokens,
+        "stream": True,
     }
 
+    start = time.perf_counter()
+    first_chunk = True
+    outcome = 'error'
     try:
-        response = requests.post(OPENROUTER_BASE_URL, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        response_data = response.json()
-        return response_data['choices'][0]['message']['content'].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при запросе к OpenRouter: {e}")
+        # Повторов нет: после первого фрагмента пользователь уже видит ответ
+        async with _get_semaphore():
+            async with get_client().stream("POST", OPENROUTER_BASE_URL, json=data) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = _parse_sse_line(line)
+                    if text is None:
+                        continue
+                    if first_chunk:
+                        LLM_TTFB.observe(time.perf_counter() - start, model)
+                        first_chunk = False
+                    yield text
+        outcome = 'ok'
+    except (GeneratorExit, asyncio.CancelledError):
+        # Потребитель перестал читать поток — это не ошибка модели
+        outcome = 'cancelled'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.observe(elapsed, model, outcome)
+        if outcome == 'cancelled':
+            # pick() мог выдать этот поток как пробный запрос half-open breaker
+            model_router.release(model)
+        else:
+            model_router.record(model, elapsed, outcome == 'ok')
+
+async def stream_ai_response(prompt: str, user_id: int, model: str = OPENROUTER_MODEL, max_tokens: int = 200) -> AsyncIterator[str]:
+    """Отдает ответ модели по частям. Ошибки до первого фрагмента превращаются в текст, как в generate_ai_response."""
+    if not _user_limiter.try_acquire(user_id):
+        AI_CALLS_SAVED.inc(1, 'rate_limited')
+        logger.info("Пользователь %s превысил лимит запросов к AI", user_id)
+        yield "Ты пишешь очень быстро 🙂 Дай мне пару секунд и попробуй еще раз."
+        return
+
+    received = False
+    try:
+        async for text in _stream_completion(prompt, model, max_tokens):
+            received = True
+            yield text
+    except httpx.HTTPError as e:
+        logger.warning("Ошибка при потоковом запросе к OpenRouter: %s", e)
+        if not received:
+            yield "Извини, я сейчас не могу связаться со своим мозгом. Попробуй позже."
+    except ValueError as e:
+        logger.warning("%s", e)
+        if not received:
+            yield "Ой, что-то пошло не так с ответом. Могу ли я чем-то еще помочь?"
+
+# --- Шаблонные ответы ---
+# Промпты не содержат данных пользователя, поэтому один ответ модели можно отдавать всем.
+CANNED_PROMPTS = {
+    'start_greeting': "Пользователь только что начал диалог с ботом. Приветствуй его как дружелюбный AI-ассистент, расскажи, что ты умеешь (помогать с задачами, напоминать, мотивировать).",
+    'add_without_text': "Пользователь ввел /add без текста задачи. Попроси его ввести текст задачи.",
+    'list_empty': "Пользователь запросил список задач, но у него их нет. Предложи добавить.",
+    'list_empty_category': "Пользователь запросил список задач по категории, но задач в ней нет. Предложи добавить.",
+    'done_bad_args': "Пользователь ввел /done без номера задачи или с неверным номером. Попроси ввести номер.",
+    'edit_bad_args': "Пользователь ввел /edit без номера задачи или нового текста. Попроси ввести корректно.",
+    'note_bad_args': "Пользователь ввел /note без номера задачи или текста заметки. Попроси ввести корректно.",
+}
+
+response_cache = ResponseCache(max_size=AI_CACHE_MAX_SIZE, ttl=AI_CACHE_TTL, path=AI_CACHE_PATH)
+gauge('ai_response_cache_hits', 'Попадания в кеш шаблонных ответов', lambda: response_cache.stats()["hits"])
+gauge('ai_response_cache_misses', 'Промахи кеша шаблонных ответов', lambda: response_cache.stats()["misses"])
+gauge('ai_response_cache_size', 'Число записей в кеше шаблонных ответов', lambda: response_cache.stats()["size"])
+
+def _canned_cache_key(kind: str, model: str) -> str:
+    # Хеш текста шаблона: после правки промпта старые ответы из кеша перестают совпадать
+    digest = hashlib.sha1(CANNED_PROMPTS[kind].encode('utf-8')).hexdigest()[:12]
+    return f"{kind}:{model}:{digest}"
+
+async def generate_canned_response(kind: str, user_id: int, model: str = OPENROUTER_MODEL) -> str:
+    key = _canned_cache_key(kind, model)
+    cached = response_cache.get(key)
+    if cached is not None:
+        AI_CALLS_SAVED.inc(1, 'cache')
+        return cached
+    try:
+        response = await model_router.run(model, lambda routed_model: _request_completion(CANNED_PROMPTS[kind], routed_model))
+    except httpx.HTTPError as e:
+        # Ошибки не кешируем — при следующем обращении попробуем снова. Повторно по той же цепочке моделей
+        # не идем: model_router.run уже перебрал ее с повторами
+        logger.warning("Ошибка при запросе к OpenRouter: %s", e)
         return "Извини, я сейчас не могу связаться со своим мозгом. Попробуй позже."
-    except KeyError:
-        print(f"Неожиданный формат ответа от OpenRouter: {response.text}")
+    except ValueError as e:
+        logger.warning("%s", e)
         return "Ой, что-то пошло не так с ответом. Могу ли я чем-то еще помочь?"
+    response_cache.set(key, response)
+    return response
 
-def parse_task_with_ai(task_text: str, user_id: int) -> dict:
-    now_utc = datetime.now(pytz.utc)
-    current_date_str = now_utc.strftime('%Y-%m-%d')
-
-    # --- ОБНОВЛЕННЫЙ ПРОМПТ ДЛЯ AI с полем 'category' ---
-    prompt = (
-        f"Пользователь '{user_id}' хочет добавить задачу: '{task_text}'. "
-        f"Текущая дата (UTC): {current_date_str}. "
-        "Извлеки из текста задачи:\n"
-        "1. **task_text**: Сама суть задачи (например, 'Купить молоко', 'Позвонить другу').\n"
-        "2. **due_date**: Дата и время в формате `YYYY-MM-DD HH:MM:SS` или `null`, если не указано.\n"
-        "3. **priority**: Приоритет задачи. Должен быть одним из: 'high', 'medium', 'low'. "
-        "Если приоритет явно указан в тексте (например, 'высокий', 'low', 'средний'), используй его. "
-        "Если не указан, используй 'medium'.\n"
-        "4. **category**: Категория задачи. Может быть любой строкой (например, 'Работа', 'Личное', 'Покупки', 'Спорт'). "
-        "Если категория указана в тексте (например, 'задача #работа', 'купить молоко #покупки'), извлеки её. "
-        "Если не указана, используй `null`.\n" # <-- Изменено: теперь 'null' для отсутствующей категории
-        "**Обязательно** возвращай JSON-объект, содержащий *все четыре* поля: `task_text`, `due_date`, `priority`, `category`.\n"
-        "Если не можешь понять, что задача, установи `task_text` в `null`."
-        "\nПримеры:\n"
-        " - 'Купить хлеб завтра в 18:00 high #покупки' -> `{{\"task_text\": \"Купить хлеб\", \"due_date\": \"{tomorrow_date} 18:00:00\", \"priority\": \"high\", \"category\": \"покупки\"}}`\n"
-        " - 'Заплатить по счету low #финансы' -> `{{\"task_text\": \"Заплатить по счету\", \"due_date\": null, \"priority\": \"low\", \"category\": \"финансы\"}}`\n"
-        " - 'Позвонить другу' -> `{{\"task_text\": \"Позвонить другу\", \"due_date\": null, \"priority\": \"medium\", \"category\": null}}`\n"
-        " - 'Тренировка в зале #спорт' -> `{{\"task_text\": \"Тренировка в зале\", \"due_date\": null, \"priority\": \"medium\", \"category\": \"спорт\"}}`\n"
-        "Твой ответ должен быть *только* JSON-объектом, без лишнего текста или форматирования (например, ```json)."
-    )
-    # --- КОНЕЦ ОБНОВЛЕННОГО ПРОМПТА ---
-
-    ai_response = generate_ai_response(prompt, user_id)
-
-    # --- Начало блока отладки (оставьте как есть для отладки) ---
-    print(f"\n--- Отладочный вывод ai_service.py ---")
-    print(f"Исходный raw_task_text: '{task_text}'")
-    print(f"Промпт, отправленный AI:\n{prompt}")
-    print(f"Сырой ответ AI: '{ai_response}'")
-    # --- Конец блока отладки ---
+async def stream_canned_response(kind: str, user_id: int, model: str = OPENROUTER_MODEL) -> AsyncIterator[str]:
+    # Из кеша ответ приходит целиком; при промахе стримим и кешируем только полный успешный ответ
+    key = _canned_cache_key(kind, model)
+    cached = response_cache.get(key)
+    if cached is not None:
+        AI_CALLS_SAVED.inc(1, 'cache')
+        yield cached
+        return
+    parts = []
+    try:
+        async for text in _stream_completion(CANNED_PROMPTS[kind], model):
+            parts.append(text)
+            yield text
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Ошибка при потоковом запросе к OpenRouter: %s", e)
+        if not parts:
+            yield "Извини, я сейчас не могу связаться со своим мозгом. Попробуй позже."
+        return
+    if parts:
+        response_cache.set(key, "".join(parts).strip())
+
+def _validate_parsed_task(parsed_data: dict, task_text: str) -> dict:
+    # --- Валидация и fallback для полей ---
+    # Priority validation (остается как было)
+    ai_priority = parsed_data.get('priority') or 'medium'
+    ai_priority = ai_priority.lower() if isinstance(ai_priority, str) else 'medium'
+    if ai_priority not in ['high', 'medium', 'low']:
+        logger.info("AI вернул невалидный приоритет '%s', используя 'medium'.", ai_priority)
+        ai_priority = 'medium'
+    parsed_data['priority'] = ai_priority
+
+    # Category validation and fallback (НОВОЕ)
+    ai_category = parsed_data.get('category', None) # Получаем категорию, по умолчанию None
+    if isinstance(ai_category, str): # Если AI вернул строку, делаем её lowercase и обрезаем пробелы
+        ai_category = ai_category.strip().lower()
+        if not ai_category: # Если строка пустая после обрезки, считаем null
+            ai_category = None
+    else: # Если AI вернул не строку (например, пустой массив, число, или отсутствовало поле)
+        ai_category = None
+    parsed_data['category'] = ai_category
+
+    # Task_text fallback (остается как было)
+    if 'task_text' not in parsed_data or parsed_data['task_text'] is None:
+        parsed_data['task_text'] = task_text
+    return parsed_data
+
+def _default_parsed_task(task_text: str) -> dict:
+    return {"task_text": task_text, "due_date": None, "priority": "medium", "category": None}
+
+def _parse_single_response(ai_response: str, task_text: str) -> dict:
+    # Отладочный вывод включается уровнем DEBUG; при выключенном уровне строки даже не форматируются
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Исходный raw_task_text: '%s'", task_text)
+        logger.debug("Сырой ответ AI: '%s'", ai_response)
 
     try:
         match = re.search(r'\{.*\}', ai_response, re.DOTALL)
@@ -82,43 +357,115 @@ def parse_task_with_ai(task_text: str, user_id: int) -> dict:
             json_string = match.group(0)
             parsed_data = json.loads(json_string)
 
-            # --- Отладочный вывод распарсенных данных ---
-            print(f"Извлеченная JSON-строка: '{json_string}'")
-            print(f"Распарсенные данные (до валидации): {parsed_data}")
-            # --- Конец отладки ---
-
-            # --- Валидация и fallback для полей ---
-            # Priority validation (остается как было)
-            ai_priority = parsed_data.get('priority', 'medium').lower()
-            if ai_priority not in ['high', 'medium', 'low']:
-                print(f"AI вернул невалидный приоритет '{ai_priority}', используя 'medium'.")
-                ai_priority = 'medium'
-            parsed_data['priority'] = ai_priority
-
-            # Category validation and fallback (НОВОЕ)
-            ai_category = parsed_data.get('category', None) # Получаем категорию, по умолчанию None
-            if isinstance(ai_category, str): # Если AI вернул строку, делаем её lowercase и обрезаем пробелы
-                ai_category = ai_category.strip().lower()
-                if not ai_category: # Если строка пустая после обрезки, считаем null
-                    ai_category = None
-            else: # Если AI вернул не строку (например, пустой массив, число, или отсутствовало поле)
-                ai_category = None
-            parsed_data['category'] = ai_category
-
-
-            # Task_text fallback (остается как было)
-            if 'task_text' not in parsed_data or parsed_data['task_text'] is None:
-                parsed_data['task_text'] = task_text
-
-            print(f"Финальные распарсенные данные (после валидации): {parsed_data}")
+            if debug:
+                logger.debug("Извлеченная JSON-строка: '%s'", json_string)
+                logger.debug("Распарсенные данные (до валидации): %s", parsed_data)
+
+            parsed_data = _validate_parsed_task(parsed_data, task_text)
+
+            if debug:
+                logger.debug("Финальные распарсенные данные (после валидации): %s", parsed_data)
             return parsed_data
         else:
-            print(f"Не удалось найти JSON-объект в ответе AI: '{ai_response}'")
-            return {"task_text": task_text, "due_date": None, "priority": "medium", "category": None}
+            LLM_JSON_FAILURES.inc(1, 'single')
+            logger.warning("Не удалось найти JSON-объект в ответе AI: '%s'", ai_response)
+            return _default_parsed_task(task_text)
 
     except json.JSONDecodeError as e:
-        print(f"Ошибка JSONDecodeError при парсинге очищенного ответа AI: {e}. Ответ: '{ai_response}'")
-        return {"task_text": task_text, "due_date": None, "priority": "medium", "category": None}
+        LLM_JSON_FAILURES.inc(1, 'single')
+        logger.warning("Ошибка JSONDecodeError при парсинге очищенного ответа AI: %s. Ответ: '%s'", e, ai_response)
+        return _default_parsed_task(task_text)
     except Exception as e:
-        print(f"Непредвиденная ошибка в parse_task_with_ai: {e}. Ответ: '{ai_response}'")
-        return {"task_text": task_text, "due_date": None, "priority": "medium", "category": None}
\ No newline at end of file
+        logger.exception("Непредвиденная ошибка в parse_task_with_ai: %s. Ответ: '%s'", e, ai_response)
+        return _default_parsed_task(task_text)
+
+async def parse_task_with_ai(task_text: str, user_id: int, now: datetime | None = None) -> dict:
+    if not fits_parse_budget(task_text):
+        logger.info("Текст задачи превышает бюджет в %s токенов, сохраняем без разбора", PARSE_TASK_TOKEN_BUDGET)
+        return _default_parsed_task(task_text)
+
+    prompt = build_parse_prompt(task_text, now or datetime.now(pytz.utc))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Промпт, отправленный AI:\n%s", prompt)
+    try:
+        ai_response = await _generate_for_user(prompt, user_id, OPENROUTER_MODEL, parse_output_budget(task_text),
+                                               system_prompt=PARSE_SYSTEM_PROMPT, temperature=0)
+    except AIRateLimited as e:
+        # Без модели сохраняем задачу как есть, чтобы пользователь ее не потерял
+        logger.info("%s, задача сохраняется без разбора", e)
+        return _default_parsed_task(task_text)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Ошибка при запросе к OpenRouter: %s", e)
+        return _default_parsed_task(task_text)
+
+    return _parse_single_response(ai_response, task_text)
+
+async def parse_tasks_with_ai(task_texts: list[str], user_id: int, now: datetime | None = None) -> list[dict]:
+    """Разбирает несколько задач одним запросом к модели.
+
+    Если ответ не удалось сопоставить со входом (не массив или другая длина),
+    задачи разбираются по одной параллельно; число одновременных запросов
+    ограничено общим семафором клиента.
+    """
+    if not task_texts:
+        return []
+    oversized = [not fits_parse_budget(text) for text in task_texts]
+    if any(oversized):
+        # Слишком длинные тексты сохраняются без разбора, остальные идут одним пакетом
+        parsed = iter(await parse_tasks_with_ai([text for text, skip in zip(task_texts, oversized) if not skip], user_id, now))
+        return [_default_parsed_task(text) if skip else next(parsed) for text, skip in zip(task_texts, oversized)]
+
+    prompt = build_batch_parse_prompt(task_texts, now or datetime.now(pytz.utc))
+    try:
+        ai_response = await _generate_for_user(prompt, user_id, OPENROUTER_MODEL, batch_output_budget(task_texts),
+                                               system_prompt=BATCH_PARSE_SYSTEM_PROMPT, temperature=0)
+    except AIRateLimited as e:
+        logger.info("%s, задачи сохраняются без разбора", e)
+        return [_default_parsed_task(text) for text in task_texts]
+    except (httpx.HTTPError, ValueError) as e:
+        # Разбор по одной сейчас тоже не пройдет — не умножаем число неудачных запросов
+        logger.warning("Ошибка при пакетном запросе к OpenRouter: %s", e)
+        return [_default_parsed_task(text) for text in task_texts]
+
+    try:
+        match = re.search(r'\[.*\]', ai_response, re.DOTALL)
+        items = json.loads(match.group(0)) if match else None
+        if isinstance(items, list) and len(items) == len(task_texts) and all(isinstance(item, dict) for item in items):
+            return [_validate_parsed_task(item, text) for item, text in zip(items, task_texts)]
+        LLM_JSON_FAILURES.inc(1, 'batch')
+        logger.warning("Пакетный ответ AI не совпал со списком задач, разбираем по одной. Ответ: '%s'", ai_response)
+    except json.JSONDecodeError as e:
+        LLM_JSON_FAILURES.inc(1, 'batch')
+        logger.warning("Ошибка JSONDecodeError в пакетном ответе AI: %s. Ответ: '%s'", e, ai_response)
+
+    return list(await asyncio.gather(*(parse_task_with_ai(text, user_id, now) for text in task_texts)))
+
+async def generate_digests(sections: list[str]) -> list[str | None]:
+    """Мотивирующие сводки для нескольких пользователей одним запросом к модели.
+
+    Задание планировщика, а не ответ пользователю: лимит запросов на пользователя не применяется.
+    None на месте сводки — ответ не удалось разобрать, вызывающий код обходится без текста модели.
+    """
+    if not sections:
+        return []
+    prompt = build_digest_batch_prompt(sections)
+    try:
+        ai_response = await model_router.run(
+            OPENROUTER_MODEL,
+            lambda model: _request_completion(prompt, model, digest_output_budget(len(sections)), DIGEST_SYSTEM_PROMPT),
+        )
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Ошибка при запросе сводок к OpenRouter: %s", e)
+        return [None] * len(sections)
+
+    try:
+        match = re.search(r'\[.*\]', ai_response, re.DOTALL)
+        items = json.loads(match.group(0)) if match else None
+        if isinstance(items, list) and len(items) == len(sections):
+            return [item.strip() if isinstance(item, str) and item.strip() else None for item in items]
+        LLM_JSON_FAILURES.inc(1, 'digest')
+        logger.warning("Ответ AI со сводками не совпал со списком пользователей. Ответ: '%s'", ai_response)
+    except json.JSONDecodeError as e:
+        LLM_JSON_FAILURES.inc(1, 'digest')
+        logger.warning("Ошибка JSONDecodeError в ответе AI со сводками: %s. Ответ: '%s'", e, ai_response)
+    return [None] * len(sections)
@@ -0,0 +1,78 @@
+# benchmarks/bench_bulk_import.py
+# -*- coding: utf-8 -*-
+# Сравнение пакетного импорта (add_tasks_bulk) с последовательными add_task.
+# OpenRouter подменяется заглушкой с фиксированной задержкой, чтобы замер не зависел от сети.
+#
+#   python benchmarks/bench_bulk_import.py --lines 50 --llm-latency 1.5 --ambiguous 0.3
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--lines', type=int, default=50)
+parser.add_argument('--llm-latency', type=float, default=1.5, help='задержка ответа модели, секунды')
+parser.add_argument('--ambiguous', type=float, default=0.3, help='доля строк, которые требуют LLM')
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine создается при импорте db
+db_path = os.path.join(tempfile.mkdtemp(), 'bench_bulk.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+# Лимит запросов на пользователя здесь не нужен: сравниваются сами пути разбора
+os.environ['AI_USER_BURST'] = '1000000'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_service
+from db import dispose_engines
+from task_manager import add_task, add_tasks_bulk, scheduler
+
+CLEAR = ["Купить хлеб завтра в 18:00 high #покупки", "Позвонить другу", "Заплатить по счету low #финансы"]
+AMBIGUOUS = ["Купить молоко утром", "Сдать 3 отчета к концу недели", "напомни мне полить цветы"]
+
+async def fake_completion(prompt: str, model: str, max_tokens: int = 200,
+                          system_prompt: str = '', temperature: float = 0.7) -> str:
+    await asyncio.sleep(args.llm_latency)
+    item = {"task_text": "Задача", "due_date": None, "priority": "medium", "category": None}
+    if 'JSON-массив' in system_prompt:
+        numbered = re.findall(r'^\d+\. ', prompt, re.MULTILINE)
+        return json.dumps([item] * len(numbered), ensure_ascii=False)
+    return json.dumps(item, ensure_ascii=False)
+
+ai_service._request_completion = fake_completion
+
+async def main() -> None:
+    lines = [random.choice(AMBIGUOUS if random.random() < args.ambiguous else CLEAR) for _ in range(args.lines)]
+
+    start = time.perf_counter()
+    await add_task(1, random.choice(AMBIGUOUS))
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for line in lines:
+        await add_task(2, line)
+    sequential_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = await add_tasks_bulk(3, lines)
+    bulk_s = time.perf_counter() - start
+
+    scheduler.remove_all_jobs()
+    await dispose_engines()
+    print(json.dumps({
+        "lines": args.lines,
+        "llm_latency_s": args.llm_latency,
+        "single_add_s": single_s,
+        "sequential_adds_s": sequential_s,
+        "bulk_import_s": bulk_s,
+        "bulk_added": len(result.added),
+        "bulk_vs_single_add": bulk_s / single_s,
+    }, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+# benchmarks/bench_concurrent_handlers.py
+# -*- coding: utf-8 -*-
+# Пропускная способность операций task_manager при N одновременных пользователях.
+# Каждый пользователь выполняет цикл: add_task -> страница /list -> mark_task_as_done.
+#
+#   python benchmarks/bench_concurrent_handlers.py --users 1 10 50 100 --rounds 20
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, nargs='+', default=[1, 10, 50, 100])
+parser.add_argument('--rounds', type=int, default=20, help='циклов add/list/done на пользователя')
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine создается при импорте db
+db_path = os.path.join(tempfile.mkdtemp(), 'bench_concurrency.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import dispose_engines
+from task_manager import add_task, get_user_tasks_page, mark_task_as_done
+
+# Текст разбирается локальным парсером, поэтому LLM не вызывается
+TASK_TEXT = "Купить хлеб завтра в 18:00 high #покупки"
+
+async def user_session(user_id: int) -> int:
+    ops = 0
+    for _ in range(args.rounds):
+        await add_task(user_id, TASK_TEXT)
+        tasks, _, _ = await get_user_tasks_page(user_id)
+        ops += 2
+        if tasks:
+            await mark_task_as_done(user_id, tasks[0].id)
+            ops += 1
+    return ops
+
+async def run(users: int) -> dict:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(user_session(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - start
+    return {"users": users, "ops": sum(results), "elapsed_s": elapsed, "ops_per_s": sum(results) / elapsed}
+
+async def main() -> None:
+    report = [await run(users) for users in args.users]
+    await dispose_engines()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
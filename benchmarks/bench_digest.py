@@ -0,0 +1,107 @@
+# benchmarks/bench_digest.py
+# -*- coding: utf-8 -*-
+# Генерация ежедневных сводок для большого числа пользователей: одна агрегирующая выборка задач и пакетные
+# запросы к модели (DIGEST_USERS_PER_REQUEST пользователей в запросе, не больше DIGEST_MAX_CONCURRENCY одновременно).
+# Для сравнения — число запросов, если бы каждый пользователь спрашивал модель о своих задачах сам.
+# OpenRouter заменен локальной заглушкой (fake_openrouter.py).
+#
+#   python benchmarks/bench_digest.py --users 2000 --tasks 20 --llm-latency 0.5
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_openrouter import FakeOpenRouter
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=2000)
+parser.add_argument('--tasks', type=int, default=20, help='задач на пользователя (в среднем)')
+parser.add_argument('--llm-latency', type=float, default=0.5)
+parser.add_argument('--per-request', type=int, default=8, help='DIGEST_USERS_PER_REQUEST')
+parser.add_argument('--concurrency', type=int, default=2, help='DIGEST_MAX_CONCURRENCY')
+parser.add_argument('--window-minutes', type=float, default=120, help='окно обычного прохода (DIGEST_LEAD_MINUTES по умолчанию)')
+args = parser.parse_args()
+
+fake_llm = FakeOpenRouter(latency=args.llm_latency).start()
+# Конфигурация читается при импорте модулей бота
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_digest.db')}",
+    OPENROUTER_BASE_URL=fake_llm.url, METRICS_PORT='0',
+    DIGEST_USERS_PER_REQUEST=str(args.per_request), DIGEST_MAX_CONCURRENCY=str(args.concurrency),
+    DIGEST_LEAD_MINUTES=str(24 * 60),
+)
+
+from sqlalchemy import func, select
+
+from db import Task, User, Digest, engine, dispose_engines
+import task_manager
+
+def populate(now: datetime) -> int:
+    random.seed(1)
+    rows, task_id = [], 1
+    for user_id in range(1, args.users + 1):
+        for _ in range(random.randint(0, 2 * args.tasks)):
+            status = random.choice(('pending', 'pending', 'overdue', 'completed'))
+            due_date = now + timedelta(hours=random.uniform(-48, 240)) if random.random() < 0.7 else None
+            rows.append({"id": task_id, "user_id": user_id, "task_text": f"Задача {task_id}", "status": status,
+                         "priority": random.choice(('high', 'medium', 'low')),
+                         "due_date": due_date.replace(tzinfo=None) if due_date else None})
+            task_id += 1
+    # Часы сводки разбросаны по суткам: в обычный проход (окно DIGEST_LEAD_MINUTES) попадает малая часть пользователей.
+    # У каждого третьего строки в users нет — у него час и пояс по умолчанию
+    users = [{"user_id": user_id, "digest_hour": random.randrange(24), "digest_enabled": True}
+             for user_id in range(1, args.users + 1) if user_id % 3]
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+        conn.execute(User.__table__.insert(), users)
+        return conn.execute(select(func.count(func.distinct(Task.user_id))).where(Task.status.in_(('pending', 'overdue')))).scalar()
+
+async def main() -> None:
+    now = datetime.now(pytz.utc)
+    users_with_tasks = populate(now)
+
+    started = time.perf_counter()
+    window_candidates = await task_manager._load_digest_candidates(now, now + timedelta(minutes=args.window_minutes))
+    window_query_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidates = await task_manager._load_digest_candidates(now, now + timedelta(days=1))
+    query_s = time.perf_counter() - started
+
+    report = await task_manager.generate_daily_digests(now)
+    rerun = await task_manager.generate_daily_digests(now)
+    with engine.connect() as conn:
+        stored = conn.execute(select(func.count(Digest.id))).scalar()
+
+    print(json.dumps({
+        "users_with_open_tasks": users_with_tasks,
+        "window_query_s": round(window_query_s, 3),
+        "window_candidates": len(window_candidates),
+        "aggregate_query_s": round(query_s, 3),
+        "candidates": len(candidates),
+        "digests": report["digests"],
+        "stored": stored,
+        "llm_requests": fake_llm.stats["requests"],
+        "llm_requests_per_user": round(fake_llm.stats["requests"] / max(1, report["digests"]), 3),
+        "per_user_llm_requests": users_with_tasks,
+        "fallbacks": report["fallbacks"],
+        "generation_s": round(report["seconds"], 2),
+        "rerun_digests": rerun["digests"],
+    }, ensure_ascii=False, indent=2))
+    await dispose_engines()
+    fake_llm.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
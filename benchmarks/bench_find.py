@@ -0,0 +1,93 @@
+# benchmarks/bench_find.py
+# -*- coding: utf-8 -*-
+# Задержка поиска /find (search_tasks) на больших таблицах: полнотекстовый индекс FTS5 против наивного
+# поиска подстрокой (LIKE по задачам пользователя — то, что search_tasks делает без индекса).
+# Обычные пользователи с сотней задач и несколько «тяжелых» с десятками тысяч задач; у трети задач есть заметки.
+#
+#   python benchmarks/bench_find.py --tasks 2000000 --heavy-tasks 50000 --queries 200
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--tasks', type=int, default=2_000_000, help='всего задач')
+parser.add_argument('--tasks-per-user', type=int, default=100)
+parser.add_argument('--heavy-users', type=int, default=5)
+parser.add_argument('--heavy-tasks', type=int, default=50_000, help='задач у каждого тяжелого пользователя')
+parser.add_argument('--queries', type=int, default=200)
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine и поисковый индекс создаются при импорте db
+db_path = os.path.join(tempfile.mkdtemp(), 'bench_find.db')
+os.environ.update(DATABASE_URL=f"sqlite:///{db_path}", METRICS_PORT='0', LOG_LEVEL='WARNING')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Task, TaskNote, engine, dispose_engines
+import task_manager
+
+VERBS = ("Купить", "Позвонить", "Написать", "Отправить", "Забрать", "Оплатить", "Починить", "Прочитать", "Записаться", "Убрать")
+NOUNS = ("молоко", "хлеб", "посылку", "счет", "отчет", "маме", "врачу", "велосипед", "книгу", "билеты", "ёлку",
+         "квартиру", "договор", "презентацию", "машину", "подарок", "лекарства", "документы", "стоматологу", "интернет")
+QUERIES = ("молока", "посылка", "отчета", "ёлка", "велосипеды", "договор оплатить", "билеты купить", "презентация",
+           "стоматолог", "документов", "нет такого слова")
+
+def task_text(rng: random.Random) -> str:
+    return f"{rng.choice(VERBS)} {rng.choice(NOUNS)} {rng.choice(NOUNS)} {rng.randint(1, 999)}"
+
+def populate() -> tuple[list[int], list[int]]:
+    rng = random.Random(1)
+    heavy = list(range(1, args.heavy_users + 1))
+    owners = [user_id for user_id in heavy for _ in range(args.heavy_tasks)]
+    normal_count = max(0, args.tasks - len(owners))
+    normal_users = max(1, normal_count // args.tasks_per_user)
+    owners += [args.heavy_users + 1 + i % normal_users for i in range(normal_count)]
+    rng.shuffle(owners)
+
+    started = time.perf_counter()
+    chunk = 50_000
+    for start in range(0, len(owners), chunk):
+        rows, notes = [], []
+        for i, user_id in enumerate(owners[start:start + chunk], start + 1):
+            notes_count = rng.randint(1, 5) if rng.random() < 0.3 else 0
+            notes += [{"task_id": i, "text": task_text(rng)} for _ in range(notes_count)]
+            rows.append({"id": i, "user_id": user_id, "task_text": task_text(rng), "notes_count": notes_count,
+                         "status": rng.choice(('pending', 'completed')), "priority": "medium"})
+        with engine.begin() as conn:
+            conn.execute(Task.__table__.insert(), rows)
+            conn.execute(TaskNote.__table__.insert(), notes)
+    elapsed = time.perf_counter() - started
+    print(f"Вставлено {len(owners)} задач за {elapsed:.1f} с ({len(owners) / elapsed:.0f} строк/с, с обновлением индекса), "
+          f"размер БД {os.path.getsize(db_path) / 2**20:.0f} МБ")
+    return heavy, list(range(args.heavy_users + 1, args.heavy_users + 1 + normal_users))
+
+async def measure(users: list[int], backend: str | None) -> dict:
+    task_manager.SEARCH_BACKEND = backend
+    rng = random.Random(2)
+    latencies, found = [], 0
+    for _ in range(args.queries):
+        started = time.perf_counter()
+        tasks, _ = await task_manager.search_tasks(rng.choice(users), rng.choice(QUERIES))
+        latencies.append((time.perf_counter() - started) * 1000)
+        found += len(tasks)
+    latencies.sort()
+    return {"p50_ms": round(statistics.median(latencies), 2), "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+            "avg_results": round(found / args.queries, 1)}
+
+async def main() -> None:
+    heavy, normal = populate()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+    for name, users in ((f"обычные (~{args.tasks_per_user} задач)", normal), (f"тяжелые ({args.heavy_tasks} задач)", heavy)):
+        for backend, label in (('fts5', 'FTS5'), (None, 'LIKE')):
+            print(f"{name:<28} {label:<5} {json.dumps(await measure(users, backend))}")
+    await dispose_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+# benchmarks/bench_list_tasks.py
+# -*- coding: utf-8 -*-
+# Задержка get_user_tasks (/list) на большой таблице задач: запросы к БД и кеш задач в памяти.
+#
+#   python benchmarks/bench_list_tasks.py --rows 1000000 --users 10000
+#   python benchmarks/bench_list_tasks.py --no-cache      # только БД
+#   python benchmarks/bench_list_tasks.py --drop-indexes   # для сравнения с полным сканированием
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--rows', type=int, default=1_000_000)
+parser.add_argument('--users', type=int, default=10_000)
+parser.add_argument('--queries', type=int, default=500)
+parser.add_argument('--drop-indexes', action='store_true', help='удалить вторичные индексы перед замером')
+parser.add_argument('--no-cache', action='store_true', help='не замерять кеш задач')
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine создается при импорте db
+db_path = os.path.join(tempfile.mkdtemp(), 'bench_list.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Task, engine, dispose_engines
+from task_manager import get_user_tasks, task_cache
+
+PRIORITIES = ('high', 'medium', 'low')
+STATUSES = ('pending', 'pending', 'completed')
+CATEGORIES = (None, 'работа', 'покупки', 'личное')
+
+def populate() -> None:
+    now = datetime.now()
+    chunk = 50_000
+    with engine.begin() as conn:
+        for offset in range(0, args.rows, chunk):
+            conn.execute(Task.__table__.insert(), [
+                {
+                    "user_id": random.randint(1, args.users),
+                    "task_text": f"Задача {i}",
+                    "due_date": now + timedelta(hours=random.randint(-100, 1000)) if random.random() < 0.6 else None,
+                    "status": random.choice(STATUSES),
+                    "priority": random.choice(PRIORITIES),
+                    "category": random.choice(CATEGORIES),
+                }
+                for i in range(offset, min(offset + chunk, args.rows))
+            ])
+        if args.drop_indexes:
+            for index in Task.__table__.indexes:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        conn.exec_driver_sql("ANALYZE")
+
+async def measure(category: str | None, user_ids: list[int]) -> dict:
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        await get_user_tasks(user_id, category=category)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[int(0.95 * (len(timings) - 1))],
+        "max_ms": timings[-1],
+    }
+
+async def run() -> dict:
+    user_ids = [random.randint(1, args.users) for _ in range(args.queries)]
+    max_users = task_cache.max_users
+    task_cache.max_users = 0
+    report = {"db": {"list_all": await measure(None, user_ids), "list_category": await measure('работа', user_ids)}}
+    if not args.no_cache:
+        task_cache.max_users = max_users
+        # Первый проход заполняет кеш (промахи), второй — типичный повторный /list
+        report["cache_cold"] = {"list_all": await measure(None, user_ids)}
+        report["cache_warm"] = {"list_all": await measure(None, user_ids), "list_category": await measure('работа', user_ids)}
+        report["cache_stats"] = task_cache.stats()
+    await dispose_engines()
+    return report
+
+def main() -> None:
+    start = time.perf_counter()
+    populate()
+    populate_s = time.perf_counter() - start
+    print(json.dumps({
+        "rows": args.rows,
+        "users": args.users,
+        "indexes": not args.drop_indexes,
+        "populate_s": populate_s,
+        **asyncio.run(run()),
+    }, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
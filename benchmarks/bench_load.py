@@ -0,0 +1,208 @@
+# benchmarks/bench_load.py
+# -*- coding: utf-8 -*-
+# Нагрузочный прогон обработчиков main.py: N пользователей одновременно выполняют сценарий
+# (добавление, список, выполнение, свободный текст). Telegram заменен инжектором апдейтов,
+# OpenRouter — локальной заглушкой (fake_openrouter.py). Отчет — JSON, чтобы сравнивать версии.
+#
+#   python benchmarks/bench_load.py --users 50 --ops 20 --llm-latency 0.8 --output report.json
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_openrouter import FakeOpenRouter
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=20)
+parser.add_argument('--ops', type=int, default=20, help='операций на пользователя')
+parser.add_argument('--llm-latency', type=float, default=0.5)
+parser.add_argument('--llm-jitter', type=float, default=0.1)
+parser.add_argument('--llm-error-rate', type=float, default=0.0)
+parser.add_argument('--workload', help='JSON-файл с весами операций, например {"add": 4, "list": 3, "done": 2, "chat": 1}')
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--output', help='куда записать JSON-отчет (по умолчанию только stdout)')
+args = parser.parse_args()
+
+# Окружение задается до импорта модулей бота: конфигурация читается при импорте
+fake_llm = FakeOpenRouter(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate).start()
+os.environ['OPENROUTER_BASE_URL'] = fake_llm.url
+os.environ['OPENROUTER_API_KEY'] = 'fake'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+os.environ.setdefault('AI_RETRY_BACKOFF', '0.05')
+
+from sqlalchemy import event
+
+import main
+import db
+from config import MESSAGE_DEBOUNCE_SECONDS
+from throttling import Debouncer
+from ai_service import close_client
+from task_manager import scheduler
+
+DEFAULT_WORKLOAD = {"start": 0.5, "add": 4, "list": 3, "done": 1.5, "chat": 1}
+CLEAR_TASKS = ["Купить хлеб завтра в 18:00 high #покупки", "Позвонить другу", "Заплатить по счету low #финансы",
+               "Тренировка в зале #спорт", "Отчёт в пятницу в 9:30 высокий приоритет #работа"]
+CHAT_TEXTS = ["Купить молоко утром", "Надо бы разобрать почту на неделе", "Сдать 3 отчета к концу месяца"]
+
+# --- Инжектор апдейтов: минимальные объекты с тем интерфейсом, который используют обработчики ---
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.full_name = f"User {user_id}"
+
+    def mention_html(self) -> str:
+        return f'<a href="tg://user?id={self.id}">{self.full_name}</a>'
+
+class FakeMessage:
+    def __init__(self, text: str, replies: list):
+        self.text = text
+        self._replies = replies
+
+    async def reply_text(self, text, **kwargs):
+        self._replies.append(text)
+
+    async def reply_html(self, text, **kwargs):
+        self._replies.append(text)
+
+class FakeUpdate:
+    def __init__(self, user: FakeUser, text: str, replies: list):
+        self.effective_user = user
+        self.effective_chat = user
+        self.message = FakeMessage(text, replies)
+
+class FakeApplication:
+    # Задачи, которые обработчик запустил через application.create_task (пакет сообщений после debounce)
+    def __init__(self):
+        self.tasks = []
+
+    def create_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.append(task)
+        return task
+
+class FakeContext:
+    bot_data = {'message_debouncer': Debouncer(MESSAGE_DEBOUNCE_SECONDS, main._flush_messages)}
+
+    def __init__(self, args: list[str], user_data: dict):
+        self.args = args
+        self.user_data = user_data
+        self.application = FakeApplication()
+
+# --- Счетчик запросов к БД по операциям ---
+
+current_op = contextvars.ContextVar('current_op', default=None)
+db_queries = defaultdict(int)
+
+def _count_query(*_):
+    db_queries[current_op.get()] += 1
+
+event.listen(db.engine, "before_cursor_execute", _count_query)
+event.listen(db.async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+# --- Сценарий ---
+
+latencies = defaultdict(list)
+errors = defaultdict(int)
+
+async def run_op(op: str, user: FakeUser, user_data: dict, known_ids: list[int]) -> None:
+    replies = []
+    if op == 'start':
+        handler, text = main.start, "/start"
+    elif op == 'add':
+        handler, text = main.add_task_command, "/add " + random.choice(CLEAR_TASKS)
+    elif op == 'list':
+        handler, text = main.list_tasks_command, "/list"
+    elif op == 'done':
+        task_id = random.choice(known_ids) if known_ids else 1
+        handler, text = main.done_task_command, f"/done {task_id}"
+    else:
+        handler, text = main.handle_message, random.choice(CHAT_TEXTS)
+
+    context_args = text.split()[1:] if text.startswith('/') else []
+    current_op.set(op)
+    start = time.perf_counter()
+    context = FakeContext(context_args, user_data)
+    try:
+        await handler(FakeUpdate(user, text, replies), context)
+        # Свободный текст обрабатывается после окна debounce: задержка операции — до ответа
+        await asyncio.gather(*context.application.tasks)
+    except Exception as e:
+        errors[op] += 1
+        print(f"Ошибка в операции {op}: {e}")
+        return
+    latencies[op].append((time.perf_counter() - start) * 1000)
+
+    if op == 'list':
+        # Запоминаем номера задач из ответа, чтобы /done попадал в существующие задачи
+        known_ids[:] = [int(task_id) for reply in replies for task_id in re.findall(r'\*(\d+)\.\*', str(reply))]
+
+async def user_session(user_id: int, workload: dict) -> None:
+    user, user_data, known_ids = FakeUser(user_id), {}, []
+    ops, weights = zip(*workload.items())
+    for op in random.choices(ops, weights=weights, k=args.ops):
+        await run_op(op, user, user_data, known_ids)
+
+def percentile(values: list[float], p: float) -> float:
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def build_report(elapsed: float) -> dict:
+    per_op = {}
+    for op, values in sorted(latencies.items()):
+        values.sort()
+        per_op[op] = {
+            "count": len(values),
+            "errors": errors[op],
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "mean_ms": statistics.fmean(values),
+            "db_queries_per_op": db_queries[op] / len(values),
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "config": {"users": args.users, "ops_per_user": args.ops, "llm_latency_s": args.llm_latency,
+                   "llm_jitter_s": args.llm_jitter, "llm_error_rate": args.llm_error_rate, "seed": args.seed},
+        "elapsed_s": elapsed,
+        "throughput_ops_per_s": total / elapsed,
+        "operations": per_op,
+        "db_queries_total": sum(db_queries.values()),
+        "llm_requests": fake_llm.stats["requests"],
+        "llm_errors": fake_llm.stats["errors"],
+    }
+
+async def run() -> dict:
+    random.seed(args.seed)
+    workload = DEFAULT_WORKLOAD
+    if args.workload:
+        with open(args.workload, encoding='utf-8') as f:
+            workload = json.load(f)
+    start = time.perf_counter()
+    await asyncio.gather(*(user_session(user_id, workload) for user_id in range(1, args.users + 1)))
+    elapsed = time.perf_counter() - start
+    scheduler.remove_all_jobs()
+    await close_client()
+    await db.dispose_engines()
+    return build_report(elapsed)
+
+if __name__ == "__main__":
+    report = asyncio.run(run())
+    fake_llm.stop()
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,86 @@
+# benchmarks/bench_model_fallback.py
+# -*- coding: utf-8 -*-
+# Хвостовая задержка запросов к модели: одна модель, цепочка с SLO и circuit breaker, hedged-запросы.
+# Модели имитируются задержками: у основной тяжелый хвост и период недоступности, запасная быстрая.
+#
+#   python benchmarks/bench_model_fallback.py --requests 200 --slow-share 0.1 --outage 0.2
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import ModelRouter
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--requests', type=int, default=200)
+parser.add_argument('--slow-share', type=float, default=0.1, help='доля медленных ответов основной модели')
+parser.add_argument('--outage', type=float, default=0.2, help='доля запросов, на которые основная модель лежит (подряд)')
+parser.add_argument('--scale', type=float, default=0.05, help='масштаб времени: 1.0 = реальные секунды')
+args = parser.parse_args()
+
+# Предупреждения об ошибках модели ожидаемы и только засоряют вывод
+logging.getLogger('model_router').setLevel(logging.ERROR)
+
+PRIMARY, FAST = 'primary', 'fast'
+
+class FakeModels:
+    def __init__(self):
+        self.index = 0
+        outage_len = int(args.requests * args.outage)
+        self.outage = range(args.requests // 2, args.requests // 2 + outage_len)
+
+    async def call(self, model: str) -> str:
+        if model == PRIMARY:
+            if self.index in self.outage:
+                await asyncio.sleep(0.2 * args.scale)
+                raise httpx.ConnectError("primary is down")
+            delay = 12.0 if random.random() < args.slow_share else random.uniform(1.0, 2.0)
+        else:
+            delay = random.uniform(0.5, 1.0)
+        await asyncio.sleep(delay * args.scale)
+        return model
+
+def summary(latencies: list[float], winners: list[str]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50": round(statistics.median(latencies) / args.scale, 2),
+        "p95": round(latencies[int(0.95 * (len(latencies) - 1))] / args.scale, 2),
+        "max": round(latencies[-1] / args.scale, 2),
+        "fast_share": round(winners.count(FAST) / len(winners), 2),
+        "failed": winners.count(None),
+    }
+
+async def run(name: str, router: ModelRouter | None) -> None:
+    random.seed(1)
+    models = FakeModels()
+    latencies, winners = [], []
+    for i in range(args.requests):
+        models.index = i
+        start = time.perf_counter()
+        try:
+            if router is None:
+                winners.append(await models.call(PRIMARY))
+            else:
+                winners.append(await router.run(PRIMARY, models.call))
+        except httpx.HTTPError:
+            winners.append(None)
+        latencies.append(time.perf_counter() - start)
+    print(f"{name:<22} {summary(latencies, winners)}")
+
+async def main() -> None:
+    slos = {PRIMARY: 8.0 * args.scale, FAST: 4.0 * args.scale}
+    common = dict(slos=slos, default_slo=8.0 * args.scale, breaker_failures=3, breaker_cooldown=5.0 * args.scale)
+    await run("одна модель", None)
+    await run("цепочка + breaker", ModelRouter([FAST], **common))
+    await run("цепочка + hedge", ModelRouter([FAST], hedge_model=FAST, hedge_delay=2.5 * args.scale, **common))
+
+asyncio.run(main())
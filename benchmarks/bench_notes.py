@@ -0,0 +1,68 @@
+# benchmarks/bench_notes.py
+# -*- coding: utf-8 -*-
+# Стоимость /note на задаче с большим числом заметок: прежняя склейка в tasks.notes (чтение и перезапись всей
+# строки, ответ со всем текстом) против add_task_note с отдельной строкой в task_notes.
+#
+#   python benchmarks/bench_notes.py --notes 2000
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pytz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--notes', type=int, default=2000, help='заметок к одной задаче')
+args = parser.parse_args()
+
+os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_notes.db')}", METRICS_PORT='0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+
+from db import Task, engine, get_async_session, dispose_engines
+import task_manager
+
+NOTE = "Уточнил детали у коллеги, перенести на следующую неделю"
+
+async def legacy_add_note(task_id: int) -> str:
+    # add_task_note до переноса заметок в task_notes
+    session = get_async_session()
+    try:
+        notes = await session.scalar(select(Task.notes).where(Task.id == task_id))
+        stamp = datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M')
+        notes = f"{notes}\n--- Дополнение ({stamp}): {NOTE}" if notes else f"Дополнение ({stamp}): {NOTE}"
+        await session.execute(update(Task).where(Task.id == task_id).values(notes=notes))
+        await session.commit()
+        return f"К задаче '{task_id}' добавлена заметка. Теперь она выглядит так: _{notes}_"
+    finally:
+        await session.close()
+
+async def run(name: str, add) -> dict:
+    timings, reply_bytes = [], 0
+    for _ in range(args.notes):
+        started = time.perf_counter()
+        reply = await add()
+        timings.append((time.perf_counter() - started) * 1000)
+        reply_bytes = len(reply.encode('utf-8'))
+    tail = sorted(timings[-100:])
+    return {"mode": name, "first_100_ms": round(sum(timings[:100]) / 100, 3), "last_100_ms": round(sum(tail) / 100, 3),
+            "last_reply_bytes": reply_bytes}
+
+async def main() -> None:
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), [
+            {"id": task_id, "user_id": 1, "task_text": f"Задача {task_id}", "status": "pending", "priority": "medium"}
+            for task_id in (1, 2)
+        ])
+    print(json.dumps(await run("склейка в tasks.notes", lambda: legacy_add_note(1)), ensure_ascii=False))
+    print(json.dumps(await run("task_notes", lambda: task_manager.add_task_note(1, 2, NOTE)), ensure_ascii=False))
+    await dispose_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+# benchmarks/bench_overdue_sweep.py
+# -*- coding: utf-8 -*-
+# Стоимость прохода sweep_overdue_tasks при росте таблицы: число свежепросроченных задач одинаковое,
+# растет только количество остальных (будущих и выполненных). Для сравнения — наивный проход,
+# который загружает все ожидающие задачи и меняет статус по одной.
+#
+#   python benchmarks/bench_overdue_sweep.py --sizes 10000 100000 500000 --overdue 200
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+parser.add_argument('--overdue', type=int, default=200, help='задач, у которых срок прошел к моменту прохода')
+parser.add_argument('--users', type=int, default=10_000)
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine создается при импорте db
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_overdue.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, update
+
+from db import Task, engine, get_session, dispose_engines
+import task_manager
+
+def populate(start_id: int, count: int, now: datetime) -> None:
+    rows = []
+    for i in range(count):
+        if random.random() < 0.6:
+            # Выполненные задачи со сроком в прошлом не должны попадать в проход
+            status, due_date = 'completed', now - timedelta(days=random.uniform(1, 365))
+        else:
+            status, due_date = 'pending', now + timedelta(days=random.uniform(1, 60))
+        rows.append({"id": start_id + i, "user_id": random.randint(1, args.users), "task_text": f"Задача {start_id + i}",
+                     "due_date": due_date.replace(tzinfo=None), "status": status, "priority": "medium"})
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+
+def make_overdue() -> None:
+    # Одни и те же задачи каждый раз становятся просроченными заново
+    with engine.begin() as conn:
+        conn.execute(update(Task).where(Task.user_id == 0).values(status='pending'))
+
+def naive_sweep(cutoff: datetime) -> int:
+    session = get_session()
+    try:
+        touched = 0
+        for task in session.query(Task).filter(Task.status == 'pending').all():
+            if task.due_date and task.due_date < cutoff:
+                task.status = 'overdue'
+                touched += 1
+        session.commit()
+        return touched
+    finally:
+        session.close()
+
+async def main() -> None:
+    random.seed(1)
+    now = datetime.now(pytz.utc)
+    cutoff = (now - timedelta(minutes=task_manager.OVERDUE_GRACE_MINUTES)).replace(tzinfo=None)
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), [
+            {"id": i, "user_id": 0, "task_text": f"Просроченная {i}", "priority": "medium", "status": "pending",
+             "due_date": (now - timedelta(hours=2, minutes=i)).replace(tzinfo=None)}
+            for i in range(1, args.overdue + 1)
+        ])
+
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE status = 'pending' AND due_date < :cutoff ORDER BY due_date LIMIT 5000"
+        ), {"cutoff": cutoff}).all()
+    print("План выборки:", "; ".join(row[-1] for row in plan))
+
+    next_id = args.overdue + 1
+    for size in args.sizes:
+        populate(next_id, size - (next_id - 1), now)
+        next_id = size + 1
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+
+        make_overdue()
+        started = time.perf_counter()
+        naive_rows = naive_sweep(cutoff)
+        naive_s = time.perf_counter() - started
+
+        make_overdue()
+        report = await task_manager.sweep_overdue_tasks(now)
+        idle = await task_manager.sweep_overdue_tasks(now)
+        print(json.dumps({
+            "tasks": size,
+            "naive_rows": naive_rows,
+            "naive_s": round(naive_s, 4),
+            "sweep_rows": report["rows"],
+            "sweep_s": round(report["seconds"], 4),
+            "idle_sweep_s": round(idle["seconds"], 4),
+        }))
+    await dispose_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
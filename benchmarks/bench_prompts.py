@@ -0,0 +1,113 @@
+# benchmarks/bench_prompts.py
+# -*- coding: utf-8 -*-
+# Длина промпта разбора задачи против точности: прежний промпт и компактные шаблоны из prompts.py.
+#
+#   python benchmarks/bench_prompts.py          # только оценка токенов на одно добавление
+#   python benchmarks/bench_prompts.py --ai     # + точность и задержка на корпусе (нужен OPENROUTER_API_KEY)
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_service
+from metrics import LLM_TOKENS
+from prompts import PARSE_SYSTEM_PROMPT, build_parse_prompt, estimate_tokens, parse_output_budget
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.json')
+FIELDS = ('task_text', 'due_date', 'priority', 'category')
+
+def legacy_prompt(task_text: str, now: datetime) -> str:
+    # Промпт parse_task_with_ai до перехода на шаблоны, дословно: с двойными скобками и неподставленным {tomorrow_date}
+    return (
+        f"Пользователь '0' хочет добавить задачу: '{task_text}'. "
+        f"Текущая дата (UTC): {now.strftime('%Y-%m-%d')}. "
+        "Извлеки из текста задачи:\n"
+        "1. **task_text**: Сама суть задачи (например, 'Купить молоко', 'Позвонить другу').\n"
+        "2. **due_date**: Дата и время в формате `YYYY-MM-DD HH:MM:SS` или `null`, если не указано.\n"
+        "3. **priority**: Приоритет задачи. Должен быть одним из: 'high', 'medium', 'low'. "
+        "Если приоритет явно указан в тексте (например, 'высокий', 'low', 'средний'), используй его. "
+        "Если не указан, используй 'medium'.\n"
+        "4. **category**: Категория задачи. Может быть любой строкой (например, 'Работа', 'Личное', 'Покупки', 'Спорт'). "
+        "Если категория указана в тексте (например, 'задача #работа', 'купить молоко #покупки'), извлеки её. "
+        "Если не указана, используй `null`.\n"
+        "**Обязательно** возвращай JSON-объект, содержащий *все четыре* поля: `task_text`, `due_date`, `priority`, `category`.\n"
+        "Если не можешь понять, что задача, установи `task_text` в `null`."
+        "\nПримеры:\n"
+        " - 'Купить хлеб завтра в 18:00 high #покупки' -> `{{\"task_text\": \"Купить хлеб\", \"due_date\": \"{tomorrow_date} 18:00:00\", \"priority\": \"high\", \"category\": \"покупки\"}}`\n"
+        " - 'Заплатить по счету low #финансы' -> `{{\"task_text\": \"Заплатить по счету\", \"due_date\": null, \"priority\": \"low\", \"category\": \"финансы\"}}`\n"
+        " - 'Позвонить другу' -> `{{\"task_text\": \"Позвонить другу\", \"due_date\": null, \"priority\": \"medium\", \"category\": null}}`\n"
+        " - 'Тренировка в зале #спорт' -> `{{\"task_text\": \"Тренировка в зале\", \"due_date\": null, \"priority\": \"medium\", \"category\": \"спорт\"}}`\n"
+        "Твой ответ должен быть *только* JSON-объектом, без лишнего текста или форматирования (например, ```json)."
+    )
+
+VARIANTS = {
+    # имя -> (system prompt, функция user-сообщения, max_tokens, temperature)
+    'legacy': (ai_service.SYSTEM_PROMPT, legacy_prompt, lambda text: 200, 0.7),
+    'compact': (PARSE_SYSTEM_PROMPT, build_parse_prompt, parse_output_budget, 0),
+}
+
+def token_report(cases: list[dict], now: datetime) -> dict:
+    report = {}
+    for name, (system_prompt, build, budget, _) in VARIANTS.items():
+        static = estimate_tokens(system_prompt)
+        dynamic = [estimate_tokens(build(case['text'], now)) for case in cases]
+        report[name] = {
+            "system_tokens": static,
+            "user_tokens_avg": statistics.mean(dynamic),
+            "input_tokens_per_add": static + statistics.mean(dynamic),
+            "max_output_tokens_avg": statistics.mean(budget(case['text']) for case in cases),
+        }
+    return report
+
+async def accuracy_report(cases: list[dict], now: datetime) -> dict:
+    report = {}
+    try:
+        for name, (system_prompt, build, budget, temperature) in VARIANTS.items():
+            prompt_tokens_before = LLM_TOKENS.value(ai_service.OPENROUTER_MODEL, 'prompt')
+            timings, per_field, exact = [], {f: 0 for f in FIELDS}, 0
+            for case in cases:
+                start = time.perf_counter()
+                response = await ai_service._request_completion(
+                    build(case['text'], now), ai_service.OPENROUTER_MODEL, budget(case['text']), system_prompt, temperature
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+                parsed = ai_service._parse_single_response(response, case['text'])
+                matches = {f: (parsed.get(f) or None) == case['expected'].get(f) for f in FIELDS}
+                for f, ok in matches.items():
+                    per_field[f] += ok
+                exact += all(matches.values())
+            report[name] = {
+                "exact_match": exact / len(cases),
+                "field_accuracy": {f: n / len(cases) for f, n in per_field.items()},
+                "latency_ms_p50": statistics.median(timings),
+                "prompt_tokens_per_add": (LLM_TOKENS.value(ai_service.OPENROUTER_MODEL, 'prompt') - prompt_tokens_before) / len(cases),
+            }
+    finally:
+        await ai_service.close_client()
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ai', action='store_true', help='прогнать корпус через модель с каждым вариантом промпта')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    now = pytz.utc.localize(datetime.strptime(corpus['now'], '%Y-%m-%d %H:%M:%S'))
+
+    report = {"estimated": token_report(corpus['cases'], now)}
+    if args.ai:
+        report["ai"] = asyncio.run(accuracy_report(corpus['cases'], now))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
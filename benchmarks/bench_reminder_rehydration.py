@@ -0,0 +1,73 @@
+# benchmarks/bench_reminder_rehydration.py
+# -*- coding: utf-8 -*-
+# Время восстановления напоминаний при старте при большом числе ожидающих задач.
+#
+#   python benchmarks/bench_reminder_rehydration.py --tasks 100000 --days 30
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--tasks', type=int, default=100_000, help='число ожидающих задач со сроком')
+parser.add_argument('--days', type=float, default=30, help='сроки задач равномерно распределены на столько дней вперед')
+parser.add_argument('--users', type=int, default=10_000)
+args = parser.parse_args()
+
+# БД подменяется до импорта модулей бота: engine создается при импорте db
+db_path = os.path.join(tempfile.mkdtemp(), 'bench_reminders.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Task, engine
+import task_manager
+
+def populate(now: datetime) -> None:
+    rows = [
+        {
+            "user_id": random.randint(1, args.users),
+            "task_text": f"Задача {i}",
+            # Немного задач в прошлом — для проверки политики догоняния
+            "due_date": (now + timedelta(seconds=random.uniform(-7200, args.days * 86400))).replace(tzinfo=None),
+            "status": "pending",
+            "priority": "medium",
+        }
+        for i in range(args.tasks)
+    ]
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+
+def main() -> None:
+    now = datetime.now(pytz.utc)
+    start = time.perf_counter()
+    populate(now)
+    populate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = task_manager.rehydrate_reminders(now=now)
+    rehydrate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = task_manager._load_pending_reminders(None, now + timedelta(days=args.days + 1))
+    full_scan_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "pending_tasks": args.tasks,
+        "populate_s": populate_s,
+        "rehydrate_s": rehydrate_s,
+        "scheduled_in_horizon": stats["scheduled"],
+        "caught_up": stats["caught_up"],
+        "jobs_in_scheduler": len(task_manager.scheduler.get_jobs()),
+        "load_all_pending_rows_s": full_scan_s,
+        "all_pending_rows": len(rows),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
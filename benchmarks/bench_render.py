@@ -0,0 +1,91 @@
+# benchmarks/bench_render.py
+# -*- coding: utf-8 -*-
+# Стоимость отрисовки списка задач: прежний _render_task_list (конкатенация, pytz.timezone в цикле) и rendering.py.
+#
+#   python benchmarks/bench_render.py --tasks 1000 --repeat 200
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rendering import get_timezone, render_task_list
+from task_cache import CachedTask
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--tasks', type=int, default=1000)
+parser.add_argument('--repeat', type=int, default=200)
+args = parser.parse_args()
+
+LEGACY_NOTE = "Уточнить детали"
+
+def legacy_render(tasks, category_filter) -> str:
+    # Отрисовка из main.py до выноса в rendering.py
+    message = "Твои текущие задачи:\n\n"
+    if category_filter:
+        message = f"Твои задачи в категории *{category_filter.capitalize()}*:\n\n"
+
+    for task in tasks:
+        due_date_str = ""
+        if task.due_date:
+            display_tz = pytz.timezone('Europe/Amsterdam')
+            display_due_date = task.due_date.astimezone(display_tz)
+            due_date_str = f" (до {display_due_date.strftime('%Y-%m-%d %H:%M')})"
+
+        # Текст заметок тогда хранился в самой задаче; здесь у всех задач с заметками он одинаковый
+        notes_str = f" _(Заметки: {LEGACY_NOTE})_" if task.notes_count else ""
+
+        priority_display = ""
+        if task.priority == 'high':
+            priority_display = " 🔥*Высокий приоритет*🔥"
+        elif task.priority == 'medium':
+            priority_display = " 🟡Средний приоритет"
+        elif task.priority == 'low':
+            priority_display = " 🟢Низкий приоритет"
+
+        category_display = ""
+        if task.category:
+            category_display = f" #{task.category}"
+
+        message += f"*{task.id}.* {task.task_text}{due_date_str}{notes_str}{priority_display}{category_display}\n"
+    return message
+
+def make_tasks() -> list[CachedTask]:
+    random.seed(1)
+    now = datetime.now(pytz.utc).replace(tzinfo=None)
+    return [
+        CachedTask(
+            i, f"Задача номер {i}: купить_что-то *важное*",
+            now + timedelta(hours=random.randint(1, 500)) if random.random() < 0.6 else None,
+            random.choice(('high', 'medium', 'low')),
+            random.choice((None, 'работа', 'покупки', 'личное')),
+            1 if random.random() < 0.2 else 0,
+        )
+        for i in range(1, args.tasks + 1)
+    ]
+
+def measure(render) -> dict:
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        render()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {"p50_ms": round(statistics.median(timings), 3), "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3)}
+
+def main() -> None:
+    tasks = make_tasks()
+    tz = get_timezone('Europe/Amsterdam')
+    print(f"Задач в списке: {len(tasks)}")
+    print(f"прежняя отрисовка: {measure(lambda: legacy_render(tasks, None))}")
+    print(f"rendering.py:      {measure(lambda: render_task_list(tasks, None, tz))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_streaming.py
+# -*- coding: utf-8 -*-
+# Воспринимаемая задержка ответа в чате: обычный запрос против потокового (SSE) с правками сообщения.
+# Используется локальная заглушка OpenRouter; Telegram заменяется объектом, который считает отправки и правки.
+#
+#   python benchmarks/bench_streaming.py --latency 1.0 --token-delay 0.3 --runs 3
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--latency', type=float, default=1.0, help='задержка до первого фрагмента, секунды')
+parser.add_argument('--token-delay', type=float, default=0.3, help='пауза между фрагментами, секунды')
+parser.add_argument('--runs', type=int, default=3)
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_openrouter import FakeOpenRouter
+
+fake = FakeOpenRouter(latency=args.latency, token_delay=args.token_delay).start()
+# Настройки подменяются до импорта модулей бота
+os.environ['OPENROUTER_BASE_URL'] = fake.url
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_streaming.db')}"
+os.environ['AI_USER_BURST'] = str(args.runs * 2 + 2)
+
+import ai_service
+import main as bot
+from db import dispose_engines
+from metrics import LLM_TTFB
+
+class FakeMessage:
+    def __init__(self, started: float):
+        self.started = started
+        self.first_visible = None
+        self.sends = 0
+        self.edits = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.sends += 1
+        if self.first_visible is None:
+            self.first_visible = time.perf_counter() - self.started
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.edits += 1
+
+async def run() -> None:
+    prompt = "Пользователь 1 написал: 'привет'. Ответь ему как дружелюбный AI-ассистент."
+    blocking, streaming = [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        await ai_service.generate_ai_response(prompt, 1)
+        blocking.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        message = FakeMessage(started)
+        await bot._reply_streaming(message, ai_service.stream_ai_response(prompt, 1))
+        streaming.append((message.first_visible, time.perf_counter() - started, message.edits))
+
+    print(f"Обычный ответ:   первый текст через {sum(blocking) / len(blocking):.2f} с")
+    first = sum(item[0] for item in streaming) / len(streaming)
+    total = sum(item[1] for item in streaming) / len(streaming)
+    edits = sum(item[2] for item in streaming) / len(streaming)
+    print(f"Потоковый ответ: первый текст через {first:.2f} с, полностью через {total:.2f} с, правок {edits:.1f}")
+    print(f"TTFB по метрике: {LLM_TTFB.sum(ai_service.OPENROUTER_MODEL) / max(LLM_TTFB.count(ai_service.OPENROUTER_MODEL), 1):.2f} с")
+
+    await ai_service.close_client()
+    await dispose_engines()
+    fake.stop()
+
+asyncio.run(run())
@@ -0,0 +1,98 @@
+# benchmarks/bench_task_parser.py
+# -*- coding: utf-8 -*-
+# Сравнение локального парсера задач с LLM-путём: задержка и точность на регрессионном корпусе.
+#
+#   python benchmarks/bench_task_parser.py          # только локальный парсер
+#   python benchmarks/bench_task_parser.py --ai     # + сравнение с parse_task_with_ai (нужен OPENROUTER_API_KEY)
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_parser import parse_task_locally, is_confident
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.json')
+FIELDS = ('task_text', 'due_date', 'priority', 'category')
+
+def field_matches(parsed: dict, expected: dict) -> dict:
+    return {f: (parsed.get(f) or None) == expected.get(f) for f in FIELDS}
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def bench_local(cases: list[dict], now: datetime, repeat: int) -> dict:
+    timings = []
+    fast_path, fast_path_correct = 0, 0
+    per_field = {f: 0 for f in FIELDS}
+    for case in cases:
+        parsed, confidence = parse_task_locally(case['text'], now)
+        matches = field_matches(parsed, case['expected'])
+        for f, ok in matches.items():
+            per_field[f] += ok
+        if is_confident(confidence):
+            fast_path += 1
+            fast_path_correct += all(matches.values())
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse_task_locally(case['text'], now)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "cases": len(cases),
+        "fast_path_ratio": fast_path / len(cases),
+        "fast_path_accuracy": fast_path_correct / fast_path if fast_path else None,
+        "field_accuracy": {f: n / len(cases) for f, n in per_field.items()},
+        "latency_ms": {"p50": statistics.median(timings), "p95": percentile(timings, 95), "max": max(timings)},
+    }
+
+async def bench_ai(cases: list[dict]) -> dict:
+    from ai_service import parse_task_with_ai, close_client
+
+    timings = []
+    agreement = {f: 0 for f in FIELDS}
+    confident = 0
+    try:
+        for case in cases:
+            start = time.perf_counter()
+            ai_parsed = await parse_task_with_ai(case['text'], 0)
+            timings.append((time.perf_counter() - start) * 1000)
+            # Сравниваем с локальным результатом на текущей дате, т.к. модель видит сегодняшний день
+            local_parsed, confidence = parse_task_locally(case['text'])
+            if not is_confident(confidence):
+                continue
+            confident += 1
+            for f, ok in field_matches(local_parsed, ai_parsed).items():
+                agreement[f] += ok
+    finally:
+        await close_client()
+    return {
+        "latency_ms": {"p50": statistics.median(timings), "p95": percentile(timings, 95), "max": max(timings)},
+        "fast_path_agreement_with_ai": {f: n / confident for f, n in agreement.items()} if confident else None,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ai', action='store_true', help='также прогнать корпус через parse_task_with_ai')
+    parser.add_argument('--repeat', type=int, default=200, help='повторов на каждый случай для замера задержки')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    now = pytz.utc.localize(datetime.strptime(corpus['now'], '%Y-%m-%d %H:%M:%S'))
+
+    report = {"local": bench_local(corpus['cases'], now, args.repeat)}
+    if args.ai:
+        report["ai"] = asyncio.run(bench_ai(corpus['cases']))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
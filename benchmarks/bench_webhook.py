@@ -0,0 +1,156 @@
+# benchmarks/bench_webhook.py
+# -*- coding: utf-8 -*-
+# Пропускная способность приема апдейтов (апдейтов в секунду): polling с последовательной обработкой,
+# polling с параллельной обработкой и webhook с параллельной обработкой (PerUserUpdateProcessor).
+# Telegram и OpenRouter заменены локальными заглушками (fake_telegram.py, fake_openrouter.py); каждый режим
+# запускается в отдельном процессе со своей БД. Заодно проверяется, что ответы одному пользователю идут по порядку.
+#
+#   python benchmarks/bench_webhook.py --users 50 --updates 10 --api-latency 0.05 --llm-latency 0.3
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_openrouter import FakeOpenRouter
+from fake_telegram import FakeTelegram, make_update
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=50)
+parser.add_argument('--updates', type=int, default=10, help='апдейтов на пользователя')
+parser.add_argument('--api-latency', type=float, default=0.05, help='задержка ответа Bot API, секунды')
+parser.add_argument('--llm-latency', type=float, default=0.3, help='задержка ответа модели (неоднозначные задачи)')
+parser.add_argument('--concurrency', type=int, default=64, help='MAX_CONCURRENT_UPDATES для параллельных режимов')
+parser.add_argument('--connections', type=int, default=40, help='одновременных соединений Telegram к webhook')
+parser.add_argument('--mode', choices=('polling', 'webhook'), help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+SECRET = 'bench-secret'
+ADDED = re.compile(r"Купить хлеб (\d+)")
+
+def workload() -> list[dict]:
+    # Апдейты пользователей перемешаны, как в реальном потоке: сначала первое сообщение каждого, потом второе и т.д.
+    updates, update_id = [], 1
+    for i in range(args.updates):
+        for user_id in range(1, args.users + 1):
+            # «Купить хлеб N» локальный парсер считает неоднозначным, такие задачи разбирает модель (у каждого пользователя свой текст)
+            text = "/list" if i % 3 == 2 else f"/add Купить хлеб {i} ({user_id})"
+            updates.append(make_update(update_id, user_id, text))
+            update_id += 1
+    return updates
+
+def ordered(fake: FakeTelegram) -> bool:
+    for replies in fake.sent_by_chat.values():
+        numbers = [int(match.group(1)) for reply in replies if reply.startswith("Отлично!")
+                   for match in [ADDED.search(reply)] if match]
+        if numbers != sorted(numbers):
+            return False
+    return True
+
+async def post_updates(url: str, updates: list[dict]) -> None:
+    import httpx
+
+    # Как и Telegram, апдейты одного чата отправляются по одному соединению последовательно
+    lanes = [[] for _ in range(args.connections)]
+    for update in updates:
+        lanes[update["message"]["from"]["id"] % args.connections].append(update)
+
+    async def send(client: httpx.AsyncClient, lane: list[dict]) -> None:
+        for update in lane:
+            response = await client.post(url, json=update)
+            response.raise_for_status()
+
+    limits = httpx.Limits(max_connections=args.connections)
+    async with httpx.AsyncClient(headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}, limits=limits) as client:
+        await asyncio.gather(*(send(client, lane) for lane in lanes if lane))
+
+async def run_mode(fake: FakeTelegram, updates: list[dict]) -> dict:
+    import main as bot
+    from webhook import run_webhook
+
+    application = bot.build_application('123:bench', fake.base_url, args.concurrency)
+    started = None
+
+    if args.mode == 'webhook':
+        stop_event = asyncio.Event()
+        runner = asyncio.create_task(run_webhook(application, '127.0.0.1', 0, '/telegram',
+                                                 secret_token=SECRET, stop_event=stop_event))
+        while 'webhook_server' not in application.bot_data:
+            await asyncio.sleep(0.01)
+        server = application.bot_data['webhook_server']
+        started = time.perf_counter()
+        # Отправитель работает в своем потоке и event loop, чтобы не отнимать время у обработчиков бота
+        await asyncio.to_thread(asyncio.run, post_updates(f"http://127.0.0.1:{server.port}/telegram", updates))
+        done = await asyncio.to_thread(fake.wait_sent, len(updates), 300)
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        await runner
+    else:
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        await application.updater.start_polling(poll_interval=0, timeout=1)
+        started = time.perf_counter()
+        fake.push(updates)
+        done = await asyncio.to_thread(fake.wait_sent, len(updates), 300)
+        elapsed = time.perf_counter() - started
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    return {
+        "updates": len(updates),
+        "replies": fake.stats["sent"],
+        "complete": done,
+        "seconds": round(elapsed, 2),
+        "updates_per_sec": round(len(updates) / elapsed, 1),
+        "per_user_order": ordered(fake),
+    }
+
+def child() -> None:
+    fake = FakeTelegram(latency=args.api_latency).start()
+    fake_llm = FakeOpenRouter(latency=args.llm_latency).start()
+    # Конфигурация читается при импорте модулей бота, поэтому адрес заглушки задается до run_mode
+    os.environ['OPENROUTER_BASE_URL'] = fake_llm.url
+    try:
+        report = asyncio.run(run_mode(fake, workload()))
+        report["llm_requests"] = fake_llm.stats["requests"]
+        print(json.dumps(report))
+    finally:
+        fake.stop()
+        fake_llm.stop()
+
+def parent() -> None:
+    total = args.users * args.updates
+    print(f"{total} апдейтов от {args.users} пользователей, задержка Bot API {args.api_latency * 1000:.0f} мс, "
+          f"модели {args.llm_latency * 1000:.0f} мс")
+    runs = (
+        ("polling, по одному", 'polling', 1),
+        (f"polling, до {args.concurrency}", 'polling', args.concurrency),
+        (f"webhook, до {args.concurrency}", 'webhook', args.concurrency),
+    )
+    for name, mode, concurrency in runs:
+        # Конфигурация читается при импорте, поэтому каждый режим — отдельный процесс с чистой БД
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_webhook.db')}",
+                   METRICS_PORT='0', LOG_LEVEL='WARNING', AI_STREAMING='0', AI_USER_BURST='1000000')
+        argv = [sys.executable, __file__, '--mode', mode, '--users', str(args.users), '--updates', str(args.updates),
+                '--api-latency', str(args.api_latency), '--llm-latency', str(args.llm_latency), '--concurrency', str(concurrency),
+                '--connections', str(args.connections)]
+        output = subprocess.run(argv, env=env, capture_output=True, text=True, check=True).stdout
+        print(f"{name:<22} {output.strip().splitlines()[-1]}")
+
+if args.mode:
+    child()
+else:
+    parent()
@@ -0,0 +1,143 @@
+# benchmarks/fake_openrouter.py
+# -*- coding: utf-8 -*-
+# Локальная заглушка OpenRouter /chat/completions с настраиваемой задержкой и долей ошибок (поддерживает stream=true).
+#
+#   python benchmarks/fake_openrouter.py --port 8765 --latency 0.8 --jitter 0.3 --error-rate 0.05
+#   OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1/chat/completions python main.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PARSED_TASK = {"task_text": "Задача", "due_date": None, "priority": "medium", "category": None}
+
+def _completion_text(system_prompt: str, prompt: str) -> str:
+    # Ответ в формате, который ожидает вызывающий код (формат задан в system-сообщении)
+    if 'JSON-массив строк' in system_prompt:
+        count = len(re.findall(r'^Пользователь \d+:', prompt, re.MULTILINE))
+        return json.dumps(["Сегодня отличный день, чтобы закрыть самое важное. Начни с первой задачи! 💪"] * count,
+                          ensure_ascii=False)
+    if 'JSON-массив' in system_prompt:
+        count = len(re.findall(r'^\d+\. ', prompt, re.MULTILINE))
+        return json.dumps([PARSED_TASK] * count, ensure_ascii=False)
+    if 'JSON-объект' in system_prompt:
+        match = re.search(r"^Задача: (.*)$", prompt, re.MULTILINE)
+        return json.dumps(dict(PARSED_TASK, task_text=match.group(1) if match else "Задача"), ensure_ascii=False)
+    return "Привет! Я на связи и готов помочь с задачами. 💪"
+
+class FakeOpenRouter:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.5,
+                 jitter: float = 0.0, error_rate: float = 0.0, token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self) -> 'FakeOpenRouter':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего API
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with fake._lock:
+                    fake.stats["requests"] += 1
+                time.sleep(max(0.0, random.gauss(fake.latency, fake.jitter)) if fake.jitter else fake.latency)
+
+                if random.random() < fake.error_rate:
+                    with fake._lock:
+                        fake.stats["errors"] += 1
+                    self._send(random.choice((429, 500, 503)), {"error": {"message": "fake upstream error"}})
+                    return
+
+                messages = body.get('messages') or [{}]
+                prompt = messages[-1].get('content', '')
+                system_prompt = messages[0].get('content', '') if len(messages) > 1 else ''
+                text = _completion_text(system_prompt, prompt)
+                if body.get('stream'):
+                    self._send_stream(body.get('model'), text)
+                    return
+                # Без стриминга ответ приходит только после генерации всех слов
+                time.sleep(fake.token_delay * len(text.split()))
+                self._send(200, {
+                    "id": "fake",
+                    "model": body.get('model'),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                              "total_tokens": (len(prompt) + len(text)) // 4},
+                })
+
+            def _send(self, status: int, payload: dict):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, text: str):
+                # SSE по одному слову, как у настоящего API при stream=true
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                self._write_chunk(": OPENROUTER PROCESSING\n\n")
+                for word in re.findall(r'\S+\s*', text):
+                    delta = {"model": model, "choices": [{"index": 0, "delta": {"content": word}}]}
+                    self._write_chunk("data: " + json.dumps(delta, ensure_ascii=False) + "\n\n")
+                    time.sleep(fake.token_delay)
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, event: str):
+                data = event.encode('utf-8')
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='средняя задержка ответа, секунды')
+    parser.add_argument('--jitter', type=float, default=0.0, help='стандартное отклонение задержки')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 429/5xx')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='время генерации одного слова ответа')
+    args = parser.parse_args()
+    server = FakeOpenRouter(args.host, args.port, args.latency, args.jitter, args.error_rate, args.token_delay)
+    print(f"Fake OpenRouter: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# benchmarks/fake_telegram.py
+# -*- coding: utf-8 -*-
+# Локальная заглушка Telegram Bot API для нагрузочных прогонов: отдает апдейты через getUpdates (long polling),
+# принимает setWebhook/deleteWebhook и считает отправленные ботом сообщения и правки (с настраиваемой задержкой).
+#
+#   python benchmarks/fake_telegram.py --port 8780
+#   TELEGRAM_API_BASE_URL=http://127.0.0.1:8780/bot python main.py
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "TaskBot", "username": "fake_task_bot"}
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Апдейт с текстовым сообщением в личном чате, как его присылает Telegram."""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        "text": text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+class FakeTelegram:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.updates: list[dict] = []
+        self.webhook_url = ''
+        self.stats = {"sent": 0, "edited": 0, "other": 0}
+        self.sent_by_chat: dict[int, list[str]] = {}
+        self._cond = threading.Condition()
+        self._message_id = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        # PTB дописывает к base_url токен и имя метода: {base_url}{token}/sendMessage
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> 'FakeTelegram':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push(self, updates: list[dict]) -> None:
+        with self._cond:
+            self.updates.extend(updates)
+            self._cond.notify_all()
+
+    def wait_sent(self, count: int, timeout: float) -> bool:
+        """Ждет, пока бот отправит count сообщений (sendMessage)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.stats["sent"] < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Подтвержденные (update_id < offset) апдейты больше не отдаются
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return self.updates[:limit]
+
+    def _call(self, method: str, params: dict):
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = ''
+            return True
+        if method in ('sendMessage', 'editMessageText'):
+            # Сетевая задержка до настоящего API; на long polling не влияет
+            time.sleep(self.latency)
+            chat_id = int(params.get('chat_id') or 0)
+            with self._cond:
+                if method == 'sendMessage':
+                    self.stats["sent"] += 1
+                    self._message_id += 1
+                    self.sent_by_chat.setdefault(chat_id, []).append(params.get('text', ''))
+                else:
+                    self.stats["edited"] += 1
+                message_id = int(params.get('message_id') or self._message_id)
+                self._cond.notify_all()
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params.get('text', ''),
+            }
+        with self._cond:
+            self.stats["other"] += 1
+        return True
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = dict(parse_qsl(body.decode('utf-8')))
+                method = self.path.rsplit('/', 1)[-1]
+                payload = json.dumps({"ok": True, "result": fake._call(method, params)}, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа на sendMessage, секунды')
+    args = parser.parse_args()
+    fake = FakeTelegram(args.host, args.port, args.latency)
+    print(f"Fake Telegram Bot API: {fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# benchmarks/multi_worker_reminders.py
+# -*- coding: utf-8 -*-
+# Проверка режима MULTI_WORKER на нескольких локальных процессах с общей SQLite: напоминания рассылает
+# только лидер по аренде, каждое уходит один раз. Часть задач добавляется уже во время работы (как если бы
+# их записал другой воркер), а лидер в середине прогона убивается SIGKILL — роль должен подхватить другой.
+# Telegram заменен объектом, который пишет отправленные напоминания в файл воркера.
+#
+#   python benchmarks/multi_worker_reminders.py --workers 3 --tasks 300 --duration 20
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytz
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--workers', type=int, default=3)
+parser.add_argument('--tasks', type=int, default=300, help='задач со сроком в ближайшие duration секунд')
+parser.add_argument('--late-tasks', type=int, default=50, help='сколько из них добавить уже после старта воркеров')
+parser.add_argument('--duration', type=float, default=20)
+parser.add_argument('--lease', type=float, default=3, help='LEADER_LEASE_SECONDS')
+parser.add_argument('--kill-leader-at', type=float, default=8, help='через сколько секунд убить лидера (0 — не убивать)')
+parser.add_argument('--worker', help=argparse.SUPPRESS)
+parser.add_argument('--out', help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TASK_ID = re.compile(r"Задача (\d+)")
+
+class RecordingBot:
+    def __init__(self, path: str):
+        self.file = open(path, 'a', encoding='utf-8')
+
+    async def send_message(self, chat_id, text, **kwargs):
+        now = datetime.now(pytz.utc).timestamp()
+        for task_id in TASK_ID.findall(text):
+            self.file.write(f"{task_id} {now}\n")
+        self.file.flush()
+
+async def worker() -> None:
+    import task_manager
+    from db import dispose_engines
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    task_manager.start_scheduler(RecordingBot(args.out))
+    await stop.wait()
+    await task_manager.stop_scheduler()
+    await dispose_engines()
+
+def insert_tasks(start_id: int, count: int, now: datetime, spread: float) -> dict[int, datetime]:
+    from db import Task, engine
+
+    due = {}
+    rows = []
+    for i in range(count):
+        task_id = start_id + i
+        due_date = now + timedelta(seconds=1 + spread * i / max(1, count))
+        due[task_id] = due_date
+        rows.append({"id": task_id, "user_id": task_id % 50 + 1, "task_text": f"Задача {task_id}",
+                     "due_date": due_date.replace(tzinfo=None), "status": "pending", "priority": "medium"})
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+    return due
+
+def current_leader() -> str | None:
+    from db import Lease, get_session
+
+    session = get_session()
+    try:
+        lease = session.get(Lease, 'reminders')
+        return lease.holder if lease is not None and lease.expires_at > datetime.utcnow() else None
+    finally:
+        session.close()
+
+def parent() -> None:
+    workdir = tempfile.mkdtemp()
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'multi_worker.db')}",
+        MULTI_WORKER='1', LEADER_LEASE_SECONDS=str(args.lease), REMINDER_POLL_SECONDS='1',
+        REMINDER_BATCH_WINDOW='0.2', TELEGRAM_PER_CHAT_INTERVAL='0', TELEGRAM_GLOBAL_RATE='1000',
+        LOG_LEVEL='WARNING', METRICS_PORT='0',
+    )
+    now = datetime.now(pytz.utc)
+    early = args.tasks - args.late_tasks
+    due = insert_tasks(1, early, now, args.duration - 2)
+
+    processes = {}
+    for i in range(args.workers):
+        worker_id = f"w{i}"
+        out = os.path.join(workdir, f"sent-{worker_id}.log")
+        processes[worker_id] = subprocess.Popen(
+            [sys.executable, __file__, '--worker', worker_id, '--out', out],
+            env=dict(os.environ, WORKER_ID=worker_id),
+        )
+
+    started = time.monotonic()
+    late_added = killed = None
+    while time.monotonic() - started < args.duration + args.lease + 2:
+        elapsed = time.monotonic() - started
+        if late_added is None and elapsed > 2:
+            # Задачи, которые «записал другой воркер»: лидер узнает о них только опросом БД
+            late_added = insert_tasks(early + 1, args.late_tasks, datetime.now(pytz.utc), args.duration - 4)
+            due.update(late_added)
+        if killed is None and args.kill_leader_at and elapsed > args.kill_leader_at:
+            killed = current_leader()
+            if killed:
+                processes[killed].send_signal(signal.SIGKILL)
+                print(f"{elapsed:.1f} с: убит лидер {killed}")
+        time.sleep(0.2)
+
+    for worker_id, process in processes.items():
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+        process.wait()
+
+    sends = Counter()
+    lags = []
+    per_worker = {}
+    for path in glob.glob(os.path.join(workdir, 'sent-*.log')):
+        worker_id = os.path.basename(path)[5:-4]
+        with open(path, encoding='utf-8') as f:
+            lines = [line.split() for line in f if line.strip()]
+        per_worker[worker_id] = len(lines)
+        for task_id, sent_at in lines:
+            sends[int(task_id)] += 1
+            lags.append(float(sent_at) - due[int(task_id)].timestamp())
+
+    from sqlalchemy import func, select
+    from db import Task, engine
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(
+            select(Task.reminder_status, func.count(Task.id)).group_by(Task.reminder_status)).all())
+
+    lags.sort()
+    print(json.dumps({
+        "tasks": len(due),
+        "reminded": len(sends),
+        "missing": len(set(due) - set(sends)),
+        "duplicates": sum(1 for count in sends.values() if count > 1),
+        "per_worker": per_worker,
+        "killed_leader": killed,
+        "reminder_status": statuses,
+        "lag_p50": round(lags[len(lags) // 2], 2) if lags else None,
+        "lag_max": round(lags[-1], 2) if lags else None,
+    }, ensure_ascii=False, indent=2))
+
+if args.worker:
+    asyncio.run(worker())
+else:
+    parent()
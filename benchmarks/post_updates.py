@@ -0,0 +1,43 @@
+# benchmarks/post_updates.py
+# -*- coding: utf-8 -*-
+# Локальная проверка режима webhook: отправляет записанные апдейты (JSON-массив) на эндпоинт бота,
+# как это делает Telegram. Бот при этом можно направить на заглушку Bot API (fake_telegram.py).
+#
+#   python benchmarks/fake_telegram.py --port 8780
+#   BOT_MODE=webhook WEBHOOK_PORT=8443 WEBHOOK_SECRET_TOKEN=secret TELEGRAM_API_BASE_URL=http://127.0.0.1:8780/bot python main.py
+#   python benchmarks/post_updates.py benchmarks/recorded_updates.json --url http://127.0.0.1:8443/telegram --secret secret
+
+import argparse
+import json
+import time
+
+import httpx
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file', help='JSON-файл со списком апдейтов (или один апдейт)')
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram')
+    parser.add_argument('--secret', help='значение заголовка X-Telegram-Bot-Api-Secret-Token')
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз отправить набор (update_id сдвигается)')
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as f:
+        updates = json.load(f)
+    if isinstance(updates, dict):
+        updates = [updates]
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    statuses: dict[int, int] = {}
+    started = time.perf_counter()
+    with httpx.Client(headers=headers) as client:
+        for round_index in range(args.repeat):
+            for update in updates:
+                update = dict(update, update_id=update["update_id"] + round_index * len(updates))
+                status = client.post(args.url, json=update).status_code
+                statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    sent = sum(statuses.values())
+    print(f"Отправлено {sent} апдейтов за {elapsed:.2f} с ({sent / elapsed:.0f}/с), ответы: {statuses}")
+
+if __name__ == "__main__":
+    main()
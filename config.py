@@ -1,12 +1,136 @@
 # config.py
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv() # Загружаем переменные окружения из .env файла
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
 # Выберите модель, например: "openai/gpt-3.5-turbo" или "mistralai/mixtral-8x7b-instruct-v0.1"
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-3.5-turbo")
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///tasks.db")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///tasks.db")
+
+# Параметры HTTP-клиента для OpenRouter
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "30"))  # секунды на весь запрос
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "10"))  # одновременных запросов к модели
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BACKOFF = float(os.getenv("AI_RETRY_BACKOFF", "0.5"))  # базовая задержка между повторами, секунды
+
+# Минимальная уверенность локального парсера, при которой LLM не вызывается
+FAST_PARSER_MIN_CONFIDENCE = float(os.getenv("FAST_PARSER_MIN_CONFIDENCE", "0.8"))
+
+# Кеш шаблонных ответов AI (приветствие, подсказки по командам)
+AI_CACHE_MAX_SIZE = int(os.getenv("AI_CACHE_MAX_SIZE", "256"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "21600"))  # секунды
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")  # путь к JSON-файлу; если не задан, кеш живет только в памяти
+
+# Напоминания: окно предварительной загрузки из БД, период дозагрузки и окно догоняния после рестарта
+REMINDER_HORIZON_HOURS = float(os.getenv("REMINDER_HORIZON_HOURS", "24"))
+REMINDER_REFILL_MINUTES = float(os.getenv("REMINDER_REFILL_MINUTES", "60"))
+REMINDER_CATCHUP_MINUTES = float(os.getenv("REMINDER_CATCHUP_MINUTES", "60"))
+
+# Отправка напоминаний: окно сбора пакета (сек) и лимиты Telegram
+REMINDER_BATCH_WINDOW = float(os.getenv("REMINDER_BATCH_WINDOW", "0.5"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))  # сообщений в секунду на бота
+TELEGRAM_PER_CHAT_INTERVAL = float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", "1"))  # секунд между сообщениями в один чат
+
+# Сколько задач показывать на одной странице /list
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "10"))
+
+# Асинхронный доступ к БД. Если ASYNC_DATABASE_URL не задан, он выводится из DATABASE_URL
+# (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # секунды ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # пересоздавать соединения старше N секунд
+
+# Пакетное добавление: максимум задач из одного сообщения или файла и размер файла импорта
+MAX_BATCH_TASKS = int(os.getenv("MAX_BATCH_TASKS", "100"))
+MAX_IMPORT_FILE_BYTES = int(os.getenv("MAX_IMPORT_FILE_BYTES", str(256 * 1024)))
+
+# Логирование и метрики. LOG_LEVEL=DEBUG включает вывод промптов и сырых ответов модели.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — эндпоинт /metrics выключен
+
+# Защита от всплесков сообщений: лимит запросов к AI на пользователя (token bucket)
+# и окно, в котором подряд идущие сообщения пользователя объединяются в один разбор
+AI_USER_RATE = float(os.getenv("AI_USER_RATE", "0.2"))  # токенов в секунду (12 запросов в минуту)
+AI_USER_BURST = int(os.getenv("AI_USER_BURST", "5"))
+MESSAGE_DEBOUNCE_SECONDS = float(os.getenv("MESSAGE_DEBOUNCE_SECONDS", "1.5"))
+
+# Потоковые ответы в свободном чате и /start: первое сообщение сразу, дальше правки не чаще раза в STREAM_EDIT_INTERVAL секунд
+AI_STREAMING = os.getenv("AI_STREAMING", "1") not in ("0", "false", "False")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Разбор задач моделью: тексты длиннее этого бюджета (оценка в токенах) сохраняются без обращения к LLM
+PARSE_TASK_TOKEN_BUDGET = int(os.getenv("PARSE_TASK_TOKEN_BUDGET", "400"))
+
+# Маршрутизация между моделями: запасные модели по порядку, SLO по задержке (модель=секунды через запятую),
+# circuit breaker и hedged-запрос к быстрой модели, если основная не ответила за свой p95
+OPENROUTER_FALLBACK_MODELS = [m.strip() for m in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if m.strip()]
+AI_MODEL_SLOS = {
+    model.strip(): float(seconds)
+    for model, _, seconds in (item.rpartition("=") for item in os.getenv("AI_MODEL_SLOS", "").split(",") if "=" in item)
+}
+AI_DEFAULT_SLO = float(os.getenv("AI_DEFAULT_SLO", "20"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))
+AI_HEDGE_MODEL = os.getenv("AI_HEDGE_MODEL") or None
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "3"))  # пока по модели мало статистики для p95
+
+# Кеш ожидающих задач в памяти: сколько пользователей держать (0 — выключен) и максимум задач на пользователя
+TASK_CACHE_MAX_USERS = int(os.getenv("TASK_CACHE_MAX_USERS", "5000"))
+TASK_CACHE_MAX_ROWS = int(os.getenv("TASK_CACHE_MAX_ROWS", "500"))
+
+# Часовой пояс, в котором разбираются и показываются сроки, если пользователь не выбрал свой (/timezone)
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Amsterdam")
+
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный https-адрес; если не задан, setWebhook не вызывается
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+# Сколько апдейтов обрабатывать одновременно (апдейты одного пользователя всегда по очереди); 1 — последовательно
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+# Адрес Bot API, например локальная заглушка для нагрузочных тестов; по умолчанию api.telegram.org
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+
+# Несколько воркеров на одной БД (webhook за балансировщиком): обработчики не хранят состояние между апдейтами,
+# а напоминания рассылает только лидер, выбранный через аренду (lease) в таблице leases
+MULTI_WORKER = os.getenv("MULTI_WORKER", "0") not in ("0", "false", "False")
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "30"))  # лидер продлевает аренду каждые 1/3 срока
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "10"))  # как часто лидер ищет задачи, добавленные другими воркерами
+
+# Перевод просроченных задач в статус overdue: период прохода, запас после срока (не меньше окна догоняния
+# напоминаний, иначе задача уйдет в overdue до напоминания), максимум строк за проход и сводка пользователю
+OVERDUE_SWEEP_MINUTES = float(os.getenv("OVERDUE_SWEEP_MINUTES", "5"))
+OVERDUE_GRACE_MINUTES = float(os.getenv("OVERDUE_GRACE_MINUTES", str(REMINDER_CATCHUP_MINUTES)))
+OVERDUE_SWEEP_BATCH = int(os.getenv("OVERDUE_SWEEP_BATCH", "5000"))
+OVERDUE_DIGEST = os.getenv("OVERDUE_DIGEST", "0") not in ("0", "false", "False")
+
+# Ежедневная сводка задач: готовится заранее пакетом (несколько пользователей в одном запросе к модели,
+# не больше DIGEST_MAX_CONCURRENCY запросов одновременно) и доставляется в час, выбранный пользователем (/digest).
+# Генерация раз в DIGEST_GENERATE_MINUTES для сводок с доставкой в ближайшие DIGEST_LEAD_MINUTES (должно быть больше периода)
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "1") not in ("0", "false", "False")
+DIGEST_DEFAULT_HOUR = int(os.getenv("DIGEST_DEFAULT_HOUR", "9"))  # местное время пользователя
+DIGEST_GENERATE_MINUTES = float(os.getenv("DIGEST_GENERATE_MINUTES", "30"))
+DIGEST_LEAD_MINUTES = float(os.getenv("DIGEST_LEAD_MINUTES", "120"))
+DIGEST_USERS_PER_REQUEST = int(os.getenv("DIGEST_USERS_PER_REQUEST", "8"))
+DIGEST_MAX_CONCURRENCY = int(os.getenv("DIGEST_MAX_CONCURRENCY", "2"))
+DIGEST_MAX_TASKS = int(os.getenv("DIGEST_MAX_TASKS", "10"))  # задач одного пользователя в сводке
+DIGEST_DELIVERY_SECONDS = float(os.getenv("DIGEST_DELIVERY_SECONDS", "60"))  # как часто проверять сводки к доставке
+
+# Сколько последних заметок показывает /notes
+NOTES_VIEW_LIMIT = int(os.getenv("NOTES_VIEW_LIMIT", "5"))
+
+# Сколько текстов для кнопок листания (запросы /find, длинные категории /list) хранить на пользователя:
+# кнопки под более старыми сообщениями отвечают, что поиск устарел
+SAVED_QUERIES_PER_USER = int(os.getenv("SAVED_QUERIES_PER_USER", "20"))
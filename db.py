@@ -1,9 +1,15 @@
 # db.py
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, event, inspect, select, bindparam, Column, Integer, String, Date, DateTime, Boolean, Text, Index, UniqueConstraint
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-from config import DATABASE_URL
+from sqlalchemy.orm import sessionmaker, deferred
+import re
+from datetime import datetime, timezone
+from metrics import instrument_engine
+from search import FTS5_PREFIX_LENGTHS
+from config import DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
 Base = declarative_base()
 
@@ -17,18 +23,333 @@ class Task(Base):
     status = Column(String, default='pending') # pending, completed, overdue, cancelled
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
-    notes = Column(Text, nullable=True)
+    # Устаревшая колонка: заметки хранятся в task_notes, старые склеенные заметки переносятся при старте
+    notes = deferred(Column(Text, nullable=True))
     priority = Column(String, default='medium')
     category = Column(String, nullable=True) # <-- ДОБАВЬТЕ ЭТУ СТРОКУ
+    # Состояние напоминания: pending -> dispatching (захвачено воркером) -> sent | failed
+    reminder_status = Column(String, nullable=False, default='pending', server_default='pending')
+    reminder_claimed_by = Column(String, nullable=True)
+    reminder_claimed_at = Column(DateTime, nullable=True)
+    # Число заметок: /list показывает только его, сами заметки читаются по /notes
+    notes_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # /list и фильтр по категории: WHERE user_id = ? AND status = ? [AND category = ?]
+        Index('ix_tasks_user_status_category', 'user_id', 'status', 'category'),
+        # Выборка ожидающих напоминаний: WHERE status = 'pending' AND due_date BETWEEN ...
+        Index('ix_tasks_status_due_date', 'status', 'due_date'),
+    )
 
     def __repr__(self):
         return (f"<Task(id={self.id}, user_id={self.user_id}, task_text='{self.task_text[:20]}...', "
                 f"status='{self.status}', priority='{self.priority}', category='{self.category}')>")
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TaskNote(Base):
+    # Заметка к задаче (/note): одна строка на заметку, заметки только добавляются
+    __tablename__ = 'task_notes'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=_utcnow) # UTC без часового пояса
+
+    __table_args__ = (
+        # Последние заметки задачи: WHERE task_id = ? ORDER BY id DESC LIMIT ?
+        Index('ix_task_notes_task_id', 'task_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<TaskNote(id={self.id}, task_id={self.task_id}, text='{self.text[:20]}...')>"
+
+class SavedQuery(Base):
+    # Текст, на который ссылаются кнопки листания (запрос /find, длинная категория /list): в callback_data
+    # помещается только 64 байта, а состояние в памяти процесса не видно другим воркерам
+    __tablename__ = 'saved_queries'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # Поиск уже сохраненного текста и удаление старых: WHERE user_id = ? ORDER BY id DESC
+        Index('ix_saved_queries_user_id', 'user_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<SavedQuery(id={self.id}, user_id={self.user_id}, text='{self.text[:20]}...')>"
+
+# Незакрытые задачи: показываются в /list (просроченные — с пометкой)
+OPEN_STATUSES = ('pending', 'overdue')
+
+class User(Base):
+    # Настройки пользователя Telegram; строка создается при первом изменении настроек
+    __tablename__ = 'users'
+
+    user_id = Column(Integer, primary_key=True)
+    timezone = Column(String, nullable=True) # IANA-имя, например 'Europe/Moscow'; None — часовой пояс по умолчанию
+    # Ежедневная сводка (/digest): час доставки по местному времени, None — DIGEST_DEFAULT_HOUR
+    digest_hour = Column(Integer, nullable=True)
+    digest_enabled = Column(Boolean, nullable=False, default=True, server_default='1')
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<User(user_id={self.user_id}, timezone='{self.timezone}')>"
+
+class Lease(Base):
+    # Аренда роли (например, рассылки напоминаний) одним воркером; см. leader.py
+    __tablename__ = 'leases'
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False) # UTC без часового пояса
+
+    def __repr__(self):
+        return f"<Lease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
+
+class Digest(Base):
+    # Ежедневная сводка, подготовленная заранее пакетной генерацией; см. task_manager.generate_daily_digests
+    __tablename__ = 'digests'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    digest_date = Column(Date, nullable=False) # день по местному времени пользователя
+    text = Column(Text, nullable=False)
+    ai_generated = Column(Boolean, nullable=False, default=True)
+    deliver_at = Column(DateTime, nullable=False) # UTC без часового пояса
+    created_at = Column(DateTime, default=datetime.now)
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'digest_date', name='uq_digests_user_date'),
+        # Выборка к доставке: WHERE delivered_at IS NULL AND deliver_at <= ?
+        Index('ix_digests_delivery', 'delivered_at', 'deliver_at'),
+    )
+
+    def __repr__(self):
+        return f"<Digest(user_id={self.user_id}, digest_date={self.digest_date}, deliver_at={self.deliver_at})>"
+
+# Асинхронные драйверы для тех же баз, что и синхронный DATABASE_URL
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для базы '{backend}', задайте ASYNC_DATABASE_URL")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL позволяет читать параллельно с записью; busy_timeout — ждать блокировку, а не падать
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 engine = create_engine(DATABASE_URL)
+
+_async_url = ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+if make_url(_async_url).get_backend_name() == 'sqlite':
+    async_engine = create_async_engine(_async_url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                       pool_timeout=DB_POOL_TIMEOUT)
+else:
+    async_engine = create_async_engine(_async_url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                       pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                                       pool_pre_ping=True)
+
+# Время SQL-запросов попадает в метрику db_query_seconds с именем текущей операции
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+if engine.dialect.name == 'sqlite':
+    event.listen(engine, "connect", _configure_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _configure_sqlite)
+
 Base.metadata.create_all(engine)
 
+def ensure_columns():
+    # create_all не добавляет колонки в уже существующие таблицы, поэтому новые колонки tasks и users
+    # досоздаются через ALTER TABLE (значение по умолчанию берется из server_default)
+    with engine.begin() as conn:
+        for model in (Task, User):
+            existing = {column['name'] for column in inspect(conn).get_columns(model.__tablename__)}
+            for column in model.__table__.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = f" DEFAULT '{column.server_default.arg}'" if column.server_default is not None else ""
+                not_null = " NOT NULL" if not column.nullable and default else ""
+                conn.exec_driver_sql(f"ALTER TABLE {model.__tablename__} ADD COLUMN {column.name} {column_type}{default}{not_null}")
+
+ensure_columns()
+
+def ensure_indexes():
+    # create_all не добавляет индексы в уже существующие таблицы (старые tasks.db),
+    # поэтому при каждом старте досоздаем недостающие. Для существующих индексов это no-op.
+    for index in Task.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    if engine.dialect.name == 'sqlite':
+        # Обновляем статистику, чтобы планировщик SQLite выбирал новые индексы
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+
+ensure_indexes()
+
+# Старые заметки склеивались в одну строку: "Дополнение (YYYY-MM-DD HH:MM): текст" через "\n--- "
+LEGACY_NOTE_SEPARATOR = re.compile(r'\n--- (?=Дополнение \()')
+LEGACY_NOTE = re.compile(r'Дополнение \((\d{4}-\d{2}-\d{2} \d{2}:\d{2})\): (.*)', re.DOTALL)
+LEGACY_NOTES_BATCH = 1000
+
+def split_legacy_notes(notes: str, fallback_time: datetime) -> list[tuple[datetime, str]]:
+    """Разбирает склеенные заметки на (время UTC, текст); кусок без заголовка становится одной заметкой."""
+    result = []
+    for part in LEGACY_NOTE_SEPARATOR.split(notes):
+        match = LEGACY_NOTE.fullmatch(part.strip())
+        if match:
+            result.append((datetime.strptime(match.group(1), '%Y-%m-%d %H:%M'), match.group(2).strip()))
+        elif part.strip():
+            result.append((fallback_time, part.strip()))
+    return result
+
+def migrate_legacy_notes() -> int:
+    # Переносит tasks.notes в task_notes пачками; после переноса колонка обнуляется, повторный запуск — no-op
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Task.id, Task.notes, Task.updated_at).where(Task.notes.isnot(None)).order_by(Task.id).limit(LEGACY_NOTES_BATCH)
+            ).all()
+            if not rows:
+                return migrated
+            notes, counts = [], []
+            for task_id, blob, updated_at in rows:
+                parts = split_legacy_notes(blob, updated_at or _utcnow())
+                notes += [{"task_id": task_id, "created_at": created_at, "text": text} for created_at, text in parts]
+                counts.append({"task_id": task_id, "migrated_count": len(parts)})
+            if notes:
+                conn.execute(TaskNote.__table__.insert(), notes)
+            conn.execute(
+                Task.__table__.update().where(Task.__table__.c.id == bindparam('task_id'))
+                .values(notes=None, notes_count=Task.__table__.c.notes_count + bindparam('migrated_count')),
+                counts,
+            )
+            migrated += len(rows)
+
+migrate_legacy_notes()
+
+# Полнотекстовый поиск /find по тексту задач и заметкам. Индекс обновляют триггеры в самой БД, поэтому он
+# синхронен с любыми изменениями (добавление, /edit, /note, импорт), а не только с кодом task_manager.
+# Каждая заметка — отдельный документ индекса: новая заметка добавляет строку, не переиндексируя прежние.
+# Если схема индекса устарела (заметки раньше хранились в tasks.notes), индекс пересобирается при старте.
+
+def _fold(expression: str) -> str:
+    # Ё заменяется на е: unicode61 считает их разными буквами
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+_FTS5_OPTIONS = f"tokenize = 'unicode61 remove_diacritics 2', prefix = '{' '.join(map(str, FTS5_PREFIX_LENGTHS))}'"
+
+SQLITE_SEARCH_DDL = (
+    "DROP TRIGGER IF EXISTS tasks_fts_insert",
+    "DROP TRIGGER IF EXISTS tasks_fts_update",
+    "DROP TRIGGER IF EXISTS tasks_fts_delete",
+    "DROP TRIGGER IF EXISTS task_notes_fts_insert",
+    "DROP TABLE IF EXISTS tasks_fts",
+    "DROP TABLE IF EXISTS task_notes_fts",
+    # owner ('u<user_id>') — индексируемая колонка, чтобы поиск сужался до задач пользователя внутри FTS5
+    f"CREATE VIRTUAL TABLE tasks_fts USING fts5(owner, task_text, {_FTS5_OPTIONS})",
+    f"CREATE VIRTUAL TABLE task_notes_fts USING fts5(owner, text, task_id UNINDEXED, {_FTS5_OPTIONS})",
+    f"""CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, owner, task_text) VALUES (new.id, 'u' || new.user_id, {_fold('new.task_text')});
+    END""",
+    f"""CREATE TRIGGER tasks_fts_update AFTER UPDATE OF task_text ON tasks BEGIN
+        UPDATE tasks_fts SET task_text = {_fold('new.task_text')} WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM tasks_fts WHERE rowid = old.id;
+        DELETE FROM task_notes_fts WHERE rowid IN (SELECT id FROM task_notes WHERE task_id = old.id);
+    END""",
+    f"""CREATE TRIGGER task_notes_fts_insert AFTER INSERT ON task_notes BEGIN
+        INSERT INTO task_notes_fts(rowid, owner, text, task_id)
+        VALUES (new.id, (SELECT 'u' || user_id FROM tasks WHERE id = new.task_id), {_fold('new.text')}, new.task_id);
+    END""",
+    f"INSERT INTO tasks_fts(rowid, owner, task_text) SELECT id, 'u' || user_id, {_fold('task_text')} FROM tasks",
+    f"""INSERT INTO task_notes_fts(rowid, owner, text, task_id)
+       SELECT task_notes.id, 'u' || tasks.user_id, {_fold('task_notes.text')}, task_notes.task_id
+       FROM task_notes JOIN tasks ON tasks.id = task_notes.task_id""",
+)
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "ALTER TABLE task_notes ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION tasks_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('russian', coalesce(NEW.task_text, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS tasks_search_vector_update ON tasks",
+    """CREATE TRIGGER tasks_search_vector_update BEFORE INSERT OR UPDATE OF task_text ON tasks
+       FOR EACH ROW EXECUTE FUNCTION tasks_search_vector()""",
+    """CREATE OR REPLACE FUNCTION task_notes_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('russian', NEW.text);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS task_notes_search_vector_insert ON task_notes",
+    """CREATE TRIGGER task_notes_search_vector_insert BEFORE INSERT ON task_notes
+       FOR EACH ROW EXECUTE FUNCTION task_notes_search_vector()""",
+    # Заполнение существующих строк (для tasks UPDATE запускает триггер)
+    "UPDATE tasks SET task_text = task_text",
+    "UPDATE task_notes SET search_vector = to_tsvector('russian', text)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_task_notes_search_vector ON task_notes USING GIN (search_vector)",
+)
+
+def ensure_search_index() -> str | None:
+    """Создает (или пересобирает устаревший) поисковый индекс. Возвращает вид индекса: 'fts5', 'tsvector' или None (поиск через LIKE)."""
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        # Признак актуальной схемы — триггер на task_notes
+        current_query, statements = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'task_notes_fts_insert'", SQLITE_SEARCH_DDL
+    elif dialect == 'postgresql':
+        current_query, statements = "SELECT 1 FROM pg_trigger WHERE tgname = 'task_notes_search_vector_insert'", POSTGRES_SEARCH_DDL
+    else:
+        return None
+    try:
+        # Одна транзакция: индекс появляется уже заполненным
+        with engine.begin() as conn:
+            if conn.exec_driver_sql(current_query).first() is None:
+                for statement in statements:
+                    conn.exec_driver_sql(statement)
+    except OperationalError:
+        # SQLite собран без FTS5
+        return None
+    return 'fts5' if dialect == 'sqlite' else 'tsvector'
+
+SEARCH_BACKEND = ensure_search_index()
+
 Session = sessionmaker(bind=engine)
 
 def get_session():
-    return Session()
\ No newline at end of file
+    return Session()
+
+# expire_on_commit=False: после commit объекты остаются читаемыми без ленивой подгрузки,
+# которая в асинхронной сессии невозможна
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+def get_async_session():
+    return AsyncSession()
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
@@ -0,0 +1,120 @@
+# leader.py
+# -*- coding: utf-8 -*-
+# Выбор лидера среди воркеров через аренду (lease) в общей БД. Работает одинаково на SQLite и Postgres:
+# захват и продление — один условный UPDATE, первый захват — INSERT, который проигрывает при гонке.
+# Лидер продлевает аренду каждые ttl/3; если продлить не удалось до истечения срока, роль снимается.
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from db import Lease, get_async_session
+
+logger = logging.getLogger(__name__)
+
+def _utcnow() -> datetime:
+    # Сроки в БД хранятся без часового пояса в UTC
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+class LeaderLease:
+    def __init__(self, name: str, holder: str, ttl: float, on_elected=None, on_demoted=None):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self._leader = False
+        # Локальный срок аренды (monotonic): не доверяем роли дольше, чем нам ее выдала БД
+        self._valid_until = 0.0
+        self._task: asyncio.Task | None = None
+        self.stats = {"elected": 0, "demoted": 0, "renew_errors": 0}
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader and time.monotonic() < self._valid_until
+
+    async def try_acquire(self) -> bool:
+        """Захватывает или продлевает аренду. True — этот воркер лидер до now + ttl."""
+        started = time.monotonic()
+        now = _utcnow()
+        session = get_async_session()
+        try:
+            result = await session.execute(
+                update(Lease)
+                .where(Lease.name == self.name, or_(Lease.holder == self.holder, Lease.expires_at < now))
+                .values(holder=self.holder, expires_at=now + timedelta(seconds=self.ttl))
+            )
+            if result.rowcount == 0:
+                # Строки еще нет, либо аренда у другого воркера и не истекла — тогда INSERT упадет
+                session.add(Lease(name=self.name, holder=self.holder, expires_at=now + timedelta(seconds=self.ttl)))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return False
+        finally:
+            await session.close()
+        self._valid_until = started + self.ttl
+        return True
+
+    async def release(self) -> None:
+        # Освобождаем аренду при остановке, чтобы другой воркер не ждал истечения срока
+        session = get_async_session()
+        try:
+            await session.execute(
+                update(Lease).where(Lease.name == self.name, Lease.holder == self.holder).values(expires_at=_utcnow())
+            )
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.warning("Не удалось освободить аренду %s: %s", self.name, e)
+        finally:
+            await session.close()
+
+    def start(self) -> None:
+        # Вызывается уже на работающем event loop приложения
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._leader:
+            self._set_leader(False)
+            await self.release()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                acquired = await self.try_acquire()
+            except SQLAlchemyError as e:
+                # БД недоступна: роль сохраняется, пока не истек уже выданный срок
+                self.stats["renew_errors"] += 1
+                logger.warning("Ошибка продления аренды %s: %s", self.name, e)
+                acquired = self.is_leader
+            if acquired != self._leader:
+                self._set_leader(acquired)
+            await asyncio.sleep(self.ttl / 3)
+
+    def _set_leader(self, leader: bool) -> None:
+        self._leader = leader
+        callback = self.on_elected if leader else self.on_demoted
+        if leader:
+            self.stats["elected"] += 1
+            logger.info("Воркер %s стал лидером (%s)", self.holder, self.name)
+        else:
+            self.stats["demoted"] += 1
+            logger.warning("Воркер %s больше не лидер (%s)", self.holder, self.name)
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logger.exception("Ошибка при смене роли лидера: %s", e)
@@ -1,23 +1,81 @@
 # main.py
 # -*- coding: utf-8 -*-
+import asyncio
+import html
+import time
 from datetime import datetime
-import pytz
-from telegram import Update, ForceReply
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Update, ForceReply, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 import logging
-from config import TELEGRAM_BOT_TOKEN
-from task_manager import add_task, get_user_tasks, mark_task_as_done, update_task_text, add_task_note, set_task_priority, schedule_reminder, scheduler
-import db # Импортируем db для доступа к Task модели
-from ai_service import generate_ai_response
+from config import TELEGRAM_BOT_TOKEN, MAX_IMPORT_FILE_BYTES, LOG_LEVEL, METRICS_HOST, METRICS_PORT, MESSAGE_DEBOUNCE_SECONDS, AI_STREAMING, STREAM_EDIT_INTERVAL
+from config import (
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+    MAX_CONCURRENT_UPDATES, TELEGRAM_API_BASE_URL, MULTI_WORKER, LIST_PAGE_SIZE,
+)
+from task_manager import add_task, add_tasks_bulk, get_user_tasks_page, encode_list_cursor, decode_list_cursor, mark_task_as_done, update_task_text, add_task_note, get_task_notes, set_task_priority, start_scheduler, stop_scheduler, get_user_timezone, set_user_timezone, get_user_digest, set_user_digest, search_tasks, save_query, get_saved_query
+from rendering import render_task_list, render_search_results
+from ai_service import generate_ai_response, generate_canned_response, stream_ai_response, stream_canned_response, close_client
+from db import dispose_engines
+from task_import import parse_import_file
+from metrics import AI_CALLS_SAVED, start_metrics_server
+from throttling import Debouncer
+from update_processor import PerUserUpdateProcessor
+from webhook import run_webhook
 
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=LOG_LEVEL
 )
+# httpx пишет каждый запрос (включая long polling Telegram) на уровне INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+# APScheduler логирует каждое добавленное задание; при восстановлении тысяч напоминаний это лишний I/O
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+CALLBACK_DATA_LIMIT = 64  # байт в callback_data кнопки
+
+async def _edit_streamed(sent_message, text: str, parse_mode: str | None) -> None:
+    try:
+        await sent_message.edit_text(text[:TELEGRAM_MESSAGE_LIMIT], parse_mode=parse_mode)
+    except TelegramError as e:
+        # "message is not modified", RetryAfter и т.п.: пропускаем эту правку, следующая догонит текст
+        logger.debug("Не удалось обновить сообщение при стриминге: %s", e)
+
+async def _reply_streaming(message, chunks, render=lambda text: text, parse_mode: str | None = None, reply_markup=None):
+    """Отправляет ответ, как только пришел первый фрагмент, и дописывает его правками не чаще STREAM_EDIT_INTERVAL."""
+    sent_message = None
+    text = shown = ""
+    last_edit = 0.0
+    async for chunk in chunks:
+        text += chunk
+        if not text.strip():
+            continue
+        now = time.monotonic()
+        if sent_message is None:
+            sent_message = await message.reply_text(render(text)[:TELEGRAM_MESSAGE_LIMIT], parse_mode=parse_mode, reply_markup=reply_markup)
+            shown, last_edit = text, now
+        elif now - last_edit >= STREAM_EDIT_INTERVAL:
+            await _edit_streamed(sent_message, render(text), parse_mode)
+            shown, last_edit = text, now
+
+    if sent_message is None:
+        await message.reply_text(render(text.strip() or "…"), parse_mode=parse_mode, reply_markup=reply_markup)
+    elif text != shown:
+        await _edit_streamed(sent_message, render(text.strip()), parse_mode)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    ai_greeting = generate_ai_response(f"Пользователь {user.full_name} только что начал диалог с ботом. Приветствуй его как дружелюбный AI-ассистент, расскажи, что ты умеешь (помогать с задачами, напоминать, мотивировать).", user.id)
+    if AI_STREAMING:
+        await _reply_streaming(
+            update.message,
+            stream_canned_response('start_greeting', user.id),
+            render=lambda text: rf"Привет, {user.mention_html()}! {html.escape(text)}",
+            parse_mode='HTML',
+            reply_markup=ForceReply(selective=True),
+        )
+        return
+    ai_greeting = await generate_canned_response('start_greeting', user.id)
     await update.message.reply_html(
         rf"Привет, {user.mention_html()}! {ai_greeting}",
         reply_markup=ForceReply(selective=True),
@@ -32,10 +90,15 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "Категория указывается со знаком `#`.\n" # <-- ОБНОВЛЕНО описание /add
         "*/list [категория]* - Показать все твои активные задачи, отсортированные по приоритету. "
         "Опционально можно указать категорию (например, `/list покупки`).\n" # <-- ОБНОВЛЕНО описание /list
+        "*/find <слова>* - Найти задачи по тексту и заметкам (например, `/find молоко`).\n"
         "*/done <номер задачи>* - Отметить задачу как выполненную.\n"
         "*/edit <номер задачи> <новый текст>* - Изменить текст существующей задачи.\n"
         "*/note <номер задачи> <текст заметки>* - Добавить заметку или уточнение к задаче.\n"
+        "*/notes <номер задачи>* - Показать последние заметки к задаче.\n"
         "*/set_priority <номер задачи> <high|medium|low>* - Изменить приоритет существующей задачи. \n"
+        "*/timezone <часовой пояс>* - Часовой пояс для сроков (например, `/timezone Europe/Moscow`).\n"
+        "*/digest [час|off]* - Ежедневная сводка задач: показать, выбрать час (например, `/digest 8`) или выключить.\n"
+        "Можно прислать сразу несколько задач — по одной в строке, или файл CSV/JSON/TXT со списком задач.\n"
         "*/help* - Показать это сообщение.\n\n"
         "Просто напиши мне задачу, и я постараюсь ее понять!"
     )
@@ -45,21 +108,41 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 async def add_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     if not context.args:
-        ai_response = generate_ai_response(f"Пользователь {user_id} ввел /add без текста задачи. Попроси его ввести текст задачи.", user_id)
+        ai_response = await generate_canned_response('add_without_text', user_id)
         await update.message.reply_text(ai_response)
         return
 
-    raw_task_text = " ".join(context.args)
-    response_message = add_task(user_id, raw_task_text)
-    await update.message.reply_text(response_message)
+    # context.args теряет переводы строк, поэтому для списка задач берем исходный текст после команды
+    command_body = update.message.text.split(maxsplit=1)[1]
+    if '\n' in command_body:
+        bulk_result = await add_tasks_bulk(user_id, command_body.splitlines(), chat_id=update.effective_chat.id)
+        await update.message.reply_text(bulk_result.message, parse_mode='Markdown')
+        return
 
-    # Если задача была успешно добавлена и у нее есть время, запланировать напоминание
-    if "Напомню тебе" in response_message:
-        session = db.get_session()
-        task = session.query(db.Task).filter_by(user_id=user_id, task_text=raw_task_text).order_by(db.Task.created_at.desc()).first()
-        if task and task.due_date:
-            schedule_reminder(context.application.bot, update.effective_chat.id, task.id, task.task_text, task.due_date)
-        session.close()
+    raw_task_text = " ".join(context.args)
+    # Напоминание (если у задачи есть срок) планируется внутри add_task
+    result = await add_task(user_id, raw_task_text, chat_id=update.effective_chat.id)
+    await update.message.reply_text(result.message, parse_mode='Markdown')
+
+async def _list_keyboard(user_id: int, category: str | None, next_cursor, prev_cursor) -> InlineKeyboardMarkup | None:
+    # Состояние листания целиком в кнопке (другой воркер или старое сообщение должны открыть ту же страницу):
+    # курсор и категория. callback_data ограничена 64 байтами, поэтому длинная категория сохраняется в БД
+    buttons = []
+    if prev_cursor:
+        buttons.append(("⬅️ Назад", f"list:p:{encode_list_cursor(prev_cursor)}"))
+    if next_cursor:
+        buttons.append(("Далее ➡️", f"list:n:{encode_list_cursor(next_cursor)}"))
+    if not buttons:
+        return None
+    if category:
+        ref = f"c{category}"
+        if max(len(f"{data}:{ref}".encode('utf-8')) for _, data in buttons) > CALLBACK_DATA_LIMIT:
+            query_id = await save_query(user_id, category)
+            if query_id is None:
+                return None
+            ref = f"q{query_id}"
+        buttons = [(label, f"{data}:{ref}") for label, data in buttons]
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=data) for label, data in buttons]])
 
 async def list_tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
@@ -67,101 +150,227 @@ async def list_tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if context.args: # Если есть аргументы, считаем это категорией
         category_filter = context.args[0].lower() # Категория в нижнем регистре для поиска
 
-    tasks = get_user_tasks(user_id, category=category_filter) # <-- НОВОЕ: Передаем категорию в get_user_tasks
+    tasks, next_cursor, prev_cursor = await get_user_tasks_page(user_id, category=category_filter)
 
     if not tasks:
         if category_filter:
-            ai_response = generate_ai_response(f"Пользователь {user_id} запросил список задач по категории '{category_filter}', но задач нет. Предложи добавить.", user_id)
+            ai_response = await generate_canned_response('list_empty_category', user_id)
         else:
-            ai_response = generate_ai_response(f"Пользователь {user_id} запросил список задач, но у него их нет. Предложи добавить.", user_id)
+            ai_response = await generate_canned_response('list_empty', user_id)
         await update.message.reply_text(ai_response)
         return
 
-    message = "Твои текущие задачи:\n\n"
-    if category_filter:
-        message = f"Твои задачи в категории *{category_filter.capitalize()}*:\n\n"
+    tz = await get_user_timezone(user_id)
+    await update.message.reply_text(render_task_list(tasks, category_filter, tz), parse_mode='Markdown',
+                                    reply_markup=await _list_keyboard(user_id, category_filter, next_cursor, prev_cursor))
 
-    for task in tasks: # Итерируемся по task, а не enumerate, чтобы использовать task.id
-        due_date_str = ""
-        if task.due_date:
-            display_tz = pytz.timezone('Europe/Amsterdam')
-            display_due_date = task.due_date.astimezone(display_tz)
-            due_date_str = f" (до {display_due_date.strftime('%Y-%m-%d %H:%M')})"
+async def list_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_user.id
+    # list:<n|p>:<ранг>:<срок>:<id>[:c<категория> | :q<номер сохраненной категории>]
+    parts = query.data.split(':', 5)
+    cursor = decode_list_cursor(":".join(parts[2:5]))
+    if cursor is None:
+        return
 
-        notes_str = f" _(Заметки: {task.notes})_" if task.notes else ""
+    category_filter = None
+    ref = parts[5] if len(parts) > 5 else ''
+    if ref.startswith('c'):
+        category_filter = ref[1:]
+    elif ref.startswith('q'):
+        category_filter = await get_saved_query(user_id, int(ref[1:])) if ref[1:].isdigit() else None
+        if category_filter is None:
+            await query.edit_message_text("Список устарел. Отправь /list еще раз.")
+            return
+
+    if parts[1] == 'n':
+        tasks, next_cursor, prev_cursor = await get_user_tasks_page(user_id, category=category_filter, after=cursor)
+    else:
+        tasks, next_cursor, prev_cursor = await get_user_tasks_page(user_id, category=category_filter, before=cursor)
 
-        priority_display = ""
-        if task.priority == 'high':
-            priority_display = " 🔥*Высокий приоритет*🔥"
-        elif task.priority == 'medium':
-            priority_display = " 🟡Средний приоритет"
-        elif task.priority == 'low':
-            priority_display = " 🟢Низкий приоритет"
+    if not tasks:
+        await query.edit_message_text("Задач на этой странице больше нет. Отправь /list, чтобы обновить список.")
+        return
+    tz = await get_user_timezone(user_id)
+    await query.edit_message_text(render_task_list(tasks, category_filter, tz), parse_mode='Markdown',
+                                  reply_markup=await _list_keyboard(user_id, category_filter, next_cursor, prev_cursor))
+
+def _find_keyboard(query_id: int | None, offset: int, page_size: int, has_more: bool) -> InlineKeyboardMarkup | None:
+    # Текст запроса сохранен в БД (save_query), в кнопке его номер и смещение
+    if query_id is None:
+        return None
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"find:{query_id}:{max(0, offset - page_size)}"))
+    if has_more:
+        buttons.append(InlineKeyboardButton("Далее ➡️", callback_data=f"find:{query_id}:{offset + page_size}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text("Пожалуйста, используйте формат: `/find <слова из задачи или заметки>`", parse_mode='Markdown')
+        return
+    search_query = " ".join(context.args)
 
-        category_display = ""
-        if task.category: # <-- НОВОЕ: Отображаем категорию
-            category_display = f" #{task.category}"
+    tasks, has_more = await search_tasks(user_id, search_query)
+    if not tasks:
+        await update.message.reply_text("Ничего не нашлось 🤔 Попробуй другие слова или посмотри весь список: /list")
+        return
+    query_id = await save_query(user_id, search_query) if has_more else None
+    tz = await get_user_timezone(user_id)
+    await update.message.reply_text(render_search_results(tasks, search_query, tz), parse_mode='Markdown',
+                                    reply_markup=_find_keyboard(query_id, 0, LIST_PAGE_SIZE, has_more))
+
+async def find_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_user.id
+    # find:<номер сохраненного запроса>:<смещение>
+    parts = query.data.split(':')
+    search_query = None
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+        search_query = await get_saved_query(user_id, int(parts[1]))
+    if not search_query:
+        await query.edit_message_text("Поиск устарел. Отправь /find еще раз.")
+        return
 
-        message += f"*{task.id}.* {task.task_text}{due_date_str}{notes_str}{priority_display}{category_display}\n"
-    await update.message.reply_text(message, parse_mode='Markdown')
+    query_id, offset = int(parts[1]), int(parts[2])
+    tasks, has_more = await search_tasks(user_id, search_query, offset)
+    if not tasks:
+        await query.edit_message_text("Результатов на этой странице больше нет. Отправь /find еще раз.")
+        return
+    tz = await get_user_timezone(user_id)
+    await query.edit_message_text(render_search_results(tasks, search_query, tz), parse_mode='Markdown',
+                                  reply_markup=_find_keyboard(query_id, offset, LIST_PAGE_SIZE, has_more))
 
 async def done_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     if not context.args or not context.args[0].isdigit():
-        ai_response = generate_ai_response(f"Пользователь {user_id} ввел /done без номера задачи или с неверным номером. Попроси ввести номер.", user_id)
+        ai_response = await generate_canned_response('done_bad_args', user_id)
         await update.message.reply_text(ai_response)
         return
 
     task_id = int(context.args[0])
-    response_message = mark_task_as_done(user_id, task_id)
+    response_message = await mark_task_as_done(user_id, task_id)
     await update.message.reply_text(response_message)
 
 async def edit_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     if len(context.args) < 2 or not context.args[0].isdigit():
-        ai_response = generate_ai_response(f"Пользователь {user_id} ввел /edit без номера задачи или нового текста. Попроси ввести корректно.", user_id)
+        ai_response = await generate_canned_response('edit_bad_args', user_id)
         await update.message.reply_text(ai_response)
         return
 
     task_id = int(context.args[0])
     new_text = " ".join(context.args[1:])
-    response_message = update_task_text(user_id, task_id, new_text)
-    await update.message.reply_text(response_message)
+    response_message = await update_task_text(user_id, task_id, new_text)
+    await update.message.reply_text(response_message, parse_mode='Markdown')
 
 async def add_note_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     if len(context.args) < 2 or not context.args[0].isdigit():
-        ai_response = generate_ai_response(f"Пользователь {user_id} ввел /note без номера задачи или текста заметки. Попроси ввести корректно.", user_id)
+        ai_response = await generate_canned_response('note_bad_args', user_id)
         await update.message.reply_text(ai_response)
         return
 
     task_id = int(context.args[0])
     note_text = " ".join(context.args[1:])
-    response_message = add_task_note(user_id, task_id, note_text)
+    response_message = await add_task_note(user_id, task_id, note_text)
     await update.message.reply_text(response_message)
 
+async def notes_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # /notes <номер задачи>: последние заметки; в /list у задачи виден только их счетчик
+    user_id = update.effective_user.id
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Пожалуйста, используйте формат: `/notes <номер задачи>`", parse_mode='Markdown')
+        return
+    response_message = await get_task_notes(user_id, int(context.args[0]))
+    await update.message.reply_text(response_message, parse_mode='Markdown')
+
+async def _flush_messages(key: tuple, messages: list) -> None:
+    # Сообщения, пришедшие подряд в пределах окна, разбираются одним вызовом; на весь пакет — один ответ
+    user_id, chat_id = key
+    texts = [message.text for message in messages]
+    if len(texts) == 1:
+        reply = (await add_task(user_id, texts[0], chat_id=chat_id)).message
+    else:
+        AI_CALLS_SAVED.inc(len(texts) - 1, 'coalesced')
+        reply = (await add_tasks_bulk(user_id, texts, chat_id=chat_id)).message
+    await messages[0].reply_text(reply, parse_mode='Markdown')
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     text = update.message.text
 
     # Попытка добавить задачу, если это не команда
     if not text.startswith('/'):
-        response_message = add_task(user_id, text)
-        await update.message.reply_text(response_message)
-
-        # Если задача была успешно добавлена и у нее есть время, запланировать напоминание
-        if "Напомню тебе" in response_message:
-            session = db.get_session()
-            task = session.query(db.Task).filter_by(user_id=user_id, task_text=text).order_by(db.Task.created_at.desc()).first()
-            if task and task.due_date:
-                schedule_reminder(context.application.bot, update.effective_chat.id, task.id, task.task_text, task.due_date)
-            session.close()
+        # Несколько строк — список задач, добавляем пакетом
+        if '\n' in text.strip():
+            bulk_result = await add_tasks_bulk(user_id, text.splitlines(), chat_id=update.effective_chat.id)
+            await update.message.reply_text(bulk_result.message, parse_mode='Markdown')
+            return
+        # Обработчик не ждет окно debounce, чтобы следующие сообщения пользователя успели попасть в пакет.
+        # Пакет разбирается под очередью пользователя; задачу запускает application, поэтому stop() ее дожидается
+        context.bot_data['message_debouncer'].add((user_id, update.effective_chat.id), update.message,
+                                                  context.application.create_task)
 
     else:
         # Для других сообщений, которые не являются командами
-        ai_response = generate_ai_response(f"Пользователь {user_id} написал: '{text}'. Ответь ему как дружелюбный AI-ассистент.", user_id)
+        prompt = f"Пользователь {user_id} написал: '{text}'. Ответь ему как дружелюбный AI-ассистент."
+        if AI_STREAMING:
+            await _reply_streaming(update.message, stream_ai_response(prompt, user_id))
+            return
+        ai_response = await generate_ai_response(prompt, user_id)
         await update.message.reply_text(ai_response)
 
+async def import_file_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Загрузка CSV/JSON/TXT-файла со списком задач
+    user_id = update.effective_user.id
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_BYTES:
+        await update.message.reply_text(f"Файл слишком большой. Максимум {MAX_IMPORT_FILE_BYTES // 1024} КБ.")
+        return
+
+    telegram_file = await document.get_file()
+    content = bytes(await telegram_file.download_as_bytearray())
+    try:
+        task_texts = parse_import_file(document.file_name or '', content)
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.warning("Ошибка разбора файла импорта: %s", e)
+        await update.message.reply_text("Не получилось прочитать файл. Поддерживаются CSV, JSON и текст в UTF-8, одна задача на строку.")
+        return
+
+    bulk_result = await add_tasks_bulk(user_id, task_texts, chat_id=update.effective_chat.id)
+    await update.message.reply_text(bulk_result.message, parse_mode='Markdown')
+
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # /timezone <IANA-имя>: часовой пояс, в котором показываются сроки задач
+    user_id = update.effective_user.id
+    if not context.args:
+        tz = await get_user_timezone(user_id)
+        await update.message.reply_text(
+            f"Сейчас сроки показываются в часовом поясе *{tz.zone}*. Изменить: `/timezone Europe/Moscow`.",
+            parse_mode='Markdown',
+        )
+        return
+    response_message = await set_user_timezone(user_id, context.args[0])
+    await update.message.reply_text(response_message, parse_mode='Markdown')
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # /digest — сегодняшняя сводка и настройки, /digest <час> — время доставки, /digest off — выключить
+    user_id = update.effective_user.id
+    if not context.args:
+        response_message = await get_user_digest(user_id)
+    elif context.args[0].lower() in ('off', 'выкл'):
+        response_message = await set_user_digest(user_id, None)
+    elif context.args[0].isdigit():
+        response_message = await set_user_digest(user_id, int(context.args[0]))
+    else:
+        response_message = "Пожалуйста, используйте формат: `/digest <час 0-23>` или `/digest off`"
+    await update.message.reply_text(response_message, parse_mode='Markdown')
+
 async def set_priority_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     # Expects /set_priority <task_id> <priority>
@@ -172,30 +381,80 @@ async def set_priority_command(update: Update, context: ContextTypes.DEFAULT_TYP
     task_id = int(context.args[0])
     new_priority = context.args[1].lower() # Ensure it's lowercase for validation
 
-    response_message = set_task_priority(user_id, task_id, new_priority)
+    response_message = await set_task_priority(user_id, task_id, new_priority)
     await update.message.reply_text(response_message, parse_mode='Markdown')
 
 
-def main() -> None:
-    # ... (application setup - без изменений) ...
-    print("Запуск бота...")
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-    print("Бот тестовый принт.")
+async def on_startup(application: Application) -> None:
+    # Восстанавливаем напоминания, потерянные при перезапуске, и запускаем планировщик
+    start_scheduler(application.bot)
+    if METRICS_PORT:
+        application.bot_data['metrics_server'] = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+
+async def on_shutdown(application: Application) -> None:
+    await stop_scheduler()
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    # Закрываем общий пул HTTP-соединений к OpenRouter и пулы соединений с БД
+    await close_client()
+    await dispose_engines()
+
+
+def build_application(token: str = TELEGRAM_BOT_TOKEN, base_url: str | None = TELEGRAM_API_BASE_URL,
+                      max_concurrent_updates: int = MAX_CONCURRENT_UPDATES) -> Application:
+    builder = Application.builder().token(token).post_init(on_startup).post_shutdown(on_shutdown)
+    # Апдейты разных пользователей обрабатываются параллельно, одного пользователя — по порядку
+    update_processor = PerUserUpdateProcessor(max_concurrent_updates)
+    builder = builder.concurrent_updates(update_processor)
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+    # Свободный текст добавляется после окна debounce: команды, пришедшие в это окно, выполняются раньше него
+    application.bot_data['message_debouncer'] = Debouncer(
+        MESSAGE_DEBOUNCE_SECONDS, _flush_messages, lock=lambda key: update_processor.user_lock(key[0]))
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("add", add_task_command))
     application.add_handler(CommandHandler("list", list_tasks_command)) # <-- Обновлен
+    application.add_handler(CallbackQueryHandler(list_page_callback, pattern=r"^list:"))
+    application.add_handler(CommandHandler("find", find_command))
+    application.add_handler(CallbackQueryHandler(find_page_callback, pattern=r"^find:"))
     application.add_handler(CommandHandler("done", done_task_command))
     application.add_handler(CommandHandler("edit", edit_task_command))
     application.add_handler(CommandHandler("note", add_note_command))
+    application.add_handler(CommandHandler("notes", notes_command))
     application.add_handler(CommandHandler("set_priority", set_priority_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("digest", digest_command))
 
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-   
-    print("Бот запущен. Нажмите Ctrl+C для остановки.")
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("json") | filters.Document.FileExtension("txt"),
+        import_file_command,
+    ))
+    return application
+
+def main() -> None:
+    logger.info("Запуск бота...")
+    application = build_application()
+
+    if MULTI_WORKER and BOT_MODE != 'webhook':
+        # getUpdates может вызывать только один процесс: остальные получат 409 Conflict
+        logger.warning("MULTI_WORKER рассчитан на режим webhook; в режиме polling запускайте один воркер")
+
+    if BOT_MODE == 'webhook':
+        logger.info("Бот запущен в режиме webhook. Нажмите Ctrl+C для остановки.")
+        asyncio.run(run_webhook(application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                                webhook_url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET_TOKEN))
+        return
+
+    logger.info("Бот запущен. Нажмите Ctrl+C для остановки.")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     import db # Импортируем db для создания таблиц при запуске
-    main()
\ No newline at end of file
+    main()
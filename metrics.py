@@ -0,0 +1,228 @@
+# metrics.py
+# -*- coding: utf-8 -*-
+# Счетчики и гистограммы горячих путей с выводом в текстовом формате Prometheus
+
+import asyncio
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Имя операции task_manager, внутри которой выполняется текущий код (для учета времени запросов к БД)
+current_operation = contextvars.ContextVar('current_operation', default='other')
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labelvalues) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+class Gauge:
+    # Значение вычисляется при каждом снятии метрик
+    def __init__(self, name: str, documentation: str, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning("Не удалось вычислить метрику %s: %s", self.name, e)
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labelvalues -> [счетчики по корзинам..., sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labelvalues) -> int:
+        series = self._values.get(labelvalues)
+        return series[-1] if series else 0
+
+    def sum(self, *labelvalues) -> float:
+        series = self._values.get(labelvalues)
+        return series[-2] if series else 0.0
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+        for labelvalues, series in items:
+            cumulative = 0
+            labels = _format_labels(self.labelnames, labelvalues)
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labelvalues, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labelvalues: tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+def gauge(name: str, documentation: str, callback) -> Gauge:
+    return registry.register(Gauge(name, documentation, callback))
+
+# --- Метрики бота ---
+
+LLM_LATENCY = histogram('llm_request_seconds', 'Длительность запроса к OpenRouter (включая повторы)', ('model', 'outcome'))
+LLM_TTFB = histogram('llm_time_to_first_token_seconds', 'Время до первого фрагмента потокового ответа OpenRouter', ('model',))
+LLM_ROUTING = counter('llm_routing_events_total', 'События выбора модели: fallback, hedge, hedge_won, slo_timeout, breaker_open', ('model', 'event'))
+LLM_TOKENS = counter('llm_tokens_total', 'Токены, израсходованные в запросах к OpenRouter', ('model', 'kind'))
+AI_CALLS_SAVED = counter('ai_calls_saved_total', 'Запросы к модели, которые не понадобились', ('reason',))
+LLM_JSON_FAILURES = counter('llm_json_extraction_failures_total', 'Ответы модели, из которых не удалось извлечь JSON', ('parser',))
+OPERATION_LATENCY = histogram('task_operation_seconds', 'Длительность операций task_manager', ('operation',))
+DB_QUERY_LATENCY = histogram('db_query_seconds', 'Время SQL-запросов по операциям task_manager', ('operation',))
+REMINDER_LAG = histogram('reminder_dispatch_lag_seconds', 'Задержка отправки напоминания относительно срока',
+                         buckets=(0.1, 0.5, 1.0, 2.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0))
+REMINDERS = counter('reminders_total', 'Обработанные напоминания', ('outcome',))
+OVERDUE_SWEPT = counter('overdue_tasks_total', 'Задачи, переведенные в overdue')
+DIGESTS = counter('digests_total', 'Ежедневные сводки', ('outcome',))
+
+def instrumented(operation: str):
+    """Декоратор для функций task_manager: время вызова и привязка SQL-запросов к операции."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = current_operation.set(operation)
+                try:
+                    with OPERATION_LATENCY.time(operation):
+                        return await func(*args, **kwargs)
+                finally:
+                    current_operation.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_operation.set(operation)
+            try:
+                with OPERATION_LATENCY.time(operation):
+                    return func(*args, **kwargs)
+            finally:
+                current_operation.reset(token)
+        return wrapper
+    return decorator
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    DB_QUERY_LATENCY.observe(time.perf_counter() - started, current_operation.get())
+
+def instrument_engine(sync_engine) -> None:
+    from sqlalchemy import event
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+# --- HTTP-эндпоинт /metrics ---
+
+async def _handle_metrics_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        # Заголовки запроса не нужны, но их надо дочитать
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', registry.render().encode('utf-8')
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def start_metrics_server(host: str, port: int) -> asyncio.AbstractServer:
+    server = await asyncio.start_server(_handle_metrics_request, host, port)
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return server
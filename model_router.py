@@ -0,0 +1,232 @@
+# model_router.py
+# -*- coding: utf-8 -*-
+# Выбор модели для запроса: цепочка запасных моделей, SLO по задержке, circuit breaker и hedged-запросы.
+# Маршрутизатор не знает про HTTP: запрос к конкретной модели передается ему как call(model).
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+import httpx
+
+from metrics import LLM_ROUTING
+
+logger = logging.getLogger(__name__)
+
+class ModelUnavailable(httpx.HTTPError):
+    """Модель не ответила в пределах SLO или для нее открыт circuit breaker."""
+
+class RollingStats:
+    """Задержка и ошибки последних window запросов к модели."""
+
+    def __init__(self, window: int = 100):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._samples.append((latency, ok))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def p95(self) -> float | None:
+        latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+class CircuitBreaker:
+    """После failure_threshold ошибок подряд модель пропускается на cooldown секунд, затем пробуется одним запросом."""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release_trial(self) -> None:
+        # Пробный запрос отменен (проиграл hedge, поток брошен): ни успеха, ни ошибки — следующий запрос пробует снова
+        self._trial = False
+
+    def record_failure(self) -> bool:
+        # Возвращает True, если breaker только что открылся
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._trial = False
+            return True
+        return False
+
+class ModelRouter:
+    def __init__(self, fallback_models: list[str], slos: dict[str, float], default_slo: float,
+                 breaker_failures: int, breaker_cooldown: float,
+                 hedge_model: str | None = None, hedge_delay: float = 2.0,
+                 window: int = 100, min_samples: int = 20):
+        self.fallback_models = fallback_models
+        self.slos = slos
+        self.default_slo = default_slo
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_model = hedge_model
+        self.hedge_delay = hedge_delay
+        self.window = window
+        self.min_samples = min_samples
+        self._stats: dict[str, RollingStats] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def _model_stats(self, model: str) -> RollingStats:
+        if model not in self._stats:
+            self._stats[model] = RollingStats(self.window)
+        return self._stats[model]
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+        return self._breakers[model]
+
+    def slo(self, model: str) -> float:
+        return self.slos.get(model, self.default_slo)
+
+    def _degraded(self, model: str) -> bool:
+        # Модель укладывается в SLO, пока данных мало или p95 не выше SLO
+        stats = self._model_stats(model)
+        p95 = stats.p95()
+        return len(stats) >= self.min_samples and p95 is not None and p95 > self.slo(model)
+
+    def chain(self, primary: str) -> list[str]:
+        """Порядок перебора: сначала модели, укладывающиеся в SLO, потом деградировавшие; порядок конфигурации сохраняется."""
+        models = [primary] + [model for model in self.fallback_models if model != primary]
+        return [model for model in models if not self._degraded(model)] + [model for model in models if self._degraded(model)]
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        self._model_stats(model).record(latency, ok)
+        breaker = self._breaker(model)
+        if ok:
+            breaker.record_success()
+        elif breaker.record_failure():
+            LLM_ROUTING.inc(1, model, 'breaker_open')
+            logger.warning("Модель %s временно отключена после %s ошибок подряд", model, breaker.failures)
+
+    def release(self, model: str) -> None:
+        # Запрос к модели отменен до результата: статистику не трогаем, только освобождаем пробный запрос breaker
+        self._breaker(model).release_trial()
+
+    def pick(self, primary: str) -> str:
+        # Для потоковых ответов: первая модель цепочки, которую пропускает breaker
+        for model in self.chain(primary):
+            if self._breaker(model).allow():
+                return model
+        return primary
+
+    async def _attempt(self, model: str, call, allowed: bool = True):
+        # allowed — для model уже вызван allow(): если это был пробный запрос half-open breaker, при отмене его надо вернуть
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(model), timeout=self.slo(model))
+        except asyncio.CancelledError:
+            # Отмененный проигравший hedged-запрос — не ошибка модели
+            if allowed:
+                self.release(model)
+            raise
+        except asyncio.TimeoutError:
+            self.record(model, time.perf_counter() - start, False)
+            LLM_ROUTING.inc(1, model, 'slo_timeout')
+            raise ModelUnavailable(f"Модель {model} не ответила за {self.slo(model):.1f} с")
+        except Exception:
+            self.record(model, time.perf_counter() - start, False)
+            raise
+        self.record(model, time.perf_counter() - start, True)
+        return result
+
+    def _hedge_delay(self, model: str) -> float:
+        stats = self._model_stats(model)
+        p95 = stats.p95()
+        return p95 if len(stats) >= self.min_samples and p95 is not None else self.hedge_delay
+
+    async def _hedged_attempt(self, model: str, call):
+        primary = asyncio.create_task(self._attempt(model, call))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay(model))
+            if done:
+                return primary.result()
+
+            # Основная модель не ответила за свой p95 — параллельно спрашиваем быструю
+            LLM_ROUTING.inc(1, self.hedge_model, 'hedge')
+            hedge = asyncio.create_task(self._attempt(self.hedge_model, call, allowed=False))
+            pending.add(hedge)
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            LLM_ROUTING.inc(1, self.hedge_model, 'hedge_won')
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def run(self, primary: str, call):
+        """Выполняет call(model) по цепочке моделей. Возвращает первый успешный результат или поднимает последнюю ошибку."""
+        last_error: Exception | None = None
+        tried = set()
+        for model in self.chain(primary):
+            if model in tried or not self._breaker(model).allow():
+                continue
+            tried.add(model)
+            if last_error is not None:
+                LLM_ROUTING.inc(1, model, 'fallback')
+            use_hedge = (not last_error and self.hedge_model and self.hedge_model != model
+                         and self.hedge_model not in tried and self._breaker(self.hedge_model).state == 'closed')
+            try:
+                if use_hedge:
+                    return await self._hedged_attempt(model, call)
+                return await self._attempt(model, call)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("Модель %s не ответила: %s", model, e)
+                last_error = e
+        if last_error is None:
+            raise ModelUnavailable(f"Все модели временно отключены: {', '.join(self.chain(primary))}")
+        raise last_error
+
+    def snapshot(self) -> dict:
+        return {
+            model: {
+                "requests": len(stats),
+                "p95": stats.p95(),
+                "error_rate": stats.error_rate(),
+                "breaker": self._breaker(model).state,
+            }
+            for model, stats in self._stats.items()
+        }
@@ -0,0 +1,76 @@
+# prompts.py
+# -*- coding: utf-8 -*-
+# Шаблоны промптов для разбора задач и оценка их размера в токенах.
+# Правила и пример собраны один раз при импорте и уходят в system-сообщение: этот префикс одинаков
+# для всех вызовов, поэтому провайдер может его кешировать, а в user-сообщении остаются только дата и текст.
+
+import math
+from datetime import datetime
+
+from config import PARSE_TASK_TOKEN_BUDGET
+
+WEEKDAY_NAMES = ('понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота', 'воскресенье')
+
+_PARSE_RULES = (
+    "Ты разбираешь задачи для Telegram-бота. Поля: "
+    "task_text — суть задачи без даты, приоритета и тега; "
+    "due_date — \"YYYY-MM-DD HH:MM:SS\" в часовом поясе текущего времени из сообщения или null; "
+    "priority — high|medium|low (высокий/срочно/важно=high, низкий=low, иначе medium); "
+    "category — тег после # без # или null. "
+    "Относительные даты (завтра, в пятницу, через 2 часа) считай от текущего времени из сообщения. "
+    "Если задачи нет, task_text: null.\n"
+    "Пример (сейчас 2025-01-09 10:00): Купить хлеб завтра в 18:00 high #покупки -> "
+    "{\"task_text\": \"Купить хлеб\", \"due_date\": \"2025-01-10 18:00:00\", \"priority\": \"high\", \"category\": \"покупки\"}\n"
+)
+
+PARSE_SYSTEM_PROMPT = _PARSE_RULES + "Ответ: только JSON-объект с четырьмя полями, без пояснений и ```."
+BATCH_PARSE_SYSTEM_PROMPT = _PARSE_RULES + "Ответ: только JSON-массив таких объектов, по одному на строку, в том же порядке."
+
+# Ответ на одну задачу: JSON-каркас плюс примерно сам текст задачи
+PARSE_OUTPUT_BASE_TOKENS = 50
+PARSE_OUTPUT_MAX_TOKENS = 200
+BATCH_OUTPUT_MAX_TOKENS = 4000
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора: ~4 символа латиницы или ~2.5 символа кириллицы на токен."""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2.5)
+
+def fits_parse_budget(task_text: str) -> bool:
+    # Очень длинный текст модели не отправляем: это дорого, а задача сохранится и без разбора
+    return estimate_tokens(task_text) <= PARSE_TASK_TOKEN_BUDGET
+
+def _now_line(now: datetime) -> str:
+    # now — местное время пользователя: «завтра в 10:00» модель вернет по его часам, а не по UTC
+    zone = getattr(now.tzinfo, 'zone', None) or now.tzname() or 'UTC'
+    return f"Сейчас ({zone}): {now.strftime('%Y-%m-%d %H:%M')}, {WEEKDAY_NAMES[now.weekday()]}."
+
+def build_parse_prompt(task_text: str, now: datetime) -> str:
+    return f"{_now_line(now)}\nЗадача: {task_text}"
+
+def parse_output_budget(task_text: str) -> int:
+    return min(PARSE_OUTPUT_MAX_TOKENS, PARSE_OUTPUT_BASE_TOKENS + estimate_tokens(task_text))
+
+def build_batch_parse_prompt(task_texts: list[str], now: datetime) -> str:
+    numbered = "\n".join(f"{i + 1}. {text}" for i, text in enumerate(task_texts))
+    return f"{_now_line(now)}\nЗадачи ({len(task_texts)}):\n{numbered}"
+
+def batch_output_budget(task_texts: list[str]) -> int:
+    return min(BATCH_OUTPUT_MAX_TOKENS, sum(PARSE_OUTPUT_BASE_TOKENS + estimate_tokens(text) for text in task_texts))
+
+# Ежедневная сводка: несколько пользователей в одном запросе, ответ — по строке на каждого
+DIGEST_SYSTEM_PROMPT = (
+    "Ты дружелюбный AI-ассистент Telegram-бота задач. Для каждого пользователя из сообщения напиши короткую "
+    "мотивирующую сводку на сегодня (2-3 предложения, на \"ты\"): что важнее всего, что просрочено, с чего начать. "
+    "Не придумывай задачи, которых нет в списке, не используй Markdown.\n"
+    "Ответ: только JSON-массив строк, по одной на пользователя, в том же порядке."
+)
+DIGEST_OUTPUT_TOKENS_PER_USER = 150
+
+def build_digest_batch_prompt(sections: list[str]) -> str:
+    return "\n\n".join(f"Пользователь {i + 1}:\n{section}" for i, section in enumerate(sections))
+
+def digest_output_budget(count: int) -> int:
+    return min(BATCH_OUTPUT_MAX_TOKENS, DIGEST_OUTPUT_TOKENS_PER_USER * count)
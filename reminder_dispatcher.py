@@ -0,0 +1,203 @@
+# reminder_dispatcher.py
+# -*- coding: utf-8 -*-
+# Отправка напоминаний на event loop бота: пакетирование и соблюдение лимитов Telegram.
+# Перед отправкой напоминание захватывается в БД (pending -> dispatching), поэтому при нескольких воркерах
+# и после перезапуска каждое отправляется один раз.
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import pytz
+from sqlalchemy import update
+from telegram.error import RetryAfter, TelegramError
+
+from db import Task, get_async_session
+from config import REMINDER_BATCH_WINDOW, TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_INTERVAL, WORKER_ID
+from metrics import REMINDER_LAG, REMINDERS, instrumented
+from rendering import wrap_entity
+from throttling import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+def _utcnow() -> datetime:
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+@instrumented('reminder_claim')
+async def claim_reminders(task_ids: list[int], holder: str = WORKER_ID) -> set[int]:
+    """Атомарно переводит напоминания pending -> dispatching и возвращает захваченные id.
+
+    Условие на reminder_status проверяется в том же UPDATE, поэтому при гонке нескольких воркеров
+    каждую задачу захватывает ровно один; выполненные и отмененные задачи не захватываются.
+    """
+    session = get_async_session()
+    try:
+        rows = await session.scalars(
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.status == 'pending', Task.reminder_status == 'pending')
+            # updated_at не трогаем: это время изменения задачи пользователем
+            .values(reminder_status='dispatching', reminder_claimed_by=holder, reminder_claimed_at=_utcnow(),
+                    updated_at=Task.updated_at)
+            .returning(Task.id)
+        )
+        claimed = set(rows)
+        await session.commit()
+        return claimed
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+@instrumented('reminder_finish')
+async def finish_reminders(task_ids: list[int], status: str) -> None:
+    if not task_ids:
+        return
+    session = get_async_session()
+    try:
+        await session.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.reminder_status == 'dispatching')
+            .values(reminder_status=status, updated_at=Task.updated_at)
+        )
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Ошибка при сохранении статуса напоминаний: %s", e)
+    finally:
+        await session.close()
+
+def _format_reminder(task_texts: list[str]) -> str:
+    # Текст задачи пишет пользователь: без экранирования '*' или '_' в нем ломают разметку и Telegram отвечает BadRequest
+    if len(task_texts) == 1:
+        return f"Привет! 👋 Просто напоминаю, что у тебя есть задача: {wrap_entity(task_texts[0], '*')}! Давай ее сделаем?"
+    lines = "\n".join(f"• {wrap_entity(text, '*')}" for text in task_texts)
+    return f"Привет! 👋 Напоминаю о задачах:\n{lines}\nДавай их сделаем?"
+
+class ReminderDispatcher:
+    def __init__(self, batch_window: float = REMINDER_BATCH_WINDOW,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 per_chat_interval: float = TELEGRAM_PER_CHAT_INTERVAL):
+        self.batch_window = batch_window
+        self.per_chat_interval = per_chat_interval
+        self._global_limiter = RateLimiter(global_rate)
+        self._chat_next_send: dict[int, float] = {}
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._bot = None
+        self.stats = {"sent": 0, "skipped": 0, "failed": 0, "batches": 0,
+                      "lag_last": 0.0, "lag_max": 0.0, "lag_sum": 0.0}
+
+    def start(self, bot) -> None:
+        # Вызывается уже на работающем event loop приложения
+        self._bot = bot
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def enqueue(self, chat_id: int, task_id: int, task_text: str, due_date: datetime) -> None:
+        if self._queue is None:
+            logger.warning("Диспетчер напоминаний не запущен, напоминание для задачи %s пропущено", task_id)
+            return
+        self._queue.put_nowait((chat_id, task_id, task_text, due_date))
+
+    def lag_stats(self) -> dict:
+        sent = self.stats["sent"]
+        return {
+            "last": self.stats["lag_last"],
+            "max": self.stats["lag_max"],
+            "avg": self.stats["lag_sum"] / sent if sent else 0.0,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # Немного ждем, чтобы собрать напоминания, сработавшие в один момент
+            await asyncio.sleep(self.batch_window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._dispatch(batch)
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                REMINDERS.inc(len(batch), 'failed')
+                logger.exception("Ошибка при отправке пакета напоминаний: %s", e)
+
+    async def _dispatch(self, batch: list[tuple]) -> None:
+        self.stats["batches"] += 1
+        # Захват отсеивает выполненные задачи, уже отправленные напоминания и те, что забрал другой воркер
+        claimed = await claim_reminders([item[1] for item in batch])
+        by_chat = defaultdict(list)
+        for chat_id, task_id, task_text, due_date in batch:
+            if task_id in claimed:
+                claimed.discard(task_id)
+                by_chat[chat_id].append((task_id, task_text, due_date))
+            else:
+                self.stats["skipped"] += 1
+                REMINDERS.inc(1, 'skipped')
+        chats = list(by_chat.items())
+        results = await asyncio.gather(*(self._send_to_chat(chat_id, items) for chat_id, items in chats),
+                                       return_exceptions=True)
+        sent, failed = [], []
+        for (chat_id, items), result in zip(chats, results):
+            if isinstance(result, Exception):
+                self.stats["failed"] += len(items)
+                REMINDERS.inc(len(items), 'failed')
+                logger.error("Ошибка при отправке напоминаний в чат %s: %s", chat_id, result)
+            (sent if result is True else failed).extend(task_id for task_id, _, _ in items)
+        await finish_reminders(sent, 'sent')
+        await finish_reminders(failed, 'failed')
+
+    async def send(self, chat_id: int, text: str) -> None:
+        """Отправляет сообщение с соблюдением лимитов Telegram (в чат и на бота); ошибки Telegram пробрасываются."""
+        # Не чаще одного сообщения в чат за per_chat_interval
+        now = time.monotonic()
+        next_send = self._chat_next_send.get(chat_id, now)
+        self._chat_next_send[chat_id] = max(next_send, now) + self.per_chat_interval
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+
+        for attempt in range(2):
+            await self._global_limiter.acquire()
+            try:
+                await self._bot.send_message(chat_id, text, parse_mode='Markdown')
+                return
+            except RetryAfter as e:
+                if attempt:
+                    raise
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                await asyncio.sleep(retry_after)
+
+    async def _send_to_chat(self, chat_id: int, items: list[tuple]) -> bool:
+        try:
+            await self.send(chat_id, _format_reminder([task_text for _, task_text, _ in items]))
+        except TelegramError as e:
+            if isinstance(e, RetryAfter):
+                raise
+            self.stats["failed"] += len(items)
+            REMINDERS.inc(len(items), 'failed')
+            logger.warning("Ошибка при отправке напоминания в чат %s: %s", chat_id, e)
+            return False
+
+        sent_at = datetime.now(pytz.utc)
+        for _, _, due_date in items:
+            lag = max(0.0, (sent_at - due_date).total_seconds())
+            self.stats["sent"] += 1
+            self.stats["lag_last"] = lag
+            self.stats["lag_max"] = max(self.stats["lag_max"], lag)
+            self.stats["lag_sum"] += lag
+            REMINDER_LAG.observe(lag)
+        REMINDERS.inc(len(items), 'sent')
+        return True
+
+dispatcher = ReminderDispatcher()
@@ -0,0 +1,106 @@
+# rendering.py
+# -*- coding: utf-8 -*-
+# Текст сообщений со списками задач (Markdown v1, как в остальных ответах бота).
+# Часовые пояса и повторяющиеся фрагменты вычисляются один раз, сообщение собирается через join.
+
+import functools
+from datetime import datetime, tzinfo
+
+import pytz
+
+from config import DEFAULT_TIMEZONE
+
+PRIORITY_FRAGMENTS = {
+    'high': " 🔥*Высокий приоритет*🔥",
+    'medium': " 🟡Средний приоритет",
+    'low': " 🟢Низкий приоритет",
+}
+
+OVERDUE_FRAGMENT = " ⏰просрочено"
+COMPLETED_FRAGMENT = " ✅выполнено"
+
+MARKDOWN_SPECIAL_CHARS = '_*`['
+
+def escape(text: str) -> str:
+    # Вне сущностей спецсимволы Markdown v1 экранируются обратной косой чертой. Результат тот же,
+    # что у telegram.helpers.escape_markdown(version=1), но без регулярного выражения на каждую строку списка
+    for char in MARKDOWN_SPECIAL_CHARS:
+        if char in text:
+            text = text.replace(char, '\\' + char)
+    return text
+
+def wrap_entity(text: str, marker: str) -> str:
+    # Внутри _..._ или *...* экранировать нельзя: сущность закрывается, символ экранируется, сущность открывается снова
+    return marker + text.replace(marker, f"{marker}\\{marker}{marker}") + marker
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name: str | None) -> tzinfo:
+    """tzinfo по IANA-имени; неизвестное или пустое имя — часовой пояс по умолчанию."""
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+def is_valid_timezone(name: str) -> bool:
+    return name in pytz.all_timezones_set
+
+@functools.lru_cache(maxsize=4096)
+def _category_fragment(category: str) -> str:
+    return f" #{escape(category)}"
+
+def to_local(due_date: datetime, tz: tzinfo) -> datetime:
+    # Сроки в БД хранятся без часового пояса в UTC
+    if due_date.tzinfo is None:
+        due_date = pytz.utc.localize(due_date)
+    return due_date.astimezone(tz)
+
+@functools.lru_cache(maxsize=8192)
+def format_due(due_date: datetime, tz: tzinfo) -> str:
+    # Те же сроки показываются при каждом листании /list, поэтому готовые строки кешируются
+    return to_local(due_date, tz).strftime('%Y-%m-%d %H:%M')
+
+def render_task_line(task, tz: tzinfo) -> str:
+    parts = [f"*{task.id}.* ", escape(task.task_text)]
+    if task.due_date:
+        parts.append(f" (до {format_due(task.due_date, tz)})")
+    if task.status == 'overdue':
+        parts.append(OVERDUE_FRAGMENT)
+    elif task.status == 'completed':
+        parts.append(COMPLETED_FRAGMENT)
+    if task.notes_count:
+        # Сами заметки в список не загружаются, их показывает /notes <номер>
+        parts.append(f" 📝{task.notes_count}")
+    parts.append(PRIORITY_FRAGMENTS.get(task.priority, ""))
+    if task.category:
+        parts.append(_category_fragment(task.category))
+    return "".join(parts)
+
+def render_task_list(tasks, category_filter: str | None = None, tz: tzinfo | None = None) -> str:
+    tz = tz or get_timezone(None)
+    if category_filter:
+        header = f"Твои задачи в категории {wrap_entity(category_filter.capitalize(), '*')}:\n\n"
+    else:
+        header = "Твои текущие задачи:\n\n"
+    return header + "".join([render_task_line(task, tz) + "\n" for task in tasks])
+
+def render_search_results(tasks, query: str, tz: tzinfo | None = None) -> str:
+    tz = tz or get_timezone(None)
+    header = f"Нашел по запросу {wrap_entity(query, '*')}:\n\n"
+    return header + "".join([render_task_line(task, tz) + "\n" for task in tasks])
+
+def render_digest(digest_date, summary: str | None, tasks, open_total: int, tz: tzinfo) -> str:
+    # Ежедневная сводка: текст модели (если есть) и самые важные незакрытые задачи
+    lines = [f"☀️ *Сводка на {digest_date.strftime('%d.%m')}*", ""]
+    if summary:
+        lines += [escape(summary), ""]
+    for task in tasks:
+        parts = [f"*{task.id}.* ", escape(task.task_text)]
+        if task.due_date:
+            parts.append(f" (до {format_due(task.due_date, tz)})")
+        if task.status == 'overdue':
+            parts.append(OVERDUE_FRAGMENT)
+        parts.append(PRIORITY_FRAGMENTS.get(task.priority, ""))
+        lines.append("".join(parts))
+    if open_total > len(tasks):
+        lines.append(f"...и еще {open_total - len(tasks)} в /list.")
+    return "\n".join(lines)
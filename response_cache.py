@@ -0,0 +1,100 @@
+# response_cache.py
+# -*- coding: utf-8 -*-
+# TTL + LRU кеш ответов AI для шаблонных ситуаций (приветствие, подсказки по командам и т.п.)
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    def __init__(self, max_size: int = 256, ttl: float = 3600, path: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # key -> (время истечения по time.time(), ответ); порядок = порядок последнего использования
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        if self.path:
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось загрузить кеш ответов из %s: %s", self.path, e)
+            return
+        # Файл мог записать кто угодно: JSON другой формы (список, записи без полей) — как битый файл, кеш пустой
+        entries = OrderedDict()
+        try:
+            for key, (expires_at, value) in raw.items():
+                if not isinstance(expires_at, (int, float)) or not isinstance(value, str):
+                    raise TypeError(f"некорректная запись {key!r}")
+                entries[key] = (expires_at, value)
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.warning("Кеш ответов в %s в неизвестном формате, начинаем с пустого: %s", self.path, e)
+            return
+        now = time.time()
+        for key, (expires_at, value) in entries.items():
+            if expires_at >= now:
+                self._entries[key] = (expires_at, value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _save(self) -> None:
+        with self._lock:
+            snapshot = dict(self._entries)
+        # Пишем во временный файл и атомарно подменяем, чтобы не оставить битый кеш при падении
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить кеш ответов в %s: %s", self.path, e)
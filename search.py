@@ -0,0 +1,64 @@
+# search.py
+# -*- coding: utf-8 -*-
+# Подготовка поискового запроса /find для полнотекстового индекса (SQLite FTS5 или Postgres tsvector).
+# Морфологии в FTS5 нет, поэтому слова запроса обрезаются до основы (упрощенное отсечение русских окончаний)
+# и ищутся по префиксу: «молока» находит «молоко», «купить» — «купил» и «покупки» не находит.
+
+import re
+
+# Не больше стольких слов из запроса: длинный запрос из многих AND почти никогда ничего не находит
+MAX_QUERY_TERMS = 8
+# Основа короче этого не обрезается: префикс из двух букв совпадет почти со всем
+MIN_STEM_LENGTH = 3
+# Длины префиксов, для которых FTS5 строит отдельный индекс (prefix=... в db.ensure_search_index). Без него
+# префиксный запрос собирает списки документов всех подходящих слов во всей таблице, а не только у пользователя
+FTS5_PREFIX_LENGTHS = (3, 4, 5, 6)
+
+# Окончания существительных, прилагательных и глаголов, самые длинные первыми
+RUSSIAN_ENDINGS = tuple(sorted((
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ей', 'ой', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ие', 'ые',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ов', 'ев', 'ью', 'ия', 'ья',
+    'ться', 'тся', 'ить', 'ать', 'ять', 'еть', 'ешь', 'ете', 'ет', 'ут', 'ют', 'ит', 'ат', 'ят', 'ла', 'ло', 'ли',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True))
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+
+def normalize_text(text: str) -> str:
+    # Ё и е в запросах пишут вперемешку; индекс FTS5 хранит текст с той же заменой (см. db.ensure_search_index)
+    return text.lower().replace('ё', 'е')
+
+def stem(word: str) -> str:
+    if not CYRILLIC.search(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+def query_words(query: str) -> list[str]:
+    """Слова запроса в нижнем регистре, без повторов и знаков препинания."""
+    words = []
+    for word in WORD.findall(normalize_text(query)):
+        if word not in words:
+            words.append(word)
+    return words[:MAX_QUERY_TERMS]
+
+def fts5_owner(user_id: int) -> str:
+    return f"u{user_id}"
+
+def fts5_match(user_id: int, words: list[str]) -> str:
+    # Владелец — отдельная индексируемая колонка: пересечение с его коротким списком документов
+    # не читает совпадения других пользователей. Слова в кавычках, поэтому синтаксис FTS5 в запросе не срабатывает
+    terms = " AND ".join(_fts5_term(word) for word in words)
+    return f"owner:{fts5_owner(user_id)} AND ({terms})"
+
+def _fts5_term(word: str) -> str:
+    # Префикс длиннее индексированного обрезается: «презентаци» ищется как «презен*»
+    prefix = stem(word)[:max(FTS5_PREFIX_LENGTHS)]
+    return f'"{prefix}"*' if len(prefix) >= min(FTS5_PREFIX_LENGTHS) else f'"{prefix}"'
+
+def pg_tsquery(words: list[str]) -> str:
+    # Основы слов выделяет конфигурация russian; :* — совпадение по префиксу, как в FTS5
+    return " & ".join(f"{word}:*" for word in words)
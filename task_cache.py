@@ -0,0 +1,211 @@
+# task_cache.py
+# -*- coding: utf-8 -*-
+# Кеш незакрытых задач пользователей (OPEN_STATUSES) в памяти процесса (LRU по пользователям).
+# Строки хранятся компактно (__slots__) и уже отсортированы в порядке /list; task_manager обновляет кеш
+# при каждом изменении задачи (write-through), поэтому чтение /list обходится без запросов к БД.
+
+import bisect
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pytz
+
+from db import OPEN_STATUSES
+
+# Должно совпадать с task_manager.PRIORITY_ORDER
+PRIORITY_RANKS = {'high': 3, 'medium': 2, 'low': 1}
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # В БД сроки хранятся без часового пояса (UTC); в кеше держим их в том же виде, что вернул бы запрос
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(pytz.utc).replace(tzinfo=None)
+    return value
+
+class CachedTask:
+    """Строка задачи для списка: те же атрибуты, что читает отрисовка, без ORM-состояния."""
+
+    __slots__ = ('id', 'task_text', 'due_date', 'priority', 'category', 'notes_count', 'status', 'sort_key')
+
+    def __init__(self, id: int, task_text: str, due_date: datetime | None, priority: str,
+                 category: str | None, notes_count: int = 0, status: str = 'pending'):
+        self.id = id
+        self.task_text = task_text
+        self.due_date = _naive_utc(due_date)
+        self.priority = priority
+        self.category = category
+        self.notes_count = notes_count
+        self.status = status
+        self.sort_key = sort_key(PRIORITY_RANKS.get(priority, 0), self.due_date, id)
+
+    @classmethod
+    def from_task(cls, task) -> 'CachedTask':
+        return cls(task.id, task.task_text, task.due_date, task.priority, task.category, task.notes_count or 0, task.status)
+
+    @property
+    def cursor(self) -> tuple:
+        # Тот же курсор (ранг приоритета, срок, id), что и у keyset-пагинации в SQL
+        return (PRIORITY_RANKS.get(self.priority, 0), self.due_date, self.id)
+
+def sort_key(rank: int, due_date: datetime | None, task_id: int) -> tuple:
+    # Порядок TASK_LIST_ORDER: приоритет по убыванию, затем срок (без срока — в конце), затем id
+    return (-rank, due_date is None, due_date or datetime.min, task_id)
+
+class TaskCache:
+    def __init__(self, max_users: int, max_rows_per_user: int):
+        self.max_users = max_users
+        self.max_rows_per_user = max_rows_per_user
+        self._users: OrderedDict[int, list[CachedTask]] = OrderedDict()
+        # Загрузки из БД в процессе: user_id -> [поколение, число загрузок]. Каждое изменение задач пользователя
+        # увеличивает поколение, и put не кладет снимок, прочитанный до этого изменения
+        self._loads: dict[int, list[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0
+
+    def get(self, user_id: int, count: bool = True) -> list[CachedTask] | None:
+        # count=False — повторное чтение в том же запросе (после put): в hits/misses запрос уже учтен
+        with self._lock:
+            rows = self._users.get(user_id)
+            if rows is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            if count:
+                self.hits += 1
+            return rows
+
+    def begin_load(self, user_id: int) -> int:
+        """Отмечает начало загрузки набора из БД и возвращает поколение для put. Парный вызов — end_load."""
+        with self._lock:
+            load = self._loads.setdefault(user_id, [0, 0])
+            load[1] += 1
+            return load[0]
+
+    def end_load(self, user_id: int) -> None:
+        with self._lock:
+            load = self._loads.get(user_id)
+            if load is not None:
+                load[1] -= 1
+                if load[1] <= 0:
+                    del self._loads[user_id]
+
+    def put(self, user_id: int, tasks, generation: int | None = None) -> bool:
+        """Кладет полный набор незакрытых задач пользователя. Слишком большие наборы не кешируются.
+
+        generation — значение begin_load до запроса: если задачи пользователя с тех пор менялись, снимок устарел
+        (upsert при отсутствии набора в кеше ничего не делает) и не кладется.
+        """
+        if not self.enabled or len(tasks) > self.max_rows_per_user:
+            return False
+        rows = sorted((CachedTask.from_task(task) for task in tasks), key=lambda row: row.sort_key)
+        with self._lock:
+            if generation is not None and self._loads.get(user_id, [None])[0] != generation:
+                return False
+            self._users[user_id] = rows
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return True
+
+    def upsert(self, user_id: int, task) -> None:
+        # Обновляет строку, только если набор пользователя уже в кеше; иначе его загрузит следующий /list
+        with self._lock:
+            self._bump(user_id)
+            rows = self._users.get(user_id)
+            if rows is None:
+                return
+            self._remove_row(rows, task.id)
+            if task.status not in OPEN_STATUSES:
+                return
+            if len(rows) >= self.max_rows_per_user:
+                del self._users[user_id]
+                return
+            row = CachedTask.from_task(task)
+            bisect.insort(rows, row, key=lambda item: item.sort_key)
+
+    def remove(self, user_id: int, task_id: int) -> None:
+        with self._lock:
+            self._bump(user_id)
+            rows = self._users.get(user_id)
+            if rows is not None:
+                self._remove_row(rows, task_id)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        with self._lock:
+            self._bump(user_id)
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def _bump(self, user_id: int | None) -> None:
+        # Вызывается под self._lock; None — изменились задачи всех пользователей
+        if user_id is None:
+            for load in self._loads.values():
+                load[0] += 1
+        elif user_id in self._loads:
+            self._loads[user_id][0] += 1
+
+    @staticmethod
+    def _remove_row(rows: list[CachedTask], task_id: int) -> None:
+        for index, row in enumerate(rows):
+            if row.id == task_id:
+                del rows[index]
+                return
+
+    def stats(self, memory: bool = True) -> dict:
+        # memory=False — без оценки памяти: она обходит все строки, а счетчики нужны при каждом сборе метрик
+        with self._lock:
+            users = list(self._users.values())
+        row_count = sum(len(rows) for rows in users)
+        total = self.hits + self.misses
+        stats = {
+            "users": len(users),
+            "rows": row_count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+        if memory:
+            stats["memory_bytes"] = self.memory_bytes(users)
+        return stats
+
+    @staticmethod
+    def memory_bytes(users: list[list[CachedTask]]) -> int:
+        # Оценка: списки, строки-объекты и их поля (общие объекты вроде 'medium' считаются каждый раз — верхняя граница)
+        size = 0
+        for rows in users:
+            size += sys.getsizeof(rows)
+            for row in rows:
+                size += sys.getsizeof(row) + sys.getsizeof(row.sort_key) + sys.getsizeof(row.task_text)
+                if row.due_date is not None:
+                    size += sys.getsizeof(row.due_date)
+        return size
+
+def page_rows(rows: list[CachedTask], category: str | None, after: tuple | None, before: tuple | None,
+              page_size: int) -> tuple[list[CachedTask], tuple | None, tuple | None]:
+    """Страница из отсортированного набора по тем же правилам, что и get_user_tasks_page в SQL."""
+    if category:
+        category = category.lower()
+        rows = [row for row in rows if row.category == category]
+
+    if before is not None:
+        end = bisect.bisect_left(rows, sort_key(*before), key=lambda row: row.sort_key)
+        start = max(0, end - page_size)
+        tasks = rows[start:end]
+        has_prev, has_next = start > 0, True
+    else:
+        start = bisect.bisect_right(rows, sort_key(*after), key=lambda row: row.sort_key) if after is not None else 0
+        tasks = rows[start:start + page_size]
+        has_prev, has_next = after is not None, start + page_size < len(rows)
+
+    if not tasks:
+        return [], None, None
+    return tasks, tasks[-1].cursor if has_next else None, tasks[0].cursor if has_prev else None
@@ -0,0 +1,65 @@
+# task_import.py
+# -*- coding: utf-8 -*-
+# Разбор файлов импорта задач (CSV / JSON) в список строк для add_tasks_bulk
+
+import csv
+import io
+import json
+
+# Имена колонок/полей, в которых может лежать текст задачи
+TEXT_FIELDS = ('task', 'task_text', 'text', 'задача')
+
+def _row_to_text(row: dict) -> str | None:
+    lowered = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    for field in TEXT_FIELDS:
+        value = lowered.get(field)
+        if value:
+            parts = [str(value).strip()]
+            # Необязательные колонки дописываем в текст, дальше их разберет обычный парсер
+            if lowered.get('due_date'):
+                parts.append(str(lowered['due_date']).strip())
+            if lowered.get('priority'):
+                parts.append(str(lowered['priority']).strip())
+            if lowered.get('category'):
+                parts.append('#' + str(lowered['category']).strip().lstrip('#'))
+            return " ".join(parts)
+    return None
+
+def parse_csv(data: str) -> list[str]:
+    reader = csv.reader(io.StringIO(data))
+    rows = [row for row in reader if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if any(field in header for field in TEXT_FIELDS):
+        texts = (_row_to_text(dict(zip(header, row))) for row in rows[1:])
+        return [text for text in texts if text]
+    # Без заголовка: первая колонка — текст задачи
+    return [row[0].strip() for row in rows if row[0].strip()]
+
+def parse_json(data: str) -> list[str]:
+    items = json.loads(data)
+    if isinstance(items, dict):
+        items = items.get('tasks', [])
+    if not isinstance(items, list):
+        raise ValueError("JSON должен быть списком задач")
+    texts = []
+    for item in items:
+        if isinstance(item, str):
+            text = item.strip()
+        elif isinstance(item, dict):
+            text = _row_to_text(item)
+        else:
+            text = None
+        if text:
+            texts.append(text)
+    return texts
+
+def parse_import_file(file_name: str, content: bytes) -> list[str]:
+    data = content.decode('utf-8-sig')
+    if file_name.lower().endswith('.json'):
+        return parse_json(data)
+    if file_name.lower().endswith('.csv'):
+        return parse_csv(data)
+    # Обычный текстовый файл: одна задача на строку
+    return [line.strip() for line in data.splitlines() if line.strip()]
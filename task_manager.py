@@ -1,234 +1,1161 @@
 # task_manager.py
 # -*- coding: utf-8 -*-
 
-from datetime import datetime
-from db import Task, get_session
-from ai_service import parse_task_with_ai
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, time as dtime
+from typing import NamedTuple
+from db import Task, TaskNote, User, Digest, SavedQuery, OPEN_STATUSES, SEARCH_BACKEND, get_session, get_async_session
+from sqlalchemy import select, update, delete, case, func, and_, or_, table, column, literal_column, union_all
+from sqlalchemy.exc import IntegrityError
+from ai_service import parse_task_with_ai, parse_tasks_with_ai, generate_digests
+from task_parser import parse_task_locally, is_confident
 import dateparser
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import pytz
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+from config import (
+    REMINDER_HORIZON_HOURS, REMINDER_REFILL_MINUTES, REMINDER_CATCHUP_MINUTES, LIST_PAGE_SIZE, MAX_BATCH_TASKS,
+    TASK_CACHE_MAX_USERS, TASK_CACHE_MAX_ROWS, MULTI_WORKER, WORKER_ID, LEADER_LEASE_SECONDS, REMINDER_POLL_SECONDS,
+    OVERDUE_SWEEP_MINUTES, OVERDUE_GRACE_MINUTES, OVERDUE_SWEEP_BATCH, OVERDUE_DIGEST,
+    DIGEST_ENABLED, DIGEST_DEFAULT_HOUR, DIGEST_GENERATE_MINUTES, DIGEST_LEAD_MINUTES, DIGEST_USERS_PER_REQUEST,
+    DIGEST_MAX_CONCURRENCY, DIGEST_MAX_TASKS, DIGEST_DELIVERY_SECONDS, NOTES_VIEW_LIMIT, SAVED_QUERIES_PER_USER,
+    DEFAULT_TIMEZONE,
+)
+from reminder_dispatcher import dispatcher
+from leader import LeaderLease
+from metrics import OVERDUE_SWEPT, DIGESTS, instrumented, gauge
+from task_cache import TaskCache, page_rows
+from search import query_words, fts5_match, pg_tsquery
+from rendering import get_timezone, is_valid_timezone, to_local, format_due, escape, wrap_entity, render_digest
+
+logger = logging.getLogger(__name__)
+
+# Планировщик работает на event loop приложения и только ставит напоминания в очередь диспетчера
+scheduler = AsyncIOScheduler(timezone=pytz.utc)
+
+# До какого момента ожидающие напоминания уже загружены из БД в планировщик
+_loaded_until = None
 
 # Helper for priority sorting (map string priorities to sortable numbers)
 PRIORITY_ORDER = {'high': 3, 'medium': 2, 'low': 1}
 
+# То же отображение в виде SQL CASE, чтобы сортировать в запросе, а не в Python
+PRIORITY_RANK = case(PRIORITY_ORDER, value=Task.priority, else_=0)
+TASK_LIST_ORDER = (PRIORITY_RANK.desc(), Task.due_date.is_(None), Task.due_date.asc(), Task.id.asc())
+
+# Незакрытые задачи пользователей в памяти; все изменяющие функции ниже обновляют его после commit.
+# При нескольких воркерах задачу может изменить другой процесс, поэтому кеш выключен
+task_cache = TaskCache(0 if MULTI_WORKER else TASK_CACHE_MAX_USERS, TASK_CACHE_MAX_ROWS)
+gauge('task_cache_hit_ratio', 'Доля /list, обслуженных из кеша задач', lambda: task_cache.stats(memory=False)["hit_ratio"])
+gauge('task_cache_users', 'Пользователей в кеше задач', lambda: task_cache.stats(memory=False)["users"])
+gauge('task_cache_memory_bytes', 'Оценка памяти кеша задач', lambda: task_cache.stats()["memory_bytes"])
+
+# Рассылкой напоминаний занимается один воркер. В одиночном режиме это всегда текущий процесс,
+# при MULTI_WORKER — лидер по аренде в БД; остальные воркеры только пишут задачи, а лидер находит их опросом
+leadership: LeaderLease | None = None
+
+def is_reminder_leader() -> bool:
+    return leadership is None or leadership.is_leader
+
 # Функция для добавления напоминания в планировщик
-def schedule_reminder(bot_app, chat_id, task_id, task_text, due_date):
+def schedule_reminder(chat_id, task_id, task_text, due_date):
     if due_date:
-        job_id = f"reminder_{task_id}"
-        scheduler.add_job(
-            send_reminder_message,
-            'date',
-            run_date=due_date,
-            args=[bot_app, chat_id, task_id, task_text],
-            id=job_id,
-            replace_existing=True
-        )
-        print(f"Напоминание для задачи {task_id} запланировано на {due_date}")
+        _add_reminder_job(chat_id, task_id, task_text, due_date)
+        logger.debug("Напоминание для задачи %s запланировано на %s", task_id, due_date)
+
+def _add_reminder_job(chat_id, task_id, task_text, due_date):
+    if not is_reminder_leader():
+        return
+    scheduler.add_job(
+        enqueue_reminder,
+        'date',
+        run_date=due_date,
+        args=[chat_id, task_id, task_text, due_date],
+        id=f"reminder_{task_id}",
+        replace_existing=True,
+        misfire_grace_time=int(REMINDER_CATCHUP_MINUTES * 60),
+    )
+
+def _utcnow() -> datetime:
+    # Колонки дат — без часового пояса: asyncpg не принимает в них aware datetime, поэтому пишем naive UTC
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite возвращает даты без tzinfo; в БД они хранятся в UTC
+    return pytz.utc.localize(dt) if dt.tzinfo is None else dt.astimezone(pytz.utc)
 
-# Function that will send a reminder
-async def send_reminder_message(bot_app, chat_id, task_id, task_text):
-    # Get a new session for this async function
+def _load_pending_reminders(since: datetime | None, until: datetime) -> list[tuple]:
+    # Один запрос по индексу (status, due_date); грузим только нужные колонки, без ORM-объектов
     session = get_session()
     try:
-        task = session.query(Task).filter_by(id=task_id).first()
-        if task and task.status == 'pending': # Send only if task is still pending
-            now_utc = datetime.now(pytz.utc)
-            # Ensure the scheduled task hasn't been completed or passed long ago
-            if task.due_date and task.due_date <= now_utc:
-                await bot_app.send_message(chat_id, f"Привет! 👋 Просто напоминаю, что у тебя есть задача: *{task_text}*! Давай ее сделаем?")
-                # Optional: You might want to update task status to 'overdue' here
-    except Exception as e:
-        print(f"Ошибка при отправке напоминания для задачи {task_id}: {e}")
+        query = session.query(Task.id, Task.user_id, Task.task_text, Task.due_date).filter(
+            Task.status == 'pending',
+            Task.reminder_status == 'pending',
+            Task.due_date.isnot(None),
+            Task.due_date <= until.replace(tzinfo=None),
+        )
+        if since is not None:
+            query = query.filter(Task.due_date > since.replace(tzinfo=None))
+        return query.order_by(Task.due_date).all()
     finally:
         session.close()
 
+@instrumented('rehydrate_reminders')
+def rehydrate_reminders(now: datetime | None = None) -> dict:
+    """Загружает из БД ожидающие напоминания в ближайшем окне и регистрирует их в планировщике.
+
+    Политика догоняния: задачи, просроченные не более чем на REMINDER_CATCHUP_MINUTES,
+    напоминаются сразу; более старые пропускаются (напоминание уже неактуально).
+    Задачи дальше REMINDER_HORIZON_HOURS подгружаются периодически (refill_reminders),
+    поэтому время старта не зависит от общего числа ожидающих задач.
+    """
+    global _loaded_until
+    now = now or datetime.now(pytz.utc)
+    catchup_since = now - timedelta(minutes=REMINDER_CATCHUP_MINUTES)
+    until = now + timedelta(hours=REMINDER_HORIZON_HOURS)
+
+    stats = {"scheduled": 0, "caught_up": 0}
+    for task_id, user_id, task_text, due_date in _load_pending_reminders(catchup_since, until):
+        due_date = _as_utc(due_date)
+        if due_date <= now:
+            stats["caught_up"] += 1
+            due_date = now
+        # Личный чат с ботом: chat_id совпадает с user_id
+        _add_reminder_job(user_id, task_id, task_text, due_date)
+        stats["scheduled"] += 1
+    _loaded_until = until
+    return stats
+
+@instrumented('refill_reminders')
+def refill_reminders() -> None:
+    # Дозагружаем следующую порцию напоминаний, попавших в окно планирования.
+    # Обычная функция: AsyncIOScheduler выполнит ее в пуле потоков, не блокируя event loop.
+    global _loaded_until
+    until = datetime.now(pytz.utc) + timedelta(hours=REMINDER_HORIZON_HOURS)
+    for task_id, user_id, task_text, due_date in _load_pending_reminders(_loaded_until, until):
+        _add_reminder_job(user_id, task_id, task_text, _as_utc(due_date))
+    _loaded_until = until
+
+@instrumented('poll_due_reminders')
+def poll_due_reminders() -> None:
+    # Только при MULTI_WORKER: задачи, добавленные другими воркерами после загрузки окна, лидер находит здесь.
+    # Повторная постановка уже запланированного напоминания заменяет задание (тот же id)
+    now = datetime.now(pytz.utc)
+    release_stale_claims(now - timedelta(seconds=LEADER_LEASE_SECONDS))
+    since = now - timedelta(minutes=REMINDER_CATCHUP_MINUTES)
+    for task_id, user_id, task_text, due_date in _load_pending_reminders(since, now + timedelta(seconds=REMINDER_POLL_SECONDS)):
+        _add_reminder_job(user_id, task_id, task_text, max(_as_utc(due_date), now))
 
-def add_task(user_id: int, raw_task_text: str) -> str:
+def release_stale_claims(older_than: datetime | None = None) -> int:
+    """Возвращает в pending напоминания, захваченные другим воркером, который упал до отправки.
+
+    Прежний лидер теряет роль не позже чем через срок аренды, поэтому его захваты старше этого срока
+    считаются брошенными. Свои захваты не трогаем: они еще ждут очереди в диспетчере.
+    В одиночном режиме при старте брошены все захваты (older_than=None).
+    """
     session = get_session()
     try:
-        default_timezone = pytz.utc
+        query = update(Task).where(Task.reminder_status == 'dispatching')
+        if older_than is not None:
+            query = query.where(Task.reminder_claimed_at < older_than.replace(tzinfo=None),
+                                Task.reminder_claimed_by != WORKER_ID)
+        result = session.execute(query.values(reminder_status='pending', updated_at=Task.updated_at))
+        session.commit()
+        return result.rowcount
+    finally:
+        session.close()
 
-        parsed_data = parse_task_with_ai(raw_task_text, user_id)
-        task_text = parsed_data.get('task_text')
-        due_date_str = parsed_data.get('due_date')
-        priority = parsed_data.get('priority', 'medium').lower()
-        category = parsed_data.get('category', None) # <-- НОВОЕ: Получаем категорию
+OVERDUE_DIGEST_MAX_LINES = 10
 
-        # Validate priority (остается как было)
-        if priority not in PRIORITY_ORDER:
-            priority = 'medium'
+# Итоги проходов sweep_overdue_tasks с момента старта
+sweep_stats = {"runs": 0, "rows_total": 0, "rows_last": 0, "seconds_last": 0.0}
 
-        if not task_text:
-            return "Я не смог понять, что это за задача. Пожалуйста, попробуй сформулировать яснее."
+def _overdue_digest(tasks: list[tuple]) -> str:
+    lines = [f"⏰ Срок прошел у задач: *{len(tasks)}*."]
+    for task_id, task_text in tasks[:OVERDUE_DIGEST_MAX_LINES]:
+        lines.append(f"*{task_id}.* {escape(task_text)}")
+    if len(tasks) > OVERDUE_DIGEST_MAX_LINES:
+        lines.append(f"...и еще {len(tasks) - OVERDUE_DIGEST_MAX_LINES}.")
+    lines.append("Они остаются в /list с пометкой ⏰. Выполненные можно отметить через /done.")
+    return "\n".join(lines)
 
-        # ... (парсинг due_date_str - без изменений) ...
-        due_date = None
-        if due_date_str:
-            try:
-                due_date = dateparser.parse(
-                    due_date_str,
-                    settings={
-                        'TIMEZONE': default_timezone.tzname(datetime.now()),
-                        'PREFER_DATES_FROM': 'future',
-                        'RELATIVE_BASE': datetime.now(default_timezone)
-                    }
-                )
-                if due_date and due_date.tzinfo is None:
-                    due_date = default_timezone.localize(due_date)
-            except Exception as e:
-                print(f"Ошибка парсинга due_date_str через dateparser: {e}")
-                try:
-                    due_date = datetime.strptime(due_date_str, '%Y-%m-%d %H:%M:%S')
-                    due_date = default_timezone.localize(due_date)
-                except ValueError:
-                    pass
-
-        if not due_date and ("напомни" in raw_task_text.lower() or "завтра" in raw_task_text.lower() or "послезавтра" in raw_task_text.lower() or "в среду" in raw_task_text.lower()):
-            due_date = dateparser.parse(
-                raw_task_text,
-                settings={
-                    'PREFER_DATES_FROM': 'future',
-                    'RELATIVE_BASE': datetime.now(default_timezone),
-                    'TIMEZONE': default_timezone.tzname(datetime.now())
-                }
-            )
+@instrumented('sweep_overdue_tasks')
+async def sweep_overdue_tasks(now: datetime | None = None) -> dict:
+    """Переводит в overdue ожидающие задачи, срок которых прошел больше OVERDUE_GRACE_MINUTES назад.
+
+    Один UPDATE по индексу (status, due_date): читаются только строки, которые меняются, поэтому
+    стоимость прохода зависит от числа просроченных задач, а не от размера таблицы.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(pytz.utc)
+    cutoff = (now - timedelta(minutes=OVERDUE_GRACE_MINUTES)).replace(tzinfo=None)
+    # Ограничение на проход: после долгого простоя хвост уйдет следующими проходами
+    due_ids = (select(Task.id).where(Task.status == 'pending', Task.due_date < cutoff)
+               .order_by(Task.due_date).limit(OVERDUE_SWEEP_BATCH))
+    session = get_async_session()
+    try:
+        rows = (await session.execute(
+            update(Task)
+            .where(Task.id.in_(due_ids), Task.status == 'pending')
+            .values(status='overdue')
+            .returning(Task.id, Task.user_id, Task.task_text)
+        )).all()
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+    by_user = defaultdict(list)
+    for task_id, user_id, task_text in rows:
+        by_user[user_id].append((task_id, task_text))
+    # В кеше у этих задач прежний статус
+    for user_id in by_user:
+        task_cache.invalidate(user_id)
+
+    digests = 0
+    if OVERDUE_DIGEST and by_user:
+        # Одна сводка на пользователя вместо сообщения на каждую задачу; лимиты Telegram соблюдает диспетчер
+        results = await asyncio.gather(*(dispatcher.send(user_id, _overdue_digest(tasks)) for user_id, tasks in by_user.items()),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Не удалось отправить сводку о просроченных задачах: %s", result)
+            else:
+                digests += 1
+
+    elapsed = time.perf_counter() - started
+    OVERDUE_SWEPT.inc(len(rows))
+    sweep_stats["runs"] += 1
+    sweep_stats["rows_total"] += len(rows)
+    sweep_stats["rows_last"] = len(rows)
+    sweep_stats["seconds_last"] = elapsed
+    if rows:
+        logger.info("Просрочено задач: %s у %s пользователей, сводок: %s, проход занял %.3f с",
+                    len(rows), len(by_user), digests, elapsed)
+    return {"rows": len(rows), "users": len(by_user), "digests": digests, "seconds": elapsed}
+
+# --- Ежедневная сводка ---
+
+# В сводке сначала просроченные задачи, дальше порядок как в /list
+DIGEST_TASK_ORDER = (case((Task.status == 'overdue', 0), else_=1), *TASK_LIST_ORDER)
+# Сводки, которые не удалось доставить вовремя (бот был остановлен), после этого срока уже не отправляются
+DIGEST_DELIVERY_GRACE = timedelta(hours=3)
+DIGEST_DELIVERY_BATCH = 1000
+
+# Итоги генераций generate_daily_digests с момента старта
+digest_stats = {"runs": 0, "digests_total": 0, "llm_requests_total": 0, "fallbacks_total": 0, "seconds_last": 0.0}
+
+class DigestTask(NamedTuple):
+    id: int
+    task_text: str
+    due_date: datetime | None
+    priority: str
+    status: str
+
+def _next_digest_time(now: datetime, tz, hour: int) -> datetime:
+    """Ближайший после now момент (UTC), когда у пользователя наступает hour:00 по местному времени."""
+    local_now = now.astimezone(tz)
+    local = tz.localize(datetime.combine(local_now.date(), dtime(hour)))
+    if local <= local_now:
+        local = tz.localize(datetime.combine(local_now.date() + timedelta(days=1), dtime(hour)))
+    return local.astimezone(pytz.utc)
+
+def _digest_section(tasks: list[DigestTask], open_total: int, tz, now: datetime) -> str:
+    # Описание задач пользователя для модели; без идентификаторов пользователя и задач
+    today = now.astimezone(tz).date()
+    lines = [f"Открытых задач: {open_total}"]
+    for task in tasks:
+        details = []
+        if task.status == 'overdue':
+            details.append("просрочено")
+        elif task.due_date and to_local(task.due_date, tz).date() == today:
+            details.append(f"сегодня до {format_due(task.due_date, tz)[11:]}")
+        elif task.due_date:
+            details.append(f"срок {format_due(task.due_date, tz)}")
+        if task.priority == 'high':
+            details.append("высокий приоритет")
+        lines.append(f"- {task.task_text}" + (f" ({', '.join(details)})" if details else ""))
+    return "\n".join(lines)
+
+async def _due_digest_settings(now: datetime, until: datetime) -> tuple[list[tuple[str, int]], bool]:
+    """Пары (часовой пояс, час сводки), у которых доставка наступит до until, и входит ли в них пара по умолчанию.
+
+    Различных пар немного (пояса x часы), поэтому время доставки считается по ним, а не по каждому пользователю.
+    """
+    zone = func.coalesce(User.timezone, DEFAULT_TIMEZONE)
+    hour = func.coalesce(User.digest_hour, DIGEST_DEFAULT_HOUR)
+    session = get_async_session()
+    try:
+        settings = (await session.execute(select(zone, hour).distinct())).all()
+    finally:
+        await session.close()
+    settings = set(settings) | {(DEFAULT_TIMEZONE, DIGEST_DEFAULT_HOUR)}
+    due = [(name, digest_hour) for name, digest_hour in settings
+           if _next_digest_time(now, get_timezone(name), digest_hour) <= until]
+    return due, (DEFAULT_TIMEZONE, DIGEST_DEFAULT_HOUR) in due
+
+async def _load_digest_candidates(now: datetime, until: datetime) -> dict[int, dict]:
+    # Одна агрегирующая выборка: первые DIGEST_MAX_TASKS открытых задач каждого пользователя (оконная функция)
+    # и их число вместе с настройками. Ранжируются только пользователи, у которых доставка наступит в ближайшие
+    # DIGEST_LEAD_MINUTES: за проход это небольшая часть всех пользователей
+    due, default_due = await _due_digest_settings(now, until)
+    if not due:
+        return {}
+    due_condition = or_(*(and_(func.coalesce(User.timezone, DEFAULT_TIMEZONE) == name,
+                               func.coalesce(User.digest_hour, DIGEST_DEFAULT_HOUR) == digest_hour)
+                          for name, digest_hour in due))
+    if default_due:
+        # У пользователей без строки в users настройки по умолчанию: исключаем тех, у кого строка есть и время другое
+        user_filter = Task.user_id.not_in(select(User.user_id).where(~due_condition))
+    else:
+        user_filter = Task.user_id.in_(select(User.user_id).where(due_condition))
+
+    ranked = (
+        select(Task.user_id, Task.id, Task.task_text, Task.due_date, Task.priority, Task.status,
+               func.row_number().over(partition_by=Task.user_id, order_by=DIGEST_TASK_ORDER).label('position'),
+               func.count().over(partition_by=Task.user_id).label('open_total'))
+        .where(Task.status.in_(OPEN_STATUSES), user_filter)
+        .subquery()
+    )
+    query = (
+        select(ranked, User.timezone, User.digest_hour)
+        .outerjoin(User, User.user_id == ranked.c.user_id)
+        .where(ranked.c.position <= DIGEST_MAX_TASKS, User.digest_enabled.isnot(False))
+        .order_by(ranked.c.user_id, ranked.c.position)
+    )
+    session = get_async_session()
+    try:
+        rows = (await session.execute(query)).all()
+    finally:
+        await session.close()
+
+    candidates = {}
+    for row in rows:
+        candidate = candidates.get(row.user_id)
+        if candidate is None:
+            tz = get_timezone(row.timezone)
+            deliver_at = _next_digest_time(now, tz, DIGEST_DEFAULT_HOUR if row.digest_hour is None else row.digest_hour)
+            candidate = candidates[row.user_id] = {
+                "tz": tz, "deliver_at": deliver_at, "digest_date": deliver_at.astimezone(tz).date(),
+                "open_total": row.open_total, "tasks": [],
+            }
+        candidate["tasks"].append(DigestTask(row.id, row.task_text, row.due_date, row.priority, row.status))
+    return {user_id: candidate for user_id, candidate in candidates.items() if candidate["deliver_at"] <= until}
+
+async def _save_digests(digests: list[dict]) -> list[dict]:
+    """Записывает сводки группы и возвращает записанные. Сводку на этот день мог уже записать другой проход
+    (например, новый лидер): конфликт uq_digests_user_date пропускает только ее, а не всю группу."""
+    session = get_async_session()
+    try:
+        session.add_all([Digest(**digest) for digest in digests])
+        await session.commit()
+        return digests
+    except IntegrityError:
+        await session.rollback()
+    finally:
+        await session.close()
+
+    saved = []
+    for digest in digests:
+        session = get_async_session()
+        try:
+            session.add(Digest(**digest))
+            await session.commit()
+            saved.append(digest)
+        except IntegrityError:
+            await session.rollback()
+            logger.info("Сводка пользователю %s на %s уже подготовлена", digest["user_id"], digest["digest_date"])
+        finally:
+            await session.close()
+    return saved
+
+@instrumented('generate_daily_digests')
+async def generate_daily_digests(now: datetime | None = None) -> dict:
+    """Готовит сводки пользователям, у которых время доставки наступит в ближайшие DIGEST_LEAD_MINUTES.
+
+    Несколько пользователей в одном запросе к модели, не больше DIGEST_MAX_CONCURRENCY запросов одновременно.
+    Повторный запуск безопасен: сводка на уже подготовленный день пропускается.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(pytz.utc)
+    candidates = await _load_digest_candidates(now, now + timedelta(minutes=DIGEST_LEAD_MINUTES))
+
+    if candidates:
+        session = get_async_session()
+        try:
+            dates = {candidate["digest_date"] for candidate in candidates.values()}
+            existing = set((await session.execute(
+                select(Digest.user_id, Digest.digest_date).where(Digest.digest_date.in_(dates))
+            )).all())
+        finally:
+            await session.close()
+        candidates = {user_id: candidate for user_id, candidate in candidates.items()
+                      if (user_id, candidate["digest_date"]) not in existing}
+
+    user_ids = list(candidates)
+    groups = [user_ids[i:i + DIGEST_USERS_PER_REQUEST] for i in range(0, len(user_ids), DIGEST_USERS_PER_REQUEST)]
+    semaphore = asyncio.Semaphore(DIGEST_MAX_CONCURRENCY)
+    # Записи групп по одной: на SQLite параллельные транзакции записи ждут друг друга и упираются в busy_timeout
+    write_lock = asyncio.Lock()
+
+    async def summarize(group: list[int]) -> list[dict]:
+        sections = [_digest_section(candidates[user_id]["tasks"], candidates[user_id]["open_total"],
+                                    candidates[user_id]["tz"], now) for user_id in group]
+        async with semaphore:
+            summaries = await generate_digests(sections)
+        digests = []
+        for user_id, summary in zip(group, summaries):
+            candidate = candidates[user_id]
+            # Без текста модели сводка все равно уходит: список самых важных задач
+            digests.append({
+                "user_id": user_id, "digest_date": candidate["digest_date"], "ai_generated": summary is not None,
+                "text": render_digest(candidate["digest_date"], summary, candidate["tasks"], candidate["open_total"], candidate["tz"]),
+                "deliver_at": candidate["deliver_at"].replace(tzinfo=None),
+            })
+        # Каждая группа записывается сразу: сбой записи одной группы не теряет результат модели для остальных
+        async with write_lock:
+            return await _save_digests(digests)
+
+    digests = [digest for saved in await asyncio.gather(*(summarize(group) for group in groups)) for digest in saved]
+
+    fallbacks = sum(1 for digest in digests if not digest["ai_generated"])
+    elapsed = time.perf_counter() - started
+    DIGESTS.inc(len(digests) - fallbacks, 'generated')
+    DIGESTS.inc(fallbacks, 'fallback')
+    digest_stats["runs"] += 1
+    digest_stats["digests_total"] += len(digests)
+    digest_stats["llm_requests_total"] += len(groups)
+    digest_stats["fallbacks_total"] += fallbacks
+    digest_stats["seconds_last"] = elapsed
+    if digests:
+        logger.info("Подготовлено сводок: %s (запросов к модели: %s, без текста модели: %s) за %.1f с",
+                    len(digests), len(groups), fallbacks, elapsed)
+    return {"digests": len(digests), "llm_requests": len(groups), "fallbacks": fallbacks, "seconds": elapsed}
+
+@instrumented('deliver_due_digests')
+async def deliver_due_digests(now: datetime | None = None) -> dict:
+    """Отправляет подготовленные сводки, время доставки которых наступило."""
+    now = (now or datetime.now(pytz.utc)).replace(tzinfo=None)
+    due_ids = (select(Digest.id)
+               .where(Digest.delivered_at.is_(None), Digest.deliver_at <= now, Digest.deliver_at > now - DIGEST_DELIVERY_GRACE)
+               .order_by(Digest.deliver_at).limit(DIGEST_DELIVERY_BATCH))
+    session = get_async_session()
+    try:
+        # Сводка помечается доставленной до отправки: при сбое она потеряется, но не придет дважды
+        rows = (await session.execute(
+            update(Digest)
+            .where(Digest.id.in_(due_ids), Digest.delivered_at.is_(None))
+            .values(delivered_at=now)
+            .returning(Digest.user_id, Digest.text)
+        )).all()
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+    results = await asyncio.gather(*(dispatcher.send(user_id, text) for user_id, text in rows), return_exceptions=True)
+    failed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            failed += 1
+            logger.warning("Не удалось отправить ежедневную сводку: %s", result)
+    DIGESTS.inc(len(rows) - failed, 'delivered')
+    DIGESTS.inc(failed, 'failed')
+    return {"delivered": len(rows) - failed, "failed": failed}
+
+def _start_reminder_jobs() -> dict:
+    # Задания добавляются до scheduler.start(), чтобы планировщик не просыпался на каждое из них.
+    if leadership is None:
+        released = release_stale_claims()
+    else:
+        released = release_stale_claims(datetime.now(pytz.utc) - timedelta(seconds=LEADER_LEASE_SECONDS))
+    stats = rehydrate_reminders()
+    stats["released"] = released
+    scheduler.add_job(refill_reminders, 'interval', minutes=REMINDER_REFILL_MINUTES,
+                      id='refill_reminders', replace_existing=True)
+    scheduler.add_job(sweep_overdue_tasks, 'interval', minutes=OVERDUE_SWEEP_MINUTES,
+                      id='sweep_overdue_tasks', replace_existing=True)
+    if DIGEST_ENABLED:
+        # Первая генерация сразу: после перезапуска подготовит сводки, которые ушли бы в пропущенный проход
+        scheduler.add_job(generate_daily_digests, 'interval', minutes=DIGEST_GENERATE_MINUTES,
+                          next_run_time=datetime.now(pytz.utc), id='generate_daily_digests', replace_existing=True)
+        scheduler.add_job(deliver_due_digests, 'interval', seconds=DIGEST_DELIVERY_SECONDS,
+                          id='deliver_due_digests', replace_existing=True)
+    if leadership is not None:
+        scheduler.add_job(poll_due_reminders, 'interval', seconds=REMINDER_POLL_SECONDS,
+                          id='poll_due_reminders', replace_existing=True)
+    logger.info("Восстановлено напоминаний: %s (догоняющих: %s, возвращено захватов: %s)",
+                stats['scheduled'], stats['caught_up'], stats['released'])
+    return stats
+
+def _stop_reminder_jobs() -> None:
+    # Все задания планировщика — обязанности лидера; новый лидер загрузит их из БД заново
+    global _loaded_until
+    scheduler.remove_all_jobs()
+    _loaded_until = None
+
+def start_scheduler(bot_app) -> dict:
+    # Вызывается из post_init, т.е. уже на работающем event loop приложения.
+    global leadership
+    dispatcher.start(bot_app)
+    if MULTI_WORKER:
+        # Задания появятся, когда этот воркер выиграет аренду (on_elected)
+        leadership = LeaderLease('reminders', WORKER_ID, LEADER_LEASE_SECONDS,
+                                 on_elected=_start_reminder_jobs, on_demoted=_stop_reminder_jobs)
+        scheduler.start()
+        leadership.start()
+        return {"scheduled": 0, "caught_up": 0, "released": 0}
+    stats = _start_reminder_jobs()
+    scheduler.start()
+    return stats
+
+async def stop_scheduler() -> None:
+    if leadership is not None:
+        await leadership.stop()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await dispatcher.stop()
+
+# Задание планировщика: проверка статуса и отправка выполняются диспетчером пакетно
+async def enqueue_reminder(chat_id, task_id, task_text, due_date):
+    dispatcher.enqueue(chat_id, task_id, task_text, due_date)
+
+
+class AddTaskResult(NamedTuple):
+    message: str
+    task_id: int | None = None
+    task_text: str | None = None
+    due_date: datetime | None = None
+
+def _build_task(user_id: int, raw_task_text: str, parsed_data: dict, tz=pytz.utc) -> Task | None:
+    # Превращает результат парсинга (локального или AI) в несохраненный Task; None — задачу не поняли.
+    # Срок без явного пояса — местное время пользователя (tz), в задаче он хранится в UTC
+    task_text = parsed_data.get('task_text')
+    due_date_str = parsed_data.get('due_date')
+    priority = (parsed_data.get('priority') or 'medium').lower()
+    category = parsed_data.get('category', None) # <-- НОВОЕ: Получаем категорию
+
+    # Validate priority (остается как было)
+    if priority not in PRIORITY_ORDER:
+        priority = 'medium'
+
+    if not task_text:
+        return None
+
+    date_settings = {
+        'TIMEZONE': tz.zone,
+        'PREFER_DATES_FROM': 'future',
+        'RELATIVE_BASE': datetime.now(tz).replace(tzinfo=None),
+    }
+    due_date = None
+    if due_date_str:
+        try:
+            due_date = dateparser.parse(due_date_str, settings=date_settings)
             if due_date and due_date.tzinfo is None:
-                 due_date = default_timezone.localize(due_date)
+                due_date = tz.localize(due_date)
+        except Exception as e:
+            logger.warning("Ошибка парсинга due_date_str через dateparser: %s", e)
+            try:
+                due_date = datetime.strptime(due_date_str, '%Y-%m-%d %H:%M:%S')
+                due_date = tz.localize(due_date)
+            except ValueError:
+                pass
+
+    if not due_date and ("напомни" in raw_task_text.lower() or "завтра" in raw_task_text.lower() or "послезавтра" in raw_task_text.lower() or "в среду" in raw_task_text.lower()):
+        due_date = dateparser.parse(raw_task_text, settings=date_settings)
+        if due_date and due_date.tzinfo is None:
+             due_date = tz.localize(due_date)
+
+    if due_date:
+        due_date = due_date.astimezone(pytz.utc).replace(tzinfo=None)
+    # <-- НОВОЕ: Передаем category в конструктор Task
+    return Task(user_id=user_id, task_text=task_text, due_date=due_date, priority=priority, category=category)
+
+def _added_task_message(new_task: Task, tz) -> str:
+    response_message = f"Отлично! Я записал задачу: {wrap_entity(new_task.task_text, '*')}."
+    if new_task.due_date:
+        display_due_date = to_local(new_task.due_date, tz)
+        response_message += f"\nНапомню тебе {display_due_date.strftime('%Y-%m-%d в %H:%M')} ({display_due_date.tzname()})."
+    response_message += f"\nПриоритет: *{new_task.priority.capitalize()}*."
+    if new_task.category: # <-- НОВОЕ: Добавляем категорию в ответ
+        response_message += f"\nКатегория: {wrap_entity(new_task.category.capitalize(), '*')}."
+    return response_message
+
+@instrumented('add_task')
+async def add_task(user_id: int, raw_task_text: str, chat_id: int | None = None) -> AddTaskResult:
+    session = get_async_session()
+    try:
+        # Сроки разбираются в часовом поясе пользователя: «завтра в 10:00» — по его часам
+        tz = await get_user_timezone(user_id)
+        now = datetime.now(tz)
+        # Сначала пробуем разобрать задачу локально; модель нужна только для неоднозначного текста
+        parsed_data, confidence = parse_task_locally(raw_task_text, now)
+        if not is_confident(confidence):
+            parsed_data = await parse_task_with_ai(raw_task_text, user_id, now)
+
+        new_task = _build_task(user_id, raw_task_text, parsed_data, tz)
+        if new_task is None:
+            return AddTaskResult("Я не смог понять, что это за задача. Пожалуйста, попробуй сформулировать яснее.")
 
-        # <-- НОВОЕ: Передаем category в конструктор Task
-        new_task = Task(user_id=user_id, task_text=task_text, due_date=due_date, priority=priority, category=category)
         session.add(new_task)
-        session.commit()
+        await session.commit()
+        task_cache.upsert(user_id, new_task)
 
-        response_message = f"Отлично! Я записал задачу: *{new_task.task_text}*."
-        if new_task.due_date:
-            display_due_date = new_task.due_date.astimezone(pytz.timezone('Europe/Amsterdam'))
-            response_message += f"\nНапомню тебе {display_due_date.strftime('%Y-%m-%d в %H:%M')} ({display_due_date.tzinfo.tzname(display_due_date)})."
-        response_message += f"\nПриоритет: *{priority.capitalize()}*."
-        if new_task.category: # <-- НОВОЕ: Добавляем категорию в ответ
-            response_message += f"\nКатегория: *{new_task.category.capitalize()}*."
-        
-               # Schedule reminder immediately after task addition
+        # Напоминание ставим сразу после commit по id созданной задачи, без повторного запроса
         if new_task.due_date:
-            # You need to pass `context.application.bot` from main.py
-            # This is handled in main.py's add_task_command where `schedule_reminder` is called.
-            pass # No need to call here, main.py will handle it
+            schedule_reminder(chat_id or user_id, new_task.id, new_task.task_text, _as_utc(new_task.due_date))
 
-        return response_message
+        return AddTaskResult(_added_task_message(new_task, tz), new_task.id, new_task.task_text, new_task.due_date)
     except Exception as e:
-        session.rollback()
-        print(f"Ошибка при добавлении задачи: {e}")
-        return "Извини, что-то пошло не так при добавлении задачи."
+        await session.rollback()
+        logger.exception("Ошибка при добавлении задачи: %s", e)
+        return AddTaskResult("Извини, что-то пошло не так при добавлении задачи.")
     finally:
-        session.close()
+        await session.close()
+
+BULK_REPLY_MAX_LINES = 30
+
+class BulkAddResult(NamedTuple):
+    message: str
+    added: list[AddTaskResult]
+    skipped: list[str]
+
+@instrumented('add_tasks_bulk')
+async def add_tasks_bulk(user_id: int, raw_task_texts: list[str], chat_id: int | None = None) -> BulkAddResult:
+    """Добавляет список задач: один пакетный запрос к AI для неоднозначных строк,
+    одна транзакция на все вставки и пакетная постановка напоминаний."""
+    raw_task_texts = [text.strip() for text in raw_task_texts if text and text.strip()]
+    if not raw_task_texts:
+        return BulkAddResult("Я не нашел ни одной задачи в сообщении.", [], [])
+    truncated = len(raw_task_texts) > MAX_BATCH_TASKS
+    raw_task_texts = raw_task_texts[:MAX_BATCH_TASKS]
+
+    tz = await get_user_timezone(user_id)
+    now = datetime.now(tz)
+    parsed = [parse_task_locally(text, now) for text in raw_task_texts]
+    ambiguous = [i for i, (_, confidence) in enumerate(parsed) if not is_confident(confidence)]
+    parsed = [data for data, _ in parsed]
+    if ambiguous:
+        ai_parsed = await parse_tasks_with_ai([raw_task_texts[i] for i in ambiguous], user_id, now)
+        for i, data in zip(ambiguous, ai_parsed):
+            parsed[i] = data
+
+    new_tasks, skipped = [], []
+    for raw_text, data in zip(raw_task_texts, parsed):
+        task = _build_task(user_id, raw_text, data, tz)
+        if task is None:
+            skipped.append(raw_text)
+        else:
+            new_tasks.append(task)
+
+    session = get_async_session()
+    try:
+        session.add_all(new_tasks)
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Ошибка при пакетном добавлении задач: %s", e)
+        return BulkAddResult("Извини, что-то пошло не так при добавлении задач.", [], raw_task_texts)
+    finally:
+        await session.close()
+
+    added = []
+    for task in new_tasks:
+        task_cache.upsert(user_id, task)
+        if task.due_date:
+            _add_reminder_job(chat_id or user_id, task.id, task.task_text, _as_utc(task.due_date))
+        added.append(AddTaskResult(_added_task_message(task, tz), task.id, task.task_text, task.due_date))
+
+    lines = [f"Отлично! Я записал задач: *{len(added)}*."]
+    # Полный список может не влезть в лимит сообщения Telegram (4096 символов)
+    for task in new_tasks[:BULK_REPLY_MAX_LINES]:
+        due_str = ""
+        if task.due_date:
+            due_str = f" (до {format_due(task.due_date, tz)})"
+        lines.append(f"*{task.id}.* {escape(task.task_text)}{due_str}")
+    if len(new_tasks) > BULK_REPLY_MAX_LINES:
+        lines.append(f"...и еще {len(new_tasks) - BULK_REPLY_MAX_LINES}. Полный список — в /list.")
+    if skipped:
+        lines.append(f"Не удалось понять строк: {len(skipped)}.")
+    if truncated:
+        lines.append(f"Взял только первые {MAX_BATCH_TASKS} задач.")
+    return BulkAddResult("\n".join(lines), added, skipped)
+
+async def _cached_open_tasks(user_id: int) -> list | None:
+    """Отсортированные незакрытые задачи пользователя из кеша; при промахе загружаются одним запросом.
+
+    None — кеш выключен или задач больше, чем помещается в кеш (тогда читаем из БД постранично).
+    """
+    if not task_cache.enabled:
+        return None
+    rows = task_cache.get(user_id)
+    if rows is not None:
+        return rows
+    # Изменение задач, закоммиченное во время запроса, делает снимок устаревшим: put его не положит
+    generation = task_cache.begin_load(user_id)
+    try:
+        session = get_async_session()
+        try:
+            query = select(Task).filter(Task.user_id == user_id, Task.status.in_(OPEN_STATUSES)).limit(TASK_CACHE_MAX_ROWS + 1)
+            tasks = (await session.scalars(query)).all()
+        finally:
+            await session.close()
+        if not task_cache.put(user_id, tasks, generation):
+            return None
+    finally:
+        task_cache.end_load(user_id)
+    # Промах уже учтен первым get: один запрос — одно обращение к кешу
+    return task_cache.get(user_id, count=False)
+
+def _status_filter(query, status: str):
+    if status == 'open':
+        return query.filter(Task.status.in_(OPEN_STATUSES))
+    if status != 'all':
+        return query.filter_by(status=status)
+    return query
 
 # --- ОБНОВЛЕННАЯ ФУНКЦИЯ get_user_tasks для фильтрации по категории ---
-def get_user_tasks(user_id: int, status: str = 'pending', category: str = None) -> list[Task]:
-    session = get_session()
+@instrumented('get_user_tasks')
+async def get_user_tasks(user_id: int, status: str = 'open', category: str = None) -> list:
+    # status: 'open' — незакрытые (pending и overdue), 'all' — все, иначе конкретный статус
+    if status == 'open':
+        try:
+            rows = await _cached_open_tasks(user_id)
+        except Exception as e:
+            logger.exception("Ошибка при загрузке задач в кеш: %s", e)
+            rows = None
+        if rows is not None:
+            return [row for row in rows if row.category == category.lower()] if category else list(rows)
+
+    session = get_async_session()
     try:
-        query = session.query(Task).filter_by(user_id=user_id)
-        if status != 'all':
-            query = query.filter_by(status=status)
+        query = _status_filter(select(Task).filter_by(user_id=user_id), status)
         
         if category: # <-- НОВОЕ: фильтрация по категории
             query = query.filter_by(category=category.lower()) # Сохраняем в нижнем регистре
 
-        tasks = query.all()
-        # Sort in Python after fetching
-        tasks.sort(key=lambda task: (PRIORITY_ORDER.get(task.priority, 0), task.due_date if task.due_date else datetime.max.replace(tzinfo=pytz.utc)), reverse=True)
-        # We sort high, medium, low, so 'high' (3) should be at the top, hence reverse=True
-        # For due_date, we want earliest first, so keep it as is if `reverse=False` on due_date part.
-        # But since we're using lambda for primary sort, a bit tricky.
-        # Corrected sort logic: sort by priority (desc), then by due_date (asc)
-        tasks.sort(key=lambda task: (PRIORITY_ORDER.get(task.priority, 0), task.due_date if task.due_date else datetime.max.replace(tzinfo=pytz.utc)))
-        tasks.reverse() # Reverse the whole list to get high priority first
+        # Сортировка на стороне БД: приоритет (high -> low), затем ближайший срок, задачи без срока в конце
+        tasks = (await session.scalars(query.order_by(*TASK_LIST_ORDER))).all()
 
         return tasks
     except Exception as e:
-        print(f"Ошибка при получении задач: {e}")
+        logger.exception("Ошибка при получении задач: %s", e)
         return []
     finally:
-        session.close()
+        await session.close()
 
-def mark_task_as_done(user_id: int, task_id: int) -> str:
-    session = get_session()
+def _list_cursor(task: Task) -> tuple:
+    # Позиция задачи в порядке TASK_LIST_ORDER: (ранг приоритета, срок или None, id)
+    return (PRIORITY_ORDER.get(task.priority, 0), task.due_date, task.id)
+
+def encode_list_cursor(cursor: tuple) -> str:
+    rank, due_date, task_id = cursor
+    due_str = due_date.strftime('%Y%m%d%H%M%S%f') if due_date else '-'
+    return f"{rank}:{due_str}:{task_id}"
+
+def decode_list_cursor(value: str) -> tuple | None:
+    try:
+        rank, due_str, task_id = value.split(':')
+        due_date = None if due_str == '-' else datetime.strptime(due_str, '%Y%m%d%H%M%S%f')
+        return (int(rank), due_date, int(task_id))
+    except ValueError:
+        return None
+
+def _keyset_after(cursor: tuple):
+    # Строки строго после cursor в порядке TASK_LIST_ORDER
+    rank, due_date, task_id = cursor
+    if due_date is None:
+        # Внутри ранга задачи без срока идут последними, упорядочены по id
+        within_rank = and_(Task.due_date.is_(None), Task.id > task_id)
+    else:
+        within_rank = or_(
+            Task.due_date.is_(None),
+            Task.due_date > due_date,
+            and_(Task.due_date == due_date, Task.id > task_id),
+        )
+    return or_(PRIORITY_RANK < rank, and_(PRIORITY_RANK == rank, within_rank))
+
+def _keyset_before(cursor: tuple):
+    # Строки строго до cursor в порядке TASK_LIST_ORDER
+    rank, due_date, task_id = cursor
+    if due_date is None:
+        within_rank = or_(Task.due_date.isnot(None), and_(Task.due_date.is_(None), Task.id < task_id))
+    else:
+        within_rank = or_(
+            Task.due_date < due_date,
+            and_(Task.due_date == due_date, Task.id < task_id),
+        )
+    return or_(PRIORITY_RANK > rank, and_(PRIORITY_RANK == rank, within_rank))
+
+@instrumented('get_user_tasks_page')
+async def get_user_tasks_page(user_id: int, category: str = None, after: tuple | None = None,
+                        before: tuple | None = None, page_size: int = LIST_PAGE_SIZE,
+                        status: str = 'open') -> tuple[list[Task], tuple | None, tuple | None]:
+    """Одна страница задач по keyset-курсору (приоритет, срок, id).
+
+    Возвращает (задачи, курсор следующей страницы, курсор предыдущей страницы);
+    курсор равен None, если в этом направлении страниц больше нет.
+    """
+    if status == 'open':
+        try:
+            rows = await _cached_open_tasks(user_id)
+        except Exception as e:
+            logger.exception("Ошибка при загрузке задач в кеш: %s", e)
+            rows = None
+        if rows is not None:
+            return page_rows(rows, category, after, before, page_size)
+
+    session = get_async_session()
+    try:
+        query = _status_filter(select(Task).filter_by(user_id=user_id), status)
+        if category:
+            query = query.filter_by(category=category.lower())
+
+        if before is not None:
+            # Назад: берем страницу в обратном порядке и разворачиваем
+            reverse_order = (PRIORITY_RANK.asc(), Task.due_date.isnot(None), Task.due_date.desc(), Task.id.desc())
+            rows = (await session.scalars(query.filter(_keyset_before(before)).order_by(*reverse_order).limit(page_size + 1))).all()
+            has_prev = len(rows) > page_size
+            tasks = rows[:page_size][::-1]
+            has_next = True
+        else:
+            if after is not None:
+                query = query.filter(_keyset_after(after))
+            rows = (await session.scalars(query.order_by(*TASK_LIST_ORDER).limit(page_size + 1))).all()
+            has_next = len(rows) > page_size
+            tasks = rows[:page_size]
+            has_prev = after is not None
+
+        if not tasks:
+            return [], None, None
+        next_cursor = _list_cursor(tasks[-1]) if has_next else None
+        prev_cursor = _list_cursor(tasks[0]) if has_prev else None
+        return tasks, next_cursor, prev_cursor
+    except Exception as e:
+        logger.exception("Ошибка при получении страницы задач: %s", e)
+        return [], None, None
+    finally:
+        await session.close()
+
+# Поисковый индекс создает db.ensure_search_index; в моделях его нет
+tasks_fts = table('tasks_fts', column('rowid'))
+task_notes_fts = table('task_notes_fts', column('task_id'))
+tasks_search_vector = literal_column('tasks.search_vector')
+notes_search_vector = literal_column('task_notes.search_vector')
+# Совпадение в тексте задачи весит больше, чем в заметке
+SEARCH_TEXT_WEIGHT = 10.0
+SEARCH_NOTE_WEIGHT = 1.0
+
+def _ranked_hits(text_hits, note_hits):
+    # Задача найдена, если все слова есть в ее тексте или в одной из заметок; ранг — лучшее совпадение
+    hits = union_all(text_hits, note_hits).subquery()
+    return select(hits.c.task_id, func.max(hits.c.rank).label('rank')).group_by(hits.c.task_id).subquery()
+
+@instrumented('search_tasks')
+async def search_tasks(user_id: int, query: str, offset: int = 0,
+                       page_size: int = LIST_PAGE_SIZE) -> tuple[list[Task], bool]:
+    """Задачи пользователя (включая выполненные), найденные по тексту и заметкам, от более релевантных.
+
+    Возвращает (задачи страницы, есть ли следующая страница). Страницы по смещению: порядок задает
+    ранг совпадения, а не колонки задачи, поэтому keyset-курсор как в /list здесь не подходит.
+    """
+    words = query_words(query)
+    if not words:
+        return [], False
+    if SEARCH_BACKEND == 'fts5':
+        # bm25: меньше — лучше, поэтому ранг со знаком минус; колонки owner и task_id не учитываются
+        match = fts5_match(user_id, words)
+        ranked = _ranked_hits(
+            select(tasks_fts.c.rowid.label('task_id'), (-func.bm25(literal_column('tasks_fts'), 0.0, SEARCH_TEXT_WEIGHT)).label('rank'))
+            .where(literal_column('tasks_fts').op('MATCH')(match)),
+            select(task_notes_fts.c.task_id, (-func.bm25(literal_column('task_notes_fts'), 0.0, SEARCH_NOTE_WEIGHT, 0.0)).label('rank'))
+            .where(literal_column('task_notes_fts').op('MATCH')(match)),
+        )
+        statement = (select(Task).join(ranked, ranked.c.task_id == Task.id)
+                     .where(Task.user_id == user_id).order_by(ranked.c.rank.desc(), Task.id))
+    elif SEARCH_BACKEND == 'tsvector':
+        tsquery = func.to_tsquery('russian', pg_tsquery(words))
+        ranked = _ranked_hits(
+            select(Task.id.label('task_id'), (func.ts_rank_cd(tasks_search_vector, tsquery) * SEARCH_TEXT_WEIGHT).label('rank'))
+            .where(Task.user_id == user_id, tasks_search_vector.op('@@')(tsquery)),
+            select(TaskNote.task_id, (func.ts_rank_cd(notes_search_vector, tsquery) * SEARCH_NOTE_WEIGHT).label('rank'))
+            .join(Task, Task.id == TaskNote.task_id)
+            .where(Task.user_id == user_id, notes_search_vector.op('@@')(tsquery)),
+        )
+        statement = (select(Task).join(ranked, ranked.c.task_id == Task.id)
+                     .order_by(ranked.c.rank.desc(), Task.id))
+    else:
+        # Без полнотекстового индекса: подстроки без учета регистра, порядок как в /list
+        statement = (select(Task).where(Task.user_id == user_id, *(
+            or_(Task.task_text.icontains(word, autoescape=True),
+                select(TaskNote.id).where(TaskNote.task_id == Task.id, TaskNote.text.icontains(word, autoescape=True)).exists())
+            for word in words
+        )).order_by(*TASK_LIST_ORDER))
+
+    session = get_async_session()
+    try:
+        rows = (await session.scalars(statement.offset(offset).limit(page_size + 1))).all()
+        return rows[:page_size], len(rows) > page_size
+    except Exception as e:
+        logger.exception("Ошибка при поиске задач: %s", e)
+        return [], False
+    finally:
+        await session.close()
+
+@instrumented('save_query')
+async def save_query(user_id: int, text: str) -> int | None:
+    """Номер сохраненного текста для кнопок листания; тот же текст пользователя сохраняется один раз.
+
+    None — сохранить не удалось (тогда сообщение отправляется без кнопок).
+    """
+    session = get_async_session()
+    try:
+        query_id = await session.scalar(select(SavedQuery.id).filter_by(user_id=user_id, text=text)
+                                        .order_by(SavedQuery.id.desc()).limit(1))
+        if query_id is None:
+            saved = SavedQuery(user_id=user_id, text=text)
+            session.add(saved)
+            await session.flush()
+            query_id = saved.id
+            # Храним только последние SAVED_QUERIES_PER_USER текстов пользователя
+            oldest_kept = (select(SavedQuery.id).filter_by(user_id=user_id).order_by(SavedQuery.id.desc())
+                           .offset(SAVED_QUERIES_PER_USER - 1).limit(1).scalar_subquery())
+            await session.execute(delete(SavedQuery).where(SavedQuery.user_id == user_id, SavedQuery.id < oldest_kept))
+            await session.commit()
+        return query_id
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Ошибка при сохранении запроса: %s", e)
+        return None
+    finally:
+        await session.close()
+
+async def get_saved_query(user_id: int, query_id: int) -> str | None:
+    # Чужой или удаленный номер — None: кнопка устарела
+    session = get_async_session()
     try:
-        task = session.query(Task).filter_by(user_id=user_id, id=task_id).first()
+        return await session.scalar(select(SavedQuery.text).filter_by(id=query_id, user_id=user_id))
+    except Exception as e:
+        logger.exception("Ошибка при чтении сохраненного запроса: %s", e)
+        return None
+    finally:
+        await session.close()
+
+@instrumented('mark_task_as_done')
+async def mark_task_as_done(user_id: int, task_id: int) -> str:
+    session = get_async_session()
+    try:
+        task = await session.scalar(select(Task).filter_by(user_id=user_id, id=task_id))
         if task:
             task.status = 'completed'
-            task.updated_at = datetime.now(pytz.utc) # Use timezone-aware datetime
-            session.commit()
+            task.updated_at = _utcnow()
+            await session.commit()
+            task_cache.remove(user_id, task_id)
             return f"Поздравляю! Задача '{task.task_text}' отмечена как выполненная! 🎉 Ты просто молодец!"
         else:
             return "Задачи с таким номером не найдено или она не принадлежит тебе."
     except Exception as e:
-        session.rollback()
-        print(f"Ошибка при отметке задачи как выполненной: {e}")
+        await session.rollback()
+        logger.exception("Ошибка при отметке задачи как выполненной: %s", e)
         return "Произошла ошибка при попытке отметить задачу."
     finally:
-        session.close()
+        await session.close()
 
-def update_task_text(user_id: int, task_id: int, new_text: str) -> str:
-    session = get_session()
+@instrumented('update_task_text')
+async def update_task_text(user_id: int, task_id: int, new_text: str) -> str:
+    session = get_async_session()
     try:
-        task = session.query(Task).filter_by(user_id=user_id, id=task_id).first()
+        task = await session.scalar(select(Task).filter_by(user_id=user_id, id=task_id))
         if task:
             task.task_text = new_text
-            task.updated_at = datetime.now(pytz.utc) # Use timezone-aware datetime
-            session.commit()
-            return f"Текст задачи '{task_id}' обновлен на: *{new_text}*."
+            task.updated_at = _utcnow()
+            await session.commit()
+            task_cache.upsert(user_id, task)
+            return f"Текст задачи '{task_id}' обновлен на: {wrap_entity(new_text, '*')}."
         else:
             return "Задачи с таким номером не найдено или она не принадлежит тебе."
     except Exception as e:
-        session.rollback()
-        print(f"Ошибка при обновлении текста задачи: {e}")
+        await session.rollback()
+        logger.exception("Ошибка при обновлении текста задачи: %s", e)
         return "Произошла ошибка при попытке обновить текст задачи."
     finally:
-        session.close()
+        await session.close()
 
-def add_task_note(user_id: int, task_id: int, note: str) -> str:
-    session = get_session()
+@instrumented('add_task_note')
+async def add_task_note(user_id: int, task_id: int, note: str) -> str:
+    # Заметка — новая строка task_notes и счетчик у задачи: прежние заметки не читаются и не перезаписываются
+    session = get_async_session()
     try:
-        task = session.query(Task).filter_by(user_id=user_id, id=task_id).first()
-        if task:
-            if task.notes:
-                task.notes += f"\n--- Дополнение ({datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M')}): {note}" # Use timezone-aware datetime
-            else:
-                task.notes = f"Дополнение ({datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M')}): {note}" # Use timezone-aware datetime
-            task.updated_at = datetime.now(pytz.utc) # Use timezone-aware datetime
-            session.commit()
-            return f"К задаче '{task.id}' добавлена заметка. Теперь она выглядит так: _{task.notes}_"
-        else:
+        task = await session.scalar(
+            update(Task).where(Task.id == task_id, Task.user_id == user_id)
+            .values(notes_count=Task.notes_count + 1, updated_at=_utcnow())
+            .returning(Task)
+        )
+        if task is None:
             return "Задачи с таким номером не найдено или она не принадлежит тебе."
+        session.add(TaskNote(task_id=task_id, text=note))
+        await session.commit()
+        task_cache.upsert(user_id, task)
+        return f"К задаче '{task.id}' добавлена заметка (всего заметок: {task.notes_count}). Посмотреть: /notes {task.id}"
     except Exception as e:
-        session.rollback()
-        print(f"Ошибка при добавлении заметки к задаче: {e}")
+        await session.rollback()
+        logger.exception("Ошибка при добавлении заметки к задаче: %s", e)
         return "Произошла ошибка при попытке добавить заметку."
     finally:
-        session.close()
+        await session.close()
+
+@instrumented('get_task_notes')
+async def get_task_notes(user_id: int, task_id: int, limit: int = NOTES_VIEW_LIMIT) -> str:
+    """Последние limit заметок задачи, новые внизу; число заметок берется из счетчика задачи."""
+    session = get_async_session()
+    try:
+        task = await session.scalar(select(Task).filter_by(user_id=user_id, id=task_id))
+        if task is None:
+            return "Задачи с таким номером не найдено или она не принадлежит тебе."
+        notes = (await session.scalars(
+            select(TaskNote).where(TaskNote.task_id == task_id).order_by(TaskNote.id.desc()).limit(limit)
+        )).all()
+    except Exception as e:
+        logger.exception("Ошибка при чтении заметок задачи: %s", e)
+        return "Произошла ошибка при попытке получить заметки."
+    finally:
+        await session.close()
+
+    if not notes:
+        return f"У задачи *{task.id}* пока нет заметок. Добавить: `/note {task.id} <текст>`."
+    tz = await get_user_timezone(user_id)
+    lines = [f"Заметки к задаче *{task.id}.* {escape(task.task_text)}:"]
+    if task.notes_count > len(notes):
+        lines.append(f"...еще {task.notes_count - len(notes)} более ранних.")
+    for note in reversed(notes):
+        lines.append(f"{format_due(note.created_at, tz)} — {escape(note.text)}")
+    return "\n".join(lines)
 
 # NEW FUNCTION: Set Task Priority
-def set_task_priority(user_id: int, task_id: int, new_priority: str) -> str:
-    session = get_session()
+@instrumented('set_task_priority')
+async def set_task_priority(user_id: int, task_id: int, new_priority: str) -> str:
+    session = get_async_session()
     try:
-        task = session.query(Task).filter_by(user_id=user_id, id=task_id).first()
+        task = await session.scalar(select(Task).filter_by(user_id=user_id, id=task_id))
         if task:
             new_priority_lower = new_priority.lower()
             if new_priority_lower in PRIORITY_ORDER:
                 task.priority = new_priority_lower
-                task.updated_at = datetime.now(pytz.utc) # Use timezone-aware datetime
-                session.commit()
+                task.updated_at = _utcnow()
+                await session.commit()
+                task_cache.upsert(user_id, task)
                 return f"Приоритет задачи '{task.id}' изменен на *{new_priority.capitalize()}*."
             else:
-                return f"Неизвестный приоритет '{new_priority}'. Используйте 'high', 'medium' или 'low'."
+                return f"Неизвестный приоритет '{escape(new_priority)}'. Используйте 'high', 'medium' или 'low'."
         else:
             return "Задачи с таким номером не найдено или она не принадлежит тебе."
     except Exception as e:
-        session.rollback()
-        print(f"Ошибка при изменении приоритета задачи: {e}")
+        await session.rollback()
+        logger.exception("Ошибка при изменении приоритета задачи: %s", e)
         return "Произошла ошибка при попытке изменить приоритет задачи."
     finally:
-        session.close()
\ No newline at end of file
+        await session.close()
+# --- Настройки пользователя ---
+
+# Часовые пояса пользователей читаются при каждом /list, а меняются редко
+_user_timezones: dict[int, str | None] = {}
+USER_TIMEZONE_CACHE_SIZE = 10_000
+
+@instrumented('get_user_timezone')
+async def get_user_timezone(user_id: int):
+    """tzinfo для отображения сроков пользователю (его /timezone или DEFAULT_TIMEZONE)."""
+    # При нескольких воркерах /timezone мог обработать другой процесс, поэтому читаем из БД каждый раз
+    if MULTI_WORKER or user_id not in _user_timezones:
+        session = get_async_session()
+        try:
+            name = await session.scalar(select(User.timezone).filter_by(user_id=user_id))
+        except Exception as e:
+            logger.exception("Ошибка при чтении часового пояса пользователя: %s", e)
+            return get_timezone(None)
+        finally:
+            await session.close()
+        if len(_user_timezones) >= USER_TIMEZONE_CACHE_SIZE:
+            _user_timezones.clear()
+        _user_timezones[user_id] = name
+    return get_timezone(_user_timezones[user_id])
+
+@instrumented('set_user_timezone')
+async def set_user_timezone(user_id: int, timezone_name: str) -> str:
+    if not is_valid_timezone(timezone_name):
+        return f"Не знаю часовой пояс '{escape(timezone_name)}'. Укажи его в формате `Europe/Moscow` или `Asia/Almaty`."
+    session = get_async_session()
+    try:
+        user = await session.get(User, user_id)
+        if user is None:
+            session.add(User(user_id=user_id, timezone=timezone_name))
+        else:
+            user.timezone = timezone_name
+        await session.commit()
+        _user_timezones[user_id] = timezone_name
+        now_local = datetime.now(get_timezone(timezone_name)).strftime('%H:%M')
+        return f"Готово! Теперь сроки показываются в часовом поясе *{timezone_name}* (сейчас там {now_local})."
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Ошибка при сохранении часового пояса: %s", e)
+        return "Произошла ошибка при попытке сохранить часовой пояс."
+    finally:
+        await session.close()
+
+@instrumented('get_user_digest')
+async def get_user_digest(user_id: int) -> str:
+    """Сегодняшняя сводка, если она уже доставлена, и текущие настройки /digest."""
+    session = get_async_session()
+    try:
+        user = await session.get(User, user_id)
+        digest = await session.scalar(
+            select(Digest).where(Digest.user_id == user_id, Digest.delivered_at.isnot(None))
+            .order_by(Digest.deliver_at.desc()).limit(1)
+        )
+    except Exception as e:
+        logger.exception("Ошибка при чтении сводки: %s", e)
+        return "Произошла ошибка при попытке получить сводку."
+    finally:
+        await session.close()
+
+    tz = get_timezone(user.timezone if user else None)
+    if user is not None and not user.digest_enabled:
+        return "Ежедневная сводка выключена. Включить: `/digest 9` (час по твоему времени)."
+    hour = DIGEST_DEFAULT_HOUR if user is None or user.digest_hour is None else user.digest_hour
+    settings = f"Сводка приходит каждый день в *{hour:02d}:00* ({tz.zone}). Изменить: `/digest 8`, выключить: `/digest off`."
+    if digest is not None and digest.digest_date == datetime.now(tz).date():
+        return f"{digest.text}\n\n{settings}"
+    return settings
+
+@instrumented('set_user_digest')
+async def set_user_digest(user_id: int, hour: int | None) -> str:
+    """Час ежедневной сводки по местному времени; None — выключить сводку."""
+    if hour is not None and not 0 <= hour <= 23:
+        return "Час сводки — число от 0 до 23, например `/digest 9`."
+    session = get_async_session()
+    try:
+        user = await session.get(User, user_id)
+        if user is None:
+            user = User(user_id=user_id)
+            session.add(user)
+        user.digest_enabled = hour is not None
+        if hour is not None:
+            user.digest_hour = hour
+        # Подготовленные, но не доставленные сводки рассчитаны на прежний час; следующая генерация создаст новые
+        await session.execute(delete(Digest).where(Digest.user_id == user_id, Digest.delivered_at.is_(None)))
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Ошибка при сохранении настроек сводки: %s", e)
+        return "Произошла ошибка при попытке сохранить настройки сводки."
+    finally:
+        await session.close()
+    if hour is None:
+        return "Ежедневная сводка выключена. Включить снова: `/digest 9`."
+    return f"Готово! Сводка будет приходить каждый день в *{hour:02d}:00* по твоему времени (/timezone)."
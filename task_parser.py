@@ -0,0 +1,130 @@
+# task_parser.py
+# -*- coding: utf-8 -*-
+# Локальный (без сети) разбор типовых задач. Если текст однозначен, LLM не вызывается.
+
+import re
+from datetime import datetime
+import dateparser
+import pytz
+
+from config import FAST_PARSER_MIN_CONFIDENCE
+
+# Слова приоритета -> нормализованное значение
+PRIORITY_MARKERS = {
+    'high': 'high', 'medium': 'medium', 'low': 'low',
+    'срочно': 'high', 'важно': 'high', 'неважно': 'low',
+}
+# Прилагательные — обычные слова задачи («Купить низкий стол», «Обычная уборка»). Приоритетом считаются
+# рядом со словом «приоритет», с «!» или последним словом задачи; в остальных местах остаются в тексте
+PRIORITY_ADJECTIVES = {
+    'высокий': 'high', 'высокая': 'high', 'срочная': 'high', 'важная': 'high',
+    'средний': 'medium', 'средняя': 'medium', 'обычный': 'medium', 'обычная': 'medium',
+    'низкий': 'low', 'низкая': 'low', 'неважная': 'low',
+}
+PRIORITY_WORDS = {**PRIORITY_MARKERS, **PRIORITY_ADJECTIVES}
+
+def _alternation(words) -> str:
+    return '|'.join(sorted(words, key=len, reverse=True))
+
+CATEGORY_RE = re.compile(r'(?<!\w)#(\w[\w-]*)', re.UNICODE)
+# «приоритет высокий», «высокий приоритет», «!low», «срочно»
+PRIORITY_RE = re.compile(
+    r'(?<![\w!])(?:приоритет\s+(' + _alternation(PRIORITY_WORDS) + r')|(' + _alternation(PRIORITY_WORDS) + r')\s+приоритет|'
+    r'!(' + _alternation(PRIORITY_WORDS) + r')|(' + _alternation(PRIORITY_MARKERS) + r'))(?!\w)',
+    re.IGNORECASE | re.UNICODE
+)
+PRIORITY_ADJECTIVE_RE = re.compile(r'(?<!\w)(' + _alternation(PRIORITY_ADJECTIVES) + r')(?!\w)', re.IGNORECASE | re.UNICODE)
+
+WEEKDAYS = r'(?:понедельник|вторник|среду|четверг|пятницу|субботу|воскресенье)'
+TIME = r'(?:в\s+)?\d{1,2}:\d{2}'
+DAY = (
+    r'(?:сегодня|завтра|послезавтра|в\s+' + WEEKDAYS + r'|'
+    r'\d{4}-\d{2}-\d{2}|\d{1,2}\.\d{1,2}(?:\.\d{2,4})?|'
+    r'через\s+\d+\s+(?:минут[уы]?|час(?:а|ов)?|дн(?:я|ей)|день))'
+)
+# Одна непрерывная дата/время: "завтра в 18:00", "25.12 в 9:30", "в 18:00", "через 2 часа"
+DATE_RE = re.compile(r'(?<!\w)(?:' + DAY + r'(?:\s+' + TIME + r')?|' + TIME + r')(?!\w)', re.IGNORECASE | re.UNICODE)
+
+# Признаки того, что в тексте осталась дата/время, которую правила не разобрали
+AMBIGUOUS_RE = re.compile(
+    r'(?<!\w)(?:утр\w*|вечер\w*|ночь\w*|днём|днем|обед\w*|недел\w*|месяц\w*|выходны\w*|'
+    r'январ\w*|феврал\w*|март\w*|апрел\w*|ма[яй]|июн\w*|июл\w*|август\w*|сентябр\w*|октябр\w*|ноябр\w*|декабр\w*|'
+    r'через|после|до|к|напомни\w*)(?!\w)|\d',
+    re.IGNORECASE | re.UNICODE
+)
+
+def _parse_date(fragment: str, now: datetime) -> datetime | None:
+    # Дата без явного пояса понимается в поясе now (часовой пояс пользователя)
+    return dateparser.parse(
+        fragment,
+        languages=['ru', 'en'],
+        settings={
+            'TIMEZONE': getattr(now.tzinfo, 'zone', None) or 'UTC',
+            'RETURN_AS_TIMEZONE_AWARE': True,
+            'PREFER_DATES_FROM': 'future',
+            'RELATIVE_BASE': now.replace(tzinfo=None),
+        }
+    )
+
+def parse_task_locally(task_text: str, now: datetime | None = None) -> tuple[dict, float]:
+    """Разбирает задачу по правилам. Возвращает (данные в формате parse_task_with_ai, уверенность 0..1).
+
+    now — текущее время в часовом поясе пользователя; due_date возвращается в том же поясе, как и у модели.
+    """
+    now = now or datetime.now(pytz.utc)
+    text = task_text.strip()
+    confidence = 1.0
+
+    category = None
+    categories = CATEGORY_RE.findall(text)
+    if categories:
+        category = categories[0].lower()
+        if len(categories) > 1:
+            confidence -= 0.3
+        text = CATEGORY_RE.sub(' ', text)
+
+    priority = 'medium'
+    priorities = [next(word for word in match if word) for match in PRIORITY_RE.findall(text)]
+    text = PRIORITY_RE.sub(' ', text)
+    adjectives = list(PRIORITY_ADJECTIVE_RE.finditer(text))
+    if adjectives and not text[adjectives[-1].end():].strip():
+        # Прилагательное последним словом — метка, как «#дом»: «Полить цветы низкий»
+        priorities.append(adjectives[-1].group(1))
+        text = text[:adjectives.pop().start()]
+    if adjectives:
+        # «Купить низкий стол»: слово остается в тексте, а приоритет (если он имелся в виду) определит модель
+        confidence -= 0.6
+    if priorities:
+        priority = PRIORITY_WORDS[priorities[-1].lower()]
+        if len({PRIORITY_WORDS[p.lower()] for p in priorities}) > 1:
+            confidence -= 0.5
+
+    due_date = None
+    dates = list(DATE_RE.finditer(text))
+    if dates:
+        if len(dates) > 1:
+            confidence -= 0.5
+        fragment = dates[0].group(0)
+        due_date = _parse_date(fragment, now)
+        if due_date is None:
+            confidence -= 0.6
+        text = text[:dates[0].start()] + ' ' + text[dates[0].end():]
+
+    text = re.sub(r'\s+', ' ', text).strip(' ,.;:-')
+    if not text:
+        return {"task_text": None, "due_date": None, "priority": priority, "category": category}, 0.0
+
+    # Оставшиеся числа и временные слова — повод отдать текст модели
+    if AMBIGUOUS_RE.search(text):
+        confidence -= 0.6
+
+    parsed = {
+        "task_text": text[0].upper() + text[1:],
+        "due_date": due_date.astimezone(now.tzinfo).strftime('%Y-%m-%d %H:%M:%S') if due_date else None,
+        "priority": priority,
+        "category": category,
+    }
+    return parsed, max(confidence, 0.0)
+
+def is_confident(confidence: float) -> bool:
+    return confidence >= FAST_PARSER_MIN_CONFIDENCE
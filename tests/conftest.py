@@ -0,0 +1,30 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+# Модули бота читают конфигурацию и создают engine при импорте, поэтому окружение задается до импорта:
+# отдельная SQLite на прогон и недоступный адрес модели (тесты не ходят в сеть).
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}"
+os.environ['OPENROUTER_BASE_URL'] = 'http://127.0.0.1:9/'
+os.environ['METRICS_PORT'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def run():
+    """Выполняет корутину в новом event loop. Пул async engine привязан к циклу, поэтому закрывается в конце."""
+    import db
+
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await db.async_engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,112 @@
+# tests/test_digests.py
+# -*- coding: utf-8 -*-
+# Ежедневные сводки: отбираются только пользователи, у которых час доставки наступит в ближайшие
+# DIGEST_LEAD_MINUTES; в запросе к модели не больше DIGEST_USERS_PER_REQUEST пользователей, одновременно
+# не больше DIGEST_MAX_CONCURRENCY запросов; сводка, уже записанная другим проходом, не мешает остальным.
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+import pytz
+from sqlalchemy import select
+
+from db import Digest, Task, User, engine
+import task_manager
+
+# 06:30 UTC — 08:30 в Амстердаме (пояс по умолчанию, сводка в 9:00) и 07:30 в Лондоне
+NOW = pytz.utc.localize(datetime(2030, 6, 1, 6, 30))
+DEFAULT_USERS = list(range(2200, 2218))
+SETTINGS = {
+    2230: {"timezone": 'Asia/Tokyo', "digest_hour": 9},         # 15:30 — сводка завтра
+    2231: {"timezone": None, "digest_hour": None, "digest_enabled": False},
+    2232: {"timezone": 'Europe/Amsterdam', "digest_hour": 8},   # 8:00 уже прошло
+    2233: {"timezone": 'Europe/London', "digest_hour": 8},      # через 30 минут
+}
+USERS = DEFAULT_USERS + list(SETTINGS)
+DUE_USERS = DEFAULT_USERS + [2233]
+
+@pytest.fixture(autouse=True)
+def users(monkeypatch):
+    monkeypatch.setattr(task_manager, 'DIGEST_USERS_PER_REQUEST', 4)
+    monkeypatch.setattr(task_manager, 'DIGEST_MAX_CONCURRENCY', 2)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"user_id": user_id, "digest_enabled": True, **settings}
+                                               for user_id, settings in SETTINGS.items()])
+        conn.execute(Task.__table__.insert(), [
+            {"user_id": user_id, "task_text": f"Задача пользователя {user_id}", "priority": "medium", "status": status}
+            for user_id in USERS for status in ('pending', 'overdue', 'completed')
+        ])
+    yield
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id.in_(USERS)))
+        conn.execute(User.__table__.delete().where(User.user_id.in_(USERS)))
+        conn.execute(Digest.__table__.delete().where(Digest.user_id.in_(USERS)))
+
+def _saved_digests() -> dict[int, tuple]:
+    with engine.connect() as conn:
+        rows = conn.execute(select(Digest.user_id, Digest.digest_date, Digest.deliver_at, Digest.ai_generated, Digest.text)
+                            .where(Digest.user_id.in_(USERS))).all()
+    return {row.user_id: tuple(row[1:]) for row in rows}
+
+def _fake_model(monkeypatch, on_call=None):
+    calls, active, peak = [], [0], [0]
+
+    async def generate_digests(sections):
+        calls.append(sections)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        try:
+            await asyncio.sleep(0.01)
+            if on_call is not None:
+                on_call(sections)
+            # Текст модели для одного пользователя не разобрался
+            return [None if "пользователя 2205" in section else f"Удачного дня! ({len(calls)})" for section in sections]
+        finally:
+            active[0] -= 1
+
+    monkeypatch.setattr(task_manager, 'generate_digests', generate_digests)
+    return calls, peak
+
+def test_only_due_users_get_digests_in_bounded_batches(run, monkeypatch):
+    calls, peak = _fake_model(monkeypatch)
+    run(task_manager.generate_daily_digests(NOW))
+
+    digests = _saved_digests()
+    assert sorted(digests) == DUE_USERS
+    assert digests[2200][:2] == (date(2030, 6, 1), datetime(2030, 6, 1, 7, 0))
+    assert digests[2233][:2] == (date(2030, 6, 1), datetime(2030, 6, 1, 7, 0))
+    # Открытые задачи (pending и overdue) в сводке, выполненная — нет
+    assert "Открытых задач: 2" in next(section for sections in calls for section in sections)
+    assert max(len(sections) for sections in calls) == 4
+    assert sum(len(sections) for sections in calls) >= len(DUE_USERS)
+    assert peak[0] <= 2
+    # Без текста модели сводка все равно записана — со списком задач
+    assert digests[2205][2] is False and "Задача пользователя 2205" in digests[2205][3]
+
+def test_rerun_skips_prepared_digests(run, monkeypatch):
+    calls, _ = _fake_model(monkeypatch)
+    run(task_manager.generate_daily_digests(NOW))
+    first = _saved_digests()
+    calls.clear()
+    run(task_manager.generate_daily_digests(NOW))
+    assert _saved_digests() == first
+    assert not any(f"пользователя {user_id}" in section for sections in calls for section in sections for user_id in USERS)
+
+def test_digest_written_by_other_worker_does_not_drop_group(run, monkeypatch):
+    written = []
+
+    def other_worker(sections):
+        # Пока модель отвечала, другой проход (новый лидер) уже записал сводку одному пользователю группы
+        if not written and any("пользователя 2201" in section for section in sections):
+            with engine.begin() as conn:
+                conn.execute(Digest.__table__.insert(), [{"user_id": 2201, "digest_date": date(2030, 6, 1), "text": "готово",
+                                                          "ai_generated": True, "deliver_at": datetime(2030, 6, 1, 7, 0)}])
+            written.append(2201)
+
+    _fake_model(monkeypatch, on_call=other_worker)
+    run(task_manager.generate_daily_digests(NOW))
+    digests = _saved_digests()
+    assert written == [2201]
+    assert sorted(digests) == DUE_USERS
+    assert digests[2201][3] == "готово"
@@ -0,0 +1,116 @@
+# tests/test_leader.py
+# -*- coding: utf-8 -*-
+# Несколько воркеров: аренда роли лидера в БД (захват, переход после истечения срока, снятие роли)
+# и атомарный захват напоминаний, при котором каждое напоминание достается ровно одному воркеру.
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from db import Lease, Task, engine
+from leader import LeaderLease, _utcnow
+from reminder_dispatcher import claim_reminders, finish_reminders
+import task_manager
+
+TTL = 0.3
+USER_ID = 2000
+
+@pytest.fixture
+def lease_name(request):
+    name = f"test-{request.node.name}"
+    yield name
+    with engine.begin() as conn:
+        conn.execute(Lease.__table__.delete().where(Lease.name == name))
+
+def test_lease_moves_to_other_worker_after_expiry(run, lease_name):
+    first = LeaderLease(lease_name, 'worker-1', TTL)
+    second = LeaderLease(lease_name, 'worker-2', TTL)
+
+    async def main():
+        steps = [await first.try_acquire(), await second.try_acquire(), await first.try_acquire()]
+        # Первый перестал продлевать аренду (упал или завис): после срока ее забирает второй
+        await asyncio.sleep(TTL * 1.2)
+        steps += [await second.try_acquire(), await first.try_acquire()]
+        return steps
+
+    assert run(main()) == [True, False, True, True, False]
+    with engine.connect() as conn:
+        assert conn.execute(select(Lease.holder).where(Lease.name == lease_name)).scalar_one() == 'worker-2'
+
+def test_released_lease_is_taken_without_waiting(run, lease_name):
+    first = LeaderLease(lease_name, 'worker-1', 60)
+    second = LeaderLease(lease_name, 'worker-2', 60)
+
+    async def main():
+        steps = [await first.try_acquire(), await second.try_acquire()]
+        await first.release()
+        steps.append(await second.try_acquire())
+        return steps
+
+    assert run(main()) == [True, False, True]
+
+def test_leader_steps_down_when_lease_is_taken(run, lease_name):
+    events = []
+    worker = LeaderLease(lease_name, 'worker-1', TTL, on_elected=lambda: events.append('elected'),
+                         on_demoted=lambda: events.append('demoted'))
+
+    async def main():
+        worker.start()
+        await asyncio.sleep(TTL / 6)
+        leader_before = worker.is_leader
+        # Аренду забрал другой воркер (например, у этого долго не было связи с БД)
+        with engine.begin() as conn:
+            conn.execute(update(Lease).where(Lease.name == lease_name)
+                         .values(holder='worker-2', expires_at=_utcnow() + timedelta(minutes=5)))
+        await asyncio.sleep(TTL * 0.6)
+        leader_after = worker.is_leader
+        await worker.stop()
+        return leader_before, leader_after
+
+    assert run(main()) == (True, False)
+    assert events == ['elected', 'demoted']
+
+@pytest.fixture
+def reminders():
+    base = datetime(2030, 1, 1, 9, 0)
+    rows = [{"id": 20000 + i, "user_id": USER_ID, "task_text": f"Напоминание {i}", "priority": "medium",
+             "status": "pending", "due_date": base + timedelta(minutes=i)} for i in range(40)]
+    # Выполненная задача: ее напоминание не захватывается
+    rows[-1]["status"] = "completed"
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+    yield [row["id"] for row in rows]
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id == USER_ID))
+    task_manager.task_cache.invalidate(USER_ID)
+
+def test_racing_workers_claim_each_reminder_once(run, reminders):
+    async def main():
+        # Все воркеры одновременно пытаются захватить одни и те же напоминания (разным порядком пачек)
+        return await asyncio.gather(
+            claim_reminders(reminders[:25], holder='worker-1'),
+            claim_reminders(reminders[::-1], holder='worker-2'),
+            claim_reminders(reminders[10:], holder='worker-3'),
+        )
+
+    claims = run(main())
+    claimed = [task_id for worker in claims for task_id in worker]
+    assert sorted(claimed) == reminders[:-1]
+    with engine.connect() as conn:
+        owners = dict(conn.execute(select(Task.id, Task.reminder_claimed_by).where(Task.user_id == USER_ID)).all())
+    for worker, ids in zip(('worker-1', 'worker-2', 'worker-3'), claims):
+        assert all(owners[task_id] == worker for task_id in ids)
+    # Повторный захват после гонки ничего не дает
+    assert run(claim_reminders(reminders, holder='worker-4')) == set()
+
+def test_stale_claims_of_failed_worker_are_released(run, reminders, monkeypatch):
+    monkeypatch.setattr(task_manager, 'WORKER_ID', 'worker-1')
+    dead = run(claim_reminders(reminders[:5], holder='worker-2'))
+    run(claim_reminders(reminders[5:10], holder='worker-1'))
+    run(finish_reminders(reminders[:2], 'sent'))
+
+    # Захваты worker-2 старше срока аренды: он упал, не отправив их; свои захваты лидер не трогает
+    assert task_manager.release_stale_claims(_utcnow() + timedelta(seconds=1)) == len(dead) - 2
+    assert run(claim_reminders(reminders[:10], holder='worker-1')) == set(reminders[2:5])
@@ -0,0 +1,92 @@
+# tests/test_legacy_notes.py
+# -*- coding: utf-8 -*-
+# Перенос склеенных заметок tasks.notes в task_notes: разбор строки в формате прежнего /note,
+# перенос пачками со счетчиком notes_count и поиск по перенесенным заметкам.
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+import db
+from db import Task, TaskNote, engine, split_legacy_notes
+import task_manager
+
+USER_ID = 2400
+
+def legacy_blob(notes: list[tuple[datetime, str]]) -> str:
+    # Так заметки дописывал прежний add_task_note
+    blob = None
+    for created_at, text in notes:
+        entry = f"Дополнение ({created_at.strftime('%Y-%m-%d %H:%M')}): {text}"
+        blob = entry if blob is None else blob + f"\n--- {entry}"
+    return blob
+
+NOTES = [
+    (datetime(2025, 1, 9, 10, 0), "обязательно обезжиренное"),
+    (datetime(2025, 1, 9, 18, 30), "и кефир тоже\nесли будет"),
+    (datetime(2025, 2, 1, 7, 5), "--- не забыть пакет: Дополнение (без даты)"),
+]
+
+def test_split_round_trip():
+    assert split_legacy_notes(legacy_blob(NOTES), datetime(2030, 1, 1)) == NOTES
+
+def test_split_single_note():
+    assert split_legacy_notes(legacy_blob(NOTES[:1]), datetime(2030, 1, 1)) == NOTES[:1]
+
+def test_split_text_without_header_becomes_one_note():
+    fallback = datetime(2025, 3, 1, 12, 0)
+    assert split_legacy_notes("  взять зонт\n--- и сменку ", fallback) == [(fallback, "взять зонт\n--- и сменку")]
+    assert split_legacy_notes("   ", fallback) == []
+
+@pytest.fixture
+def legacy_tasks(monkeypatch):
+    # Маленькая пачка, чтобы перенос прошел в несколько транзакций
+    monkeypatch.setattr(db, 'LEGACY_NOTES_BATCH', 2)
+    rows = [{"id": 24000 + i, "user_id": USER_ID, "task_text": f"Купить молоко {i}", "status": "pending",
+             "priority": "medium", "notes": legacy_blob(NOTES[:i]), "notes_count": 0,
+             "updated_at": datetime(2025, 3, 1, 12, 0)}
+            for i in range(1, 4)]
+    rows.append({"id": 24010, "user_id": USER_ID, "task_text": "Позвонить врачу", "status": "pending",
+                 "priority": "medium", "notes": "спросить про анализы", "notes_count": 0,
+                 "updated_at": datetime(2025, 3, 2, 8, 0)})
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+    yield {row["id"]: row for row in rows}
+    with engine.begin() as conn:
+        # Сначала задачи: триггер удаления убирает их заметки из поискового индекса по task_notes
+        ids = [row["id"] for row in rows]
+        conn.execute(Task.__table__.delete().where(Task.id.in_(ids)))
+        conn.execute(TaskNote.__table__.delete().where(TaskNote.task_id.in_(ids)))
+    task_manager.task_cache.invalidate(USER_ID)
+
+def test_migration_moves_every_note_once(legacy_tasks):
+    assert db.migrate_legacy_notes() == len(legacy_tasks)
+    # Повторный запуск ничего не переносит: колонка notes уже пуста
+    assert db.migrate_legacy_notes() == 0
+
+    with engine.connect() as conn:
+        tasks = {row.id: row for row in conn.execute(
+            select(Task.id, Task.notes, Task.notes_count).where(Task.id.in_(legacy_tasks)))}
+        notes = conn.execute(select(TaskNote.task_id, TaskNote.created_at, TaskNote.text)
+                             .where(TaskNote.task_id.in_(legacy_tasks)).order_by(TaskNote.id)).all()
+
+    for task_id, row in legacy_tasks.items():
+        expected = split_legacy_notes(row["notes"], row["updated_at"])
+        assert [(created_at, text) for note_task_id, created_at, text in notes if note_task_id == task_id] == expected
+        assert tasks[task_id].notes is None
+        assert tasks[task_id].notes_count == len(expected)
+    # Текст без заголовка получает время последнего изменения задачи
+    assert (24010, datetime(2025, 3, 2, 8, 0), "спросить про анализы") in notes
+
+def test_migrated_notes_are_listed_and_searchable(legacy_tasks, run):
+    db.migrate_legacy_notes()
+
+    reply = run(task_manager.get_task_notes(USER_ID, 24003))
+    assert "обезжиренное" in reply and "если будет" in reply
+
+    found, has_more = run(task_manager.search_tasks(USER_ID, "обезжиренного"))
+    assert sorted(task.id for task in found) == [24001, 24002, 24003]
+    assert not has_more
+    found, _ = run(task_manager.search_tasks(USER_ID, "анализы"))
+    assert [task.id for task in found] == [24010]
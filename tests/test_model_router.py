@@ -0,0 +1,91 @@
+# tests/test_model_router.py
+# -*- coding: utf-8 -*-
+# Circuit breaker и маршрутизатор моделей: открытие после ошибок подряд, один пробный запрос в half-open
+# и возврат пробного запроса, когда он отменен (проиграл hedge).
+
+import asyncio
+
+import httpx
+import pytest
+
+from model_router import CircuitBreaker, ModelRouter
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    assert not breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+def test_half_open_allows_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Неудачный пробный запрос снова открывает breaker, удачный — закрывает
+    assert breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+def test_released_trial_can_be_retried():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+def _router(**kwargs) -> ModelRouter:
+    options = dict(fallback_models=[], slos={}, default_slo=5, breaker_failures=1, breaker_cooldown=0,
+                   hedge_delay=0.01, min_samples=1000)
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+def test_losing_hedged_trial_is_released():
+    router = _router(hedge_model='fast')
+    router.record('slow', 1.0, False)
+
+    async def call(model):
+        if model == 'slow':
+            await asyncio.sleep(1)
+        return model
+
+    async def main():
+        result = await router.run('slow', call)
+        # Отмененная задача основной модели завершается на следующем шаге цикла
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 'fast'
+    assert router._breaker('slow').allow()
+
+def test_run_falls_back_and_skips_open_breaker():
+    router = _router(fallback_models=['backup'], breaker_cooldown=60)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        if model == 'main':
+            raise httpx.ConnectError("нет соединения")
+        return model
+
+    assert asyncio.run(router.run('main', call)) == 'backup'
+    # После ошибки breaker основной модели открыт: следующий запрос сразу идет в запасную
+    assert asyncio.run(router.run('main', call)) == 'backup'
+    assert calls == ['main', 'backup', 'backup']
+    assert router.snapshot()['main']['breaker'] == 'open'
+
+def test_run_raises_when_every_breaker_is_open():
+    router = _router(breaker_cooldown=60)
+    router.record('main', 1.0, False)
+
+    async def call(model):
+        return model
+
+    with pytest.raises(httpx.HTTPError):
+        asyncio.run(router.run('main', call))
@@ -0,0 +1,91 @@
+# tests/test_overdue_sweep.py
+# -*- coding: utf-8 -*-
+# Перевод просроченных задач в overdue: задачи в пределах OVERDUE_GRACE_MINUTES не трогаются,
+# за проход меняется не больше OVERDUE_SWEEP_BATCH задач (самые старые первыми), сводка — одна на пользователя.
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from sqlalchemy import select
+
+from db import Task, engine
+import task_manager
+
+USERS = (2100, 2101)
+NOW = pytz.utc.localize(datetime(2030, 6, 1, 12, 0))
+GRACE_MINUTES = 30
+
+@pytest.fixture(autouse=True)
+def tasks(monkeypatch):
+    monkeypatch.setattr(task_manager, 'OVERDUE_GRACE_MINUTES', GRACE_MINUTES)
+    monkeypatch.setattr(task_manager, 'OVERDUE_SWEEP_BATCH', 3)
+    now = NOW.replace(tzinfo=None)
+    rows = [
+        # Срок прошел больше grace назад — просрочены; номера задач не по порядку сроков
+        {"id": 21001, "user_id": 2100, "status": "pending", "due_date": now - timedelta(hours=5)},
+        {"id": 21002, "user_id": 2101, "status": "pending", "due_date": now - timedelta(days=2)},
+        {"id": 21003, "user_id": 2100, "status": "pending", "due_date": now - timedelta(hours=1)},
+        {"id": 21004, "user_id": 2101, "status": "pending", "due_date": now - timedelta(minutes=GRACE_MINUTES + 1)},
+        # Еще в пределах grace, в будущем, без срока, уже выполнена или уже просрочена
+        {"id": 21005, "user_id": 2100, "status": "pending", "due_date": now - timedelta(minutes=GRACE_MINUTES - 1)},
+        {"id": 21006, "user_id": 2100, "status": "pending", "due_date": now + timedelta(hours=1)},
+        {"id": 21007, "user_id": 2100, "status": "pending", "due_date": None},
+        {"id": 21008, "user_id": 2101, "status": "completed", "due_date": now - timedelta(days=1)},
+        {"id": 21009, "user_id": 2101, "status": "overdue", "due_date": now - timedelta(days=3)},
+    ]
+    for row in rows:
+        row.update(task_text=f"Задача {row['id']}", priority="medium")
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+    yield
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id.in_(USERS)))
+    for user_id in USERS:
+        task_manager.task_cache.invalidate(user_id)
+
+def _statuses() -> dict[int, str]:
+    with engine.connect() as conn:
+        return dict(conn.execute(select(Task.id, Task.status).where(Task.user_id.in_(USERS))).all())
+
+def test_sweep_respects_grace_and_batch(run):
+    first = run(task_manager.sweep_overdue_tasks(NOW))
+    # Три самых старых за первый проход, оставшаяся — за второй
+    assert first["rows"] == 3
+    assert {task_id for task_id, status in _statuses().items() if status == 'overdue'} == {21001, 21002, 21003, 21009}
+    second = run(task_manager.sweep_overdue_tasks(NOW))
+    assert (second["rows"], second["users"]) == (1, 1)
+    assert run(task_manager.sweep_overdue_tasks(NOW))["rows"] == 0
+
+    statuses = _statuses()
+    assert {task_id for task_id, status in statuses.items() if status == 'overdue'} == {21001, 21002, 21003, 21004, 21009}
+    assert [statuses[task_id] for task_id in (21005, 21006, 21007, 21008)] == ['pending', 'pending', 'pending', 'completed']
+
+def test_grace_passes_on_later_sweep(run):
+    run(task_manager.sweep_overdue_tasks(NOW))
+    run(task_manager.sweep_overdue_tasks(NOW))
+    assert _statuses()[21005] == 'pending'
+    run(task_manager.sweep_overdue_tasks(NOW + timedelta(minutes=2)))
+    assert _statuses()[21005] == 'overdue'
+
+def test_sweep_refreshes_cached_lists(run):
+    # Кеш /list видит новый статус: набор пользователя сбрасывается после прохода
+    tasks, _, _ = run(task_manager.get_user_tasks_page(2100, page_size=10))
+    assert {task.id: task.status for task in tasks}[21001] == 'pending'
+    run(task_manager.sweep_overdue_tasks(NOW))
+    tasks, _, _ = run(task_manager.get_user_tasks_page(2100, page_size=10))
+    assert {task.id: task.status for task in tasks}[21001] == 'overdue'
+
+def test_one_digest_per_user(run, monkeypatch):
+    sent = []
+
+    async def send(user_id, text):
+        sent.append((user_id, text))
+
+    monkeypatch.setattr(task_manager, 'OVERDUE_DIGEST', True)
+    monkeypatch.setattr(task_manager.dispatcher, 'send', send)
+    monkeypatch.setattr(task_manager, 'OVERDUE_SWEEP_BATCH', 100)
+    result = run(task_manager.sweep_overdue_tasks(NOW))
+    assert (result["rows"], result["users"], result["digests"]) == (4, 2, 2)
+    assert sorted(user_id for user_id, _ in sent) == [2100, 2101]
+    assert "Срок прошел у задач: *2*" in dict(sent)[2100]
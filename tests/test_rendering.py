@@ -0,0 +1,39 @@
+# tests/test_rendering.py
+# -*- coding: utf-8 -*-
+# Экранирование Markdown v1 в ответах бота и строки списка задач в часовом поясе пользователя.
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from telegram.helpers import escape_markdown
+
+from rendering import escape, get_timezone, render_task_line, wrap_entity
+
+@pytest.mark.parametrize('text', ["", "купить молоко", "snake_case и *звезды*", "`код` [ссылка](x)", "_*`[_*`["])
+def test_escape_matches_telegram_helper(text):
+    assert escape(text) == escape_markdown(text, version=1)
+
+def test_wrap_entity_reopens_around_marker():
+    assert wrap_entity("молоко", '*') == "*молоко*"
+    assert wrap_entity("2*3", '*') == "*2*\\**3*"
+    # Другие спецсимволы внутри сущности остаются как есть
+    assert wrap_entity("snake_case", '*') == "*snake_case*"
+
+def _task(**fields):
+    task = dict(id=7, task_text="купить *молоко*", due_date=None, status='pending', notes_count=0,
+                priority='medium', category=None)
+    task.update(fields)
+    return SimpleNamespace(**task)
+
+def test_task_line_escapes_text_and_category():
+    line = render_task_line(_task(category="дом_дача"), get_timezone('UTC'))
+    assert line == "*7.* купить \\*молоко\\* 🟡Средний приоритет #дом\\_дача"
+
+def test_task_line_shows_due_in_user_timezone():
+    task = _task(due_date=datetime(2026, 1, 10, 21, 30), status='overdue', notes_count=2, priority='high')
+    line = render_task_line(task, get_timezone('Asia/Novosibirsk'))
+    assert line == "*7.* купить \\*молоко\\* (до 2026-01-11 04:30) ⏰просрочено 📝2 🔥*Высокий приоритет*🔥"
+
+def test_unknown_timezone_falls_back_to_default():
+    assert get_timezone('Marte/Olympus') is get_timezone(None)
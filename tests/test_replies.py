@@ -0,0 +1,94 @@
+# tests/test_replies.py
+# -*- coding: utf-8 -*-
+# Ответы команд так, как их видит пользователь: текст задачи со спецсимволами Markdown показывается
+# без обратных косых черт и звездочек, если ответ отправлен с parse_mode='Markdown'.
+
+from types import SimpleNamespace
+
+import pytest
+
+from db import Task, engine
+import main
+import task_manager
+
+USER_ID = 1800
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, parse_mode=None, **kwargs):
+        self.replies.append((text, parse_mode))
+
+def _update(text: str):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), effective_chat=SimpleNamespace(id=USER_ID),
+                           message=FakeMessage(text))
+
+def _command(run, handler, text: str) -> list[tuple[str, str | None]]:
+    update = _update(text)
+    run(handler(update, SimpleNamespace(args=text.split()[1:])))
+    return update.message.replies
+
+def visible(text: str, parse_mode: str | None) -> str:
+    """Текст, который покажет Telegram. Разметка v1: экранирование только вне сущностей, сущности не вкладываются."""
+    if parse_mode is None:
+        return text
+    assert parse_mode == 'Markdown'
+    result, entity, i = [], None, 0
+    while i < len(text):
+        char = text[i]
+        if entity is None and char == '\\' and i + 1 < len(text) and text[i + 1] in '_*`[':
+            result.append(text[i + 1])
+            i += 2
+            continue
+        if char in '_*`' and entity in (None, char):
+            entity = None if entity else char
+        else:
+            assert entity is not None or char != '[', f"незакрытая ссылка: {text!r}"
+            result.append(char)
+        i += 1
+    assert entity is None, f"незакрытая сущность {entity!r}: {text!r}"
+    return "".join(result)
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id == USER_ID))
+    task_manager.task_cache.invalidate(USER_ID)
+
+def _last_task_id() -> int:
+    with engine.connect() as conn:
+        return conn.execute(Task.__table__.select().with_only_columns(Task.id)
+                            .where(Task.user_id == USER_ID).order_by(Task.id.desc())).scalars().first()
+
+def test_add_shows_task_text_as_typed(run):
+    [(text, parse_mode)] = _command(run, main.add_task_command, "/add Купить молоко_срочно *2* пачки")
+    assert parse_mode == 'Markdown'
+    assert visible(text, parse_mode).startswith("Отлично! Я записал задачу: Купить молоко_срочно *2* пачки.")
+
+def test_bulk_add_shows_task_text_as_typed(run):
+    [(text, parse_mode)] = _command(run, main.add_task_command, "/add купить молоко_срочно\nпозвонить маме [вечером]")
+    shown = visible(text, parse_mode)
+    assert "молоко_срочно" in shown and "позвонить маме [вечером]" in shown
+    assert "\\" not in shown
+
+def test_edit_shows_new_text_as_typed(run):
+    _command(run, main.add_task_command, "/add Купить хлеб")
+    task_id = _last_task_id()
+    [(text, parse_mode)] = _command(run, main.edit_task_command, f"/edit {task_id} a*b_c")
+    assert visible(text, parse_mode) == f"Текст задачи '{task_id}' обновлен на: a*b_c."
+
+def test_unknown_priority_is_escaped(run):
+    _command(run, main.add_task_command, "/add Купить хлеб")
+    task_id = _last_task_id()
+    [(text, parse_mode)] = _command(run, main.set_priority_command, f"/set_priority {task_id} very_high")
+    assert visible(text, parse_mode).startswith("Неизвестный приоритет 'very_high'.")
+
+def test_plain_replies_are_not_escaped(run):
+    _command(run, main.add_task_command, "/add Купить молоко_срочно")
+    task_id = _last_task_id()
+    [(text, parse_mode)] = _command(run, main.done_task_command, f"/done {task_id}")
+    assert parse_mode is None
+    assert "'Купить молоко_срочно'" in text
@@ -0,0 +1,41 @@
+# tests/test_response_cache.py
+# -*- coding: utf-8 -*-
+# Кеш шаблонных ответов AI на диске: сохраненные ответы переживают перезапуск, а файл неизвестного формата
+# не роняет запуск — кеш просто начинается пустым.
+
+import json
+import time
+
+import pytest
+
+from response_cache import ResponseCache
+
+def test_entries_survive_restart(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(max_size=2, ttl=60, path=path)
+    cache.set('start', "Привет!")
+    cache.set('help', "Вот что я умею")
+
+    restored = ResponseCache(max_size=2, ttl=60, path=path)
+    assert restored.get('start') == "Привет!"
+    assert restored.get('help') == "Вот что я умею"
+
+def test_expired_entries_are_not_loaded(tmp_path):
+    path = tmp_path / 'cache.json'
+    path.write_text(json.dumps({'old': [time.time() - 1, "устарел"], 'new': [time.time() + 60, "свежий"]}), encoding='utf-8')
+    cache = ResponseCache(ttl=60, path=str(path))
+    assert cache.get('old') is None
+    assert cache.get('new') == "свежий"
+
+@pytest.mark.parametrize('content', [
+    '[]', '"x"', '1', 'null', '{"k": 1}', '{"k": [1]}', '{"k": [1, 2, 3]}', '{"k": ["завтра", "ответ"]}',
+    '{"k": [1e12, null]}', '{"ok": [1e12, "ответ"], "bad": {}}', '{не json',
+])
+def test_malformed_file_starts_empty(tmp_path, content):
+    path = tmp_path / 'cache.json'
+    path.write_text(content, encoding='utf-8')
+    cache = ResponseCache(ttl=60, path=str(path))
+    assert cache.stats()["size"] == 0
+    # Кеш рабочий, следующая запись перезапишет файл корректным
+    cache.set('start', "Привет!")
+    assert ResponseCache(ttl=60, path=str(path)).get('start') == "Привет!"
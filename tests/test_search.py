@@ -0,0 +1,55 @@
+# tests/test_search.py
+# -*- coding: utf-8 -*-
+# Запрос /find для FTS5: основы слов, префиксы в пределах индексированных длин и отбор по владельцу.
+
+import pytest
+
+from db import Task, TaskNote, engine
+from search import MAX_QUERY_TERMS, fts5_match, query_words, stem
+import task_manager
+
+@pytest.mark.parametrize('word, expected', [
+    ("молока", "молок"),
+    ("молоко", "молок"),
+    ("обезжиренного", "обезжиренн"),
+    ("позвонить", "позвон"),
+    # Основа не короче MIN_STEM_LENGTH, латиница не обрезается
+    ("кот", "кот"),
+    ("ищу", "ищу"),
+    ("emails", "emails"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+def test_query_words_normalizes_and_dedups():
+    assert query_words("Купить МОЛОКА, молока и ёлку!") == ["купить", "молока", "и", "елку"]
+    assert len(query_words(" ".join(f"слово{i}" for i in range(20)))) == MAX_QUERY_TERMS
+
+def test_fts5_match_quotes_prefix_terms():
+    assert fts5_match(5, ["молока", "и"]) == 'owner:u5 AND ("молок"* AND "и")'
+
+def test_fts5_prefix_fits_indexed_lengths():
+    # Основа «презентаци» длиннее самого длинного индексированного префикса
+    assert fts5_match(5, ["презентации"]) == 'owner:u5 AND ("презен"*)'
+    assert fts5_match(5, ["кот"]) == 'owner:u5 AND ("кот"*)'
+    assert fts5_match(5, ["ум"]) == 'owner:u5 AND ("ум")'
+
+def test_found_by_word_form(run):
+    # Слово из заметки ищется в другой форме; чужие задачи с тем же словом не находятся
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), [
+            {"id": 23001, "user_id": 2300, "task_text": "Купить молоко", "status": "pending", "priority": "medium"},
+            {"id": 23002, "user_id": 2300, "task_text": "Позвонить маме", "status": "completed", "priority": "low"},
+            {"id": 23003, "user_id": 2301, "task_text": "Купить молоко", "status": "pending", "priority": "medium"},
+        ])
+        conn.execute(TaskNote.__table__.insert(), [{"task_id": 23002, "text": "спросить про молоко"}])
+    try:
+        found, has_more = run(task_manager.search_tasks(2300, "молока"))
+        assert sorted(task.id for task in found) == [23001, 23002]
+        assert not has_more
+        found, _ = run(task_manager.search_tasks(2300, "маме позвонить"))
+        assert [task.id for task in found] == [23002]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(Task.__table__.delete().where(Task.id.in_((23001, 23002, 23003))))
+            conn.execute(TaskNote.__table__.delete().where(TaskNote.task_id == 23002))
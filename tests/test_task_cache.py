@@ -0,0 +1,134 @@
+# tests/test_task_cache.py
+# -*- coding: utf-8 -*-
+# Кеш незакрытых задач: страницы из кеша (page_rows) совпадают со страницами keyset-запроса в SQL,
+# а снимок, загруженный параллельно с изменением задач, в кеш не попадает.
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from db import Task, engine
+import task_manager
+from task_cache import TaskCache
+
+USER_ID = 1700
+PAGE_SIZE = 4
+
+@pytest.fixture(scope='module', autouse=True)
+def tasks():
+    # Одинаковые сроки, задачи без срока и неизвестный приоритет — границы, на которых keyset легко ошибиться
+    base = datetime(2026, 3, 1, 9, 0)
+    rows = []
+    for i in range(1, 61):
+        rows.append({
+            "id": 17000 + i, "user_id": USER_ID, "task_text": f"Задача {i}",
+            "priority": ('high', 'medium', 'low', 'urgent')[i % 4],
+            "due_date": None if i % 5 == 0 else base + timedelta(hours=i % 3, microseconds=i % 2),
+            "category": ('дом', 'работа', None)[i % 3],
+            "status": ('pending', 'overdue', 'completed')[i % 7 % 3],
+        })
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+    yield
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id == USER_ID))
+    task_manager.task_cache.invalidate(USER_ID)
+
+async def _walk(category: str | None) -> tuple[list, list]:
+    # Проход вперед до конца, затем назад от последней страницы: номера задач и курсоры каждой страницы
+    forward, backward = [], []
+    tasks, next_cursor, prev_cursor = await task_manager.get_user_tasks_page(USER_ID, category=category, page_size=PAGE_SIZE)
+    forward.append(([task.id for task in tasks], next_cursor, prev_cursor))
+    while next_cursor:
+        tasks, next_cursor, prev_cursor = await task_manager.get_user_tasks_page(
+            USER_ID, category=category, after=next_cursor, page_size=PAGE_SIZE)
+        forward.append(([task.id for task in tasks], next_cursor, prev_cursor))
+    while prev_cursor:
+        tasks, next_cursor, prev_cursor = await task_manager.get_user_tasks_page(
+            USER_ID, category=category, before=prev_cursor, page_size=PAGE_SIZE)
+        backward.append(([task.id for task in tasks], next_cursor, prev_cursor))
+    return forward, backward
+
+def _walk_sql(run, category: str | None) -> tuple[list, list]:
+    cache = task_manager.task_cache
+    max_users, cache.max_users = cache.max_users, 0
+    try:
+        return run(_walk(category))
+    finally:
+        cache.max_users = max_users
+
+def _walk_cache(run, category: str | None) -> tuple[list, list]:
+    task_manager.task_cache.invalidate(USER_ID)
+    return run(_walk(category))
+
+@pytest.mark.parametrize('category', [None, 'дом', 'работа'])
+def test_cache_pages_match_sql_keyset(run, category):
+    sql_forward, sql_backward = _walk_sql(run, category)
+    assert len(sql_forward) > 2
+    assert _walk_cache(run, category) == (sql_forward, sql_backward)
+
+def test_pages_cover_open_tasks_once_in_list_order(run):
+    forward, backward = _walk_sql(run, None)
+    ids = [task_id for page, _, _ in forward for task_id in page]
+    with engine.connect() as conn:
+        expected = conn.execute(
+            Task.__table__.select().with_only_columns(Task.id)
+            .where(Task.user_id == USER_ID, Task.status.in_(('pending', 'overdue')))
+            .order_by(*task_manager.TASK_LIST_ORDER)
+        ).scalars().all()
+    assert ids == expected
+    # Назад — те же страницы в обратном порядке (кроме последней, с которой начинали)
+    assert [page for page, _, _ in backward] == [page for page, _, _ in forward[-2::-1]]
+
+def _task(task_id: int, status: str = 'pending'):
+    return SimpleNamespace(id=task_id, task_text=f"Задача {task_id}", due_date=None, priority='medium',
+                           category=None, notes_count=0, status=status)
+
+def test_put_drops_snapshot_loaded_before_upsert():
+    cache = TaskCache(max_users=10, max_rows_per_user=100)
+    generation = cache.begin_load(1)
+    # Задача добавлена, пока шел запрос: набора в кеше еще нет, upsert его не создает
+    cache.upsert(1, _task(2))
+    assert not cache.put(1, [_task(1)], generation)
+    cache.end_load(1)
+    assert cache.get(1) is None
+
+def test_put_drops_snapshot_after_invalidate_all():
+    cache = TaskCache(max_users=10, max_rows_per_user=100)
+    generation = cache.begin_load(1)
+    cache.invalidate()
+    assert not cache.put(1, [_task(1)], generation)
+    cache.end_load(1)
+
+def test_put_keeps_snapshot_when_other_user_changes():
+    cache = TaskCache(max_users=10, max_rows_per_user=100)
+    generation = cache.begin_load(1)
+    cache.upsert(2, _task(5))
+    cache.remove(2, 5)
+    assert cache.put(1, [_task(1)], generation)
+    cache.end_load(1)
+    assert [row.id for row in cache.get(1)] == [1]
+    assert cache._loads == {}
+
+def test_overlapping_loads_share_generation():
+    cache = TaskCache(max_users=10, max_rows_per_user=100)
+    first = cache.begin_load(1)
+    second = cache.begin_load(1)
+    cache.end_load(1)
+    cache.upsert(1, _task(3))
+    # Вторая загрузка еще идет: изменение после начала первой делает устаревшими обе
+    assert not cache.put(1, [_task(1)], first)
+    assert not cache.put(1, [_task(1)], second)
+    cache.end_load(1)
+    assert cache._loads == {}
+
+def test_each_list_request_counts_one_lookup(run):
+    cache = task_manager.task_cache
+    cache.invalidate(USER_ID)
+    before = cache.stats(memory=False)
+    run(task_manager.get_user_tasks_page(USER_ID, page_size=PAGE_SIZE))
+    run(task_manager.get_user_tasks_page(USER_ID, page_size=PAGE_SIZE))
+    after = cache.stats(memory=False)
+    # Холодный запрос — один промах (чтение после put не считается), повторный — одно попадание
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
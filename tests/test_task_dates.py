@@ -0,0 +1,53 @@
+# tests/test_task_dates.py
+# -*- coding: utf-8 -*-
+# Даты задач пишутся в БД как naive UTC: asyncpg не принимает aware datetime в колонки без часового пояса,
+# а SQLite молча сохраняет любые. Поэтому проверяются сами параметры запросов.
+
+from datetime import datetime
+
+import pytest
+import pytz
+from sqlalchemy import event, select
+
+from db import Task, async_engine, engine
+import task_manager
+
+USER_ID = 1810
+
+@pytest.fixture
+def aware_params():
+    found = []
+
+    def check(conn, cursor, statement, parameters, context, executemany):
+        # compiled_parameters — значения до bind-процессоров диалекта (SQLite превращает даты в строки)
+        found.extend((statement, value) for row in context.compiled_parameters for value in row.values()
+                     if isinstance(value, datetime) and value.tzinfo is not None)
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', check)
+    yield found
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', check)
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete().where(Task.user_id == USER_ID))
+    task_manager.task_cache.invalidate(USER_ID)
+
+def test_task_writes_bind_naive_utc(run, monkeypatch, aware_params):
+    reminders = []
+    monkeypatch.setattr(task_manager, '_add_reminder_job', lambda *args: reminders.append(args))
+
+    run(task_manager.set_user_timezone(USER_ID, 'Asia/Almaty'))
+    result = run(task_manager.add_task(USER_ID, "Купить молоко 2030-01-10 10:00"))
+    assert result.task_id is not None
+    run(task_manager.add_tasks_bulk(USER_ID, ["Позвонить маме 2030-01-11 09:00", "Вынести мусор"]))
+    run(task_manager.update_task_text(USER_ID, result.task_id, "Купить кефир"))
+    run(task_manager.add_task_note(USER_ID, result.task_id, "обезжиренный"))
+    run(task_manager.set_task_priority(USER_ID, result.task_id, "high"))
+    run(task_manager.mark_task_as_done(USER_ID, result.task_id))
+    assert aware_params == []
+
+    with engine.connect() as conn:
+        due_dates = conn.execute(select(Task.due_date).where(Task.user_id == USER_ID).order_by(Task.id)).scalars().all()
+    # 10:00 по Алма-Ате (UTC+5 в 2030 году) — 05:00 UTC
+    assert due_dates == [datetime(2030, 1, 10, 5, 0), datetime(2030, 1, 11, 4, 0), None]
+    # Планировщику срок передается с часовым поясом, иначе он прочитает его в своем
+    assert [args[3] for args in reminders] == [pytz.utc.localize(datetime(2030, 1, 10, 5, 0)),
+                                               pytz.utc.localize(datetime(2030, 1, 11, 4, 0))]
@@ -0,0 +1,46 @@
+# tests/test_task_parser.py
+# -*- coding: utf-8 -*-
+# Локальный парсер задач на регрессионном корпусе benchmarks/parser_corpus.json: если разбор уверенный
+# (модель не вызывается), он должен совпасть с ожидаемым полностью.
+
+import json
+import os
+from datetime import datetime
+
+import pytest
+import pytz
+
+from task_parser import is_confident, parse_task_locally
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'parser_corpus.json')
+
+with open(CORPUS_PATH, encoding='utf-8') as f:
+    CORPUS = json.load(f)
+NOW = pytz.utc.localize(datetime.strptime(CORPUS['now'], '%Y-%m-%d %H:%M:%S'))
+
+@pytest.mark.parametrize('case', CORPUS['cases'], ids=[case['text'] for case in CORPUS['cases']])
+def test_confident_parse_matches_corpus(case):
+    parsed, confidence = parse_task_locally(case['text'], NOW)
+    if is_confident(confidence):
+        assert {field: parsed[field] or None for field in case['expected']} == case['expected']
+
+@pytest.mark.parametrize('text', ["Купить низкий стол", "Обычная уборка", "Срочная доставка пиццы"])
+def test_adjective_inside_task_is_not_a_priority(text):
+    parsed, confidence = parse_task_locally(text, NOW)
+    assert parsed['task_text'] == text
+    assert parsed['priority'] == 'medium'
+    # Возможно, это все-таки приоритет — решает модель
+    assert not is_confident(confidence)
+
+@pytest.mark.parametrize('text, priority', [
+    ("Купить стол приоритет низкий", 'low'),
+    ("Купить стол низкий приоритет", 'low'),
+    ("Купить стол !низкий", 'low'),
+    ("Купить стол !high", 'high'),
+    ("Купить стол срочно", 'high'),
+    ("Купить стол низкий", 'low'),
+])
+def test_explicit_priority_markers(text, priority):
+    parsed, confidence = parse_task_locally(text, NOW)
+    assert (parsed['task_text'], parsed['priority']) == ("Купить стол", priority)
+    assert is_confident(confidence)
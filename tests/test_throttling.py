@@ -0,0 +1,128 @@
+# tests/test_throttling.py
+# -*- coding: utf-8 -*-
+# Debounce сообщений, лимит запросов к модели на пользователя и схлопывание одинаковых вызовов.
+
+import asyncio
+
+from db import Task, engine
+import main
+import task_manager
+from throttling import Debouncer, KeyedRateLimiter, SingleFlight
+
+WINDOW = 0.05
+
+def test_consecutive_messages_are_flushed_once():
+    flushed = []
+
+    async def flush(key, items):
+        flushed.append((key, list(items)))
+
+    async def main():
+        debouncer = Debouncer(WINDOW, flush)
+        opened = [debouncer.add('u1', "купить хлеб"), debouncer.add('u2', "позвонить маме"),
+                  debouncer.add('u1', "и молоко")]
+        await asyncio.sleep(WINDOW / 2)
+        opened.append(debouncer.add('u1', "и сыр"))
+        await asyncio.sleep(WINDOW * 2)
+        # После окна следующее сообщение открывает новый пакет
+        opened.append(debouncer.add('u1', "вынести мусор"))
+        await asyncio.sleep(WINDOW * 2)
+        return opened
+
+    assert asyncio.run(main()) == [True, True, False, False, True]
+    assert flushed == [('u1', ["купить хлеб", "и молоко", "и сыр"]), ('u2', ["позвонить маме"]),
+                       ('u1', ["вынести мусор"])]
+
+def test_flush_waits_for_key_lock():
+    # Пакет разбирается под очередью пользователя: пока там идет другой апдейт, flush ждет
+    events = []
+    locks = {}
+
+    def lock(key):
+        return locks.setdefault(key, asyncio.Lock())
+
+    async def flush(key, items):
+        events.append(('flush', items))
+
+    async def main():
+        debouncer = Debouncer(WINDOW, flush, lock=lock)
+        async with lock('u1'):
+            debouncer.add('u1', "купить хлеб")
+            await asyncio.sleep(WINDOW * 2)
+            events.append(('update done', None))
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert events == [('update done', None), ('flush', ["купить хлеб"])]
+
+def test_rate_limit_is_per_key():
+    limiter = KeyedRateLimiter(rate=0.001, burst=2)
+    assert [limiter.try_acquire(1) for _ in range(3)] == [True, True, False]
+    assert limiter.try_acquire(2)
+
+def test_keyed_limiter_evicts_oldest_key():
+    limiter = KeyedRateLimiter(rate=0.001, burst=1, max_keys=2)
+    limiter.try_acquire(1)
+    limiter.try_acquire(2)
+    limiter.try_acquire(3)
+    # Ключ 1 вытеснен, его bucket создается заново с полным запасом
+    assert limiter.try_acquire(1)
+    assert not limiter.try_acquire(3)
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(WINDOW)
+        return "ответ"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do('start', slow) for _ in range(5)))
+        # После завершения следующий вызов снова идет в модель
+        results.append(await flight.do('start', slow))
+        return results
+
+    results = asyncio.run(main())
+    assert [shared for _, shared in results] == [False, True, True, True, True, False]
+    assert {value for value, _ in results} == {"ответ"}
+    assert len(calls) == 2
+
+def test_single_flight_shares_errors():
+    async def failing():
+        await asyncio.sleep(WINDOW)
+        raise ValueError("модель недоступна")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do('start', failing) for _ in range(3)), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [ValueError] * 3
+
+def test_debounced_messages_become_one_bulk_add(run):
+    # Два сообщения подряд от пользователя — один разбор пакетом и один ответ на первое сообщение
+    user_id = 1300
+    replies = []
+
+    class Message:
+        def __init__(self, text):
+            self.text = text
+
+        async def reply_text(self, text, **kwargs):
+            replies.append((self, text))
+
+    messages = [Message("Купить хлеб"), Message("Позвонить маме")]
+    try:
+        run(main._flush_messages((user_id, user_id), messages))
+        with engine.connect() as conn:
+            texts = conn.execute(Task.__table__.select().with_only_columns(Task.task_text)
+                                 .where(Task.user_id == user_id).order_by(Task.id)).scalars().all()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(Task.__table__.delete().where(Task.user_id == user_id))
+        task_manager.task_cache.invalidate(user_id)
+    assert texts == ["Купить хлеб", "Позвонить маме"]
+    [(message, text)] = replies
+    assert message is messages[0]
+    assert "записал задач: *2*" in text
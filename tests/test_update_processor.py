@@ -0,0 +1,50 @@
+# tests/test_update_processor.py
+# -*- coding: utf-8 -*-
+# Очередь апдейтов по пользователям: порядок внутри пользователя сохраняется, а пачка медленных апдейтов
+# одного пользователя не занимает места общего лимита, пока ждет своей очереди.
+
+import asyncio
+import time
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerUserUpdateProcessor
+
+SLOW = 0.2
+
+def _update(update_id: int, user_id: int) -> Update:
+    message = Message(message_id=update_id, date=datetime.now(), chat=Chat(user_id, Chat.PRIVATE),
+                      from_user=User(user_id, "test", False), text=f"сообщение {update_id}")
+    return Update(update_id, message=message)
+
+async def _burst(processor: PerUserUpdateProcessor, burst: int) -> tuple[list, dict]:
+    # Пользователь 1 присылает пачку медленных апдейтов, пользователь 2 — один быстрый сразу после
+    order, finished = [], {}
+    started = time.perf_counter()
+
+    async def handle(update_id: int, delay: float):
+        await asyncio.sleep(delay)
+        order.append(update_id)
+        finished[update_id] = time.perf_counter() - started
+
+    tasks = [asyncio.create_task(processor.process_update(_update(i, 1), handle(i, SLOW))) for i in range(burst)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(processor.process_update(_update(100, 2), handle(100, 0))))
+    await asyncio.gather(*tasks)
+    return order, finished
+
+def test_burst_from_one_user_does_not_block_others():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+    order, finished = asyncio.run(_burst(processor, burst=5))
+    # Второй пользователь не ждет даже первого медленного апдейта первого
+    assert finished[100] < SLOW / 2
+    assert [update_id for update_id in order if update_id != 100] == list(range(5))
+    assert processor._locks == {}
+
+def test_single_slot_is_shared_between_users():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=1)
+    order, finished = asyncio.run(_burst(processor, burst=3))
+    # С одним местом второй пользователь проходит сразу после текущего апдейта первого, а не после всей пачки
+    assert order == [0, 100, 1, 2]
+    assert finished[100] < SLOW * 1.5
@@ -0,0 +1,49 @@
+# tests/test_webhook.py
+# -*- coding: utf-8 -*-
+# Сервер webhook отвечает на каждый запрос: некорректное тело — 400 без разрыва keep-alive соединения.
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from webhook import WebhookServer
+
+PATH = '/telegram'
+
+async def _post(bodies: list[bytes]) -> tuple[list[str], list]:
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    server = WebhookServer(application, '127.0.0.1', 0, PATH)
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        statuses = []
+        # Все запросы по одному соединению: ответ на плохой запрос не должен его закрывать
+        for body in bodies:
+            writer.write(f"POST {PATH} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout=2)
+            statuses.append(status_line.decode().split(' ', 1)[1].strip())
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+        writer.close()
+    finally:
+        await server.close()
+    updates = []
+    while not application.update_queue.empty():
+        updates.append(application.update_queue.get_nowait())
+    return statuses, updates
+
+@pytest.mark.parametrize('body', [b'[]', b'"x"', b'1', b'null', b'{"message": {}}', b'{not json'])
+def test_malformed_update_gets_400(body):
+    valid = json.dumps({"update_id": 7}).encode()
+    statuses, updates = asyncio.run(_post([body, valid]))
+    assert statuses == ['400 Bad Request', '200 OK']
+    assert [update.update_id for update in updates] == [7]
+
+def test_unknown_path_gets_404():
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    server = WebhookServer(application, '127.0.0.1', 0, PATH)
+    status = asyncio.run(server._handle_request(['POST', '/other'], {}, b'{}'))
+    assert status == '404 Not Found'
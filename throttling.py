@@ -0,0 +1,112 @@
+# throttling.py
+# -*- coding: utf-8 -*-
+# Ограничение частоты, схлопывание одинаковых запросов и debounce сообщений
+
+import asyncio
+import time
+from collections import OrderedDict
+
+class RateLimiter:
+    """Простой token bucket: не более rate событий в секунду с запасом burst."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        # Неблокирующая попытка: True, если токен был и он списан
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while not self.try_acquire():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class KeyedRateLimiter:
+    """Отдельный token bucket на каждый ключ (например, user_id); число ключей ограничено LRU."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+
+    def try_acquire(self, key) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimiter(self.rate, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+class SingleFlight:
+    """Одинаковые одновременные вызовы выполняются один раз, остальные ждут тот же результат."""
+
+    def __init__(self):
+        self._in_flight: dict = {}
+
+    async def do(self, key, coroutine_factory) -> tuple[object, bool]:
+        # Возвращает (результат, shared): shared=True, если результат получен от чужого вызова
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await coroutine_factory()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; помечаем, чтобы asyncio не ругался, если их нет
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+class Debouncer:
+    """Собирает элементы с одним ключом в пределах окна и обрабатывает их одним вызовом flush(key, items).
+
+    add() не ждет обработки: flush выполняется отдельной задачей после окна, под lock(key), если он задан.
+    """
+
+    def __init__(self, window: float, flush, lock=None):
+        self.window = window
+        self.flush = flush
+        self.lock = lock
+        self._pending: dict = {}
+
+    def add(self, key, item, create_task=asyncio.create_task) -> bool:
+        """Добавляет элемент в пакет; True — элемент открыл новый пакет. create_task запускает задачу пакета."""
+        items = self._pending.get(key)
+        leader = items is None
+        if leader:
+            items = self._pending[key] = []
+            create_task(self._run(key, items))
+        items.append(item)
+        return leader
+
+    async def _run(self, key, items: list) -> None:
+        await asyncio.sleep(self.window)
+        # После окна новые элементы с этим ключом попадут уже в следующий пакет
+        del self._pending[key]
+        if self.lock is None:
+            await self.flush(key, items)
+            return
+        async with self.lock(key):
+            await self.flush(key, items)
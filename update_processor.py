@@ -0,0 +1,63 @@
+# update_processor.py
+# -*- coding: utf-8 -*-
+# Параллельная обработка апдейтов Telegram с сохранением порядка внутри одного пользователя:
+# апдейты разных пользователей идут одновременно (до max_concurrent_updates), одного — по очереди.
+# Очередь пользователя охватывает только блокирующие обработчики; работа, отложенная обработчиком
+# (пакет сообщений после окна debounce), берет ту же блокировку через user_lock.
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # user_id -> [lock, число апдейтов, которые его держат или ждут]; запись удаляется, когда апдейтов нет
+        self._locks: dict[int, list] = {}
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+        return None
+
+    @asynccontextmanager
+    async def user_lock(self, key):
+        """Очередь апдейтов пользователя (или чата) key: под ней ничего другое этого пользователя не выполняется."""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def process_update(self, update: object, coroutine) -> None:
+        # Базовый process_update берет общий семафор max_concurrent_updates до do_process_update. Если ждать
+        # очередь пользователя уже под семафором, пачка медленных апдейтов одного пользователя займет все места,
+        # и остальные пользователи будут стоять. Поэтому сначала очередь пользователя, потом место в семафоре.
+        # (@final у базового метода — только подсказка для проверки типов.)
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        async with self.user_lock(key):
+            await super().process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,136 @@
+# webhook.py
+# -*- coding: utf-8 -*-
+# Режим webhook: Telegram присылает апдейты POST-запросами, сервер на asyncio кладет их в очередь приложения.
+# Ответ 200 отправляется сразу после постановки в очередь, обработка идет параллельно (см. update_processor.py).
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+class WebhookServer:
+    def __init__(self, application: Application, host: str, port: int, path: str, secret_token: str | None = None):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.accepting = True
+        self.stats = {"received": 0, "rejected": 0}
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Webhook слушает http://%s:%s%s", self.host, self.port, self.path)
+
+    async def close(self) -> None:
+        # Новые соединения и апдейты больше не принимаются; уже поставленные в очередь обработает application.stop()
+        self.accepting = False
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Keep-alive: Telegram и балансировщики присылают несколько апдейтов по одному соединению
+            while self.accepting:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, '413 Payload Too Large', close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status = await self._handle_request(request_line.decode('latin-1').split(), headers, body)
+                close = headers.get('connection', '').lower() == 'close' or not self.accepting
+                await self._respond(writer, status, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.debug("Соединение webhook закрыто: %s", e)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request: list[str], headers: dict, body: bytes) -> str:
+        if len(request) < 2 or request[0] != 'POST' or request[1].split('?')[0] != self.path:
+            return '404 Not Found'
+        if self.secret_token and not hmac.compare_digest(
+                headers.get('x-telegram-bot-api-secret-token', ''), self.secret_token):
+            self.stats["rejected"] += 1
+            return '403 Forbidden'
+        if not self.accepting:
+            return '503 Service Unavailable'
+        try:
+            payload = json.loads(body)
+            # Корректный JSON, но не объект ([], "x", 1) de_json не разбирает: уронил бы соединение без ответа
+            if not isinstance(payload, dict):
+                raise TypeError(f"ожидался JSON-объект, получен {type(payload).__name__}")
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            self.stats["rejected"] += 1
+            logger.warning("Некорректный апдейт в webhook: %s", e)
+            return '400 Bad Request'
+        await self.application.update_queue.put(update)
+        self.stats["received"] += 1
+        return '200 OK'
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, close: bool) -> None:
+        connection = 'close' if close else 'keep-alive'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: {connection}\r\n\r\n".encode('latin-1'))
+        await writer.drain()
+
+async def run_webhook(application: Application, host: str, port: int, path: str,
+                      webhook_url: str | None = None, secret_token: str | None = None,
+                      stop_event: asyncio.Event | None = None) -> None:
+    """Жизненный цикл приложения в режиме webhook, как у run_polling: post_init, работа до сигнала, плавная остановка."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    server = WebhookServer(application, host, port, path, secret_token)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        if webhook_url:
+            await application.bot.set_webhook(url=webhook_url, secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES,
+                                              max_connections=min(100, application.update_processor.max_concurrent_updates))
+        await application.start()
+        await server.start()
+        application.bot_data['webhook_server'] = server
+
+        await stop_event.wait()
+        logger.info("Остановка: webhook больше не принимает апдейты, дообрабатываем очередь")
+        await server.close()
+        # stop() дожидается апдейтов из очереди и задач, запущенных через application.create_task (пакеты после debounce)
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)